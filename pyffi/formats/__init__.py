@@ -11,6 +11,12 @@ set the :envvar:`CGFXMLPATH` environment variable to the directory where
 :envvar:`KFMXMLPATH`, :envvar:`DDSXMLPATH`, and :envvar:`TGAXMLPATH`
 work similarly.
 
+Parsed format descriptions are cached on disk, so the xml files are
+only parsed again when they change. The cache is stored in the folder
+given by the :envvar:`PYFFI_CACHE_DIR` environment variable, if set
+(set it to an empty string to disable the cache), and in the user's
+cache folder otherwise.
+
 Supported formats
 -----------------
 
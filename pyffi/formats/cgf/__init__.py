@@ -725,18 +725,7 @@ but got instance of %s""" % (self._template, block.__class__))
 
             # get the chunk sizes (for double checking that we have all data)
             if validate:
-                chunk_offsets = [chunkhdr.offset
-                                 for chunkhdr in self.chunk_table.chunk_headers]
-                chunk_offsets.append(self.header.offset)
-                chunk_sizes = []
-                for chunkhdr in self.chunk_table.chunk_headers:
-                    next_chunk_offsets = [offset for offset in chunk_offsets
-                                          if offset > chunkhdr.offset]
-                    if next_chunk_offsets:
-                        chunk_sizes.append(min(next_chunk_offsets) - chunkhdr.offset)
-                    else:
-                        stream.seek(0, 2)
-                        chunk_sizes.append(stream.tell() - chunkhdr.offset)
+                chunk_sizes = self._get_chunk_sizes(stream)
 
             # read the chunks
             self._link_stack = [] # list of chunk identifiers, as added to the stack
@@ -774,50 +763,7 @@ but got instance of %s""" % (self._template, block.__class__))
                         % (chunkhdr.version, self.game, chunk_type))
 
                 # now read the chunk
-                stream.seek(chunkhdr.offset)
-                logger.debug("Reading %s chunk version 0x%08X at 0x%08X"
-                             % (chunk_type, chunkhdr.version, stream.tell()))
-
-                # in far cry, most chunks start with a copy of chunkhdr
-                # in crysis, more chunks start with chunkhdr
-                # caf files are special: they don't have headers on controllers
-                if not(self.user_version == CgfFormat.UVER_FARCRY
-                       and chunkhdr.type in [
-                           CgfFormat.ChunkType.SourceInfo,
-                           CgfFormat.ChunkType.BoneNameList,
-                           CgfFormat.ChunkType.BoneLightBinding,
-                           CgfFormat.ChunkType.BoneInitialPos,
-                           CgfFormat.ChunkType.MeshMorphTarget]) \
-                    and not(self.user_version == CgfFormat.UVER_CRYSIS
-                            and chunkhdr.type in [
-                                CgfFormat.ChunkType.BoneNameList,
-                                CgfFormat.ChunkType.BoneInitialPos]) \
-                    and not(is_caf
-                            and chunkhdr.type in [
-                                CgfFormat.ChunkType.Controller]) \
-                    and not((self.game == "Aion") and chunkhdr.type in [
-                        CgfFormat.ChunkType.MeshPhysicsData,
-                        CgfFormat.ChunkType.MtlName]):
-                    chunkhdr_copy = CgfFormat.ChunkHeader()
-                    chunkhdr_copy.read(stream, self)
-                    # check that the copy is valid
-                    # note: chunkhdr_copy.offset != chunkhdr.offset check removed
-                    # as many crysis cgf files have this wrong
-                    if chunkhdr_copy.type != chunkhdr.type \
-                       or chunkhdr_copy.version != chunkhdr.version \
-                       or chunkhdr_copy.id != chunkhdr.id:
-                        raise ValueError(
-                            'chunk starts with invalid header:\n\
-expected\n%sbut got\n%s'%(chunkhdr, chunkhdr_copy))
-                else:
-                    chunkhdr_copy = None
-
-                # quick hackish trick with version... not beautiful but it works
-                self.version = chunkhdr.version
-                try:
-                    chunk.read(stream, self)
-                finally:
-                    self.version = self.header.version
+                chunkhdr_copy = self._read_chunk(stream, chunkhdr, chunk, is_caf)
                 self.chunks.append(chunk)
                 self.versions.append(chunkhdr.version)
                 self._block_dct[chunkhdr.id] = chunk
@@ -870,6 +816,168 @@ chunk size mismatch when reading %s at 0x%08X
                 raise CgfFormat.CgfError(
                     'not all links have been popped from the stack (bug?)')
 
+        def scan(self, stream, chunk_types=()):
+            """Read the header and the chunk table, and return an
+            iterator over the index, type name, offset, and size of
+            every chunk, and the chunk itself if it is of one of the
+            given types (or of a subclass of them), or ``None``
+            otherwise, in the order of the chunk table. This is much
+            faster than L{read} for indexing files, as only chunks of
+            the given types are read from the stream. Links in these
+            chunks are not resolved, and are ``None``. Chunks of types
+            which have no chunk class are never decoded. Chunk types
+            which are not in L{CgfFormat.ChunkType} raise
+            ``ValueError``, as in L{read}. Does not reset stream
+            position.
+
+            >>> from os.path import dirname, join
+            >>> dirpath = __file__
+            >>> for i in range(4): #recurse up to root repo dir
+            ...     dirpath = dirname(dirpath)
+            >>> stream = open(join(dirpath, 'tests', 'formats', 'cgf',
+            ...                    'test.cgf'), 'rb')
+            >>> data = CgfFormat.Data()
+            >>> for index, chunk_type, offset, size, chunk in data.scan(
+            ...         stream, (CgfFormat.SourceInfoChunk,)):
+            ...     print(index, chunk_type, offset, size)
+            ...     if chunk:
+            ...         print(chunk.author)
+            0 SourceInfoChunk 20 42
+            blender@BLENDER
+            1 TimingChunk 62 68
+            >>> stream.close()
+
+            :param stream: The stream from which to read.
+            :type stream: ``file``
+            :param chunk_types: The chunk types to decode.
+            :type chunk_types: ``tuple`` of L{CgfFormat.Chunk} classes
+            :return: An iterator over C{(chunk_index, chunk_type, offset,
+                size, chunk)} tuples.
+            """
+            pos = stream.tell()
+            self.inspect(stream)
+            stream.seek(pos)
+            self.chunks = []
+            self.versions = []
+            return self._scan_chunks(stream, tuple(chunk_types))
+
+        def _scan_chunks(self, stream, chunk_types):
+            """Iterate over the chunks for L{scan}."""
+            is_caf = (str(getattr(stream, "name", ""))[-4:].lower() == ".caf")
+            # maps chunk type value to chunk type name
+            chunk_names = dict(
+                (value, '%sChunk' % chunk_type)
+                for chunk_type, value in zip(CgfFormat.ChunkType._enumkeys,
+                                             CgfFormat.ChunkType._enumvalues))
+            chunk_sizes = self._get_chunk_sizes(stream)
+            for chunknum, chunkhdr in enumerate(
+                    self.chunk_table.chunk_headers):
+                chunk_name = chunk_names.get(chunkhdr.type)
+                if chunk_name is None:
+                    raise ValueError(
+                        'unknown chunk type 0x%08X' % chunkhdr.type)
+                # chunk types without class cannot be decoded
+                chunk_class = getattr(CgfFormat, chunk_name, None)
+                chunk = None
+                if chunk_class is not None and issubclass(
+                        chunk_class, chunk_types):
+                    chunk = chunk_class()
+                    self._link_stack = []
+                    self._read_chunk(stream, chunkhdr, chunk, is_caf)
+                    # links are not resolved
+                    self._link_stack = []
+                yield (chunknum, chunk_name, chunkhdr.offset,
+                       chunk_sizes[chunknum], chunk)
+
+        def _get_chunk_sizes(self, stream):
+            """Return the number of bytes from the start of every chunk up
+            to the next chunk, the chunk table, or the end of the stream,
+            whichever comes first.
+
+            :param stream: The stream which contains the chunks.
+            :type stream: ``file``
+            :return: The size of every chunk in the chunk table.
+            :rtype: ``list`` of ``int``
+            """
+            chunk_offsets = [chunkhdr.offset
+                             for chunkhdr in self.chunk_table.chunk_headers]
+            chunk_offsets.append(self.header.offset)
+            chunk_sizes = []
+            for chunkhdr in self.chunk_table.chunk_headers:
+                next_chunk_offsets = [offset for offset in chunk_offsets
+                                      if offset > chunkhdr.offset]
+                if next_chunk_offsets:
+                    chunk_sizes.append(min(next_chunk_offsets) - chunkhdr.offset)
+                else:
+                    stream.seek(0, 2)
+                    chunk_sizes.append(stream.tell() - chunkhdr.offset)
+            return chunk_sizes
+
+        def _read_chunk(self, stream, chunkhdr, chunk, is_caf):
+            """Read a chunk at the offset in its chunk header. Most
+            chunks start with a copy of their chunk header, which is
+            read and checked as well. Links of the chunk are added to
+            the link stack.
+
+            :param stream: The stream from which to read.
+            :type stream: ``file``
+            :param chunkhdr: The chunk header, from the chunk table.
+            :type chunkhdr: L{CgfFormat.ChunkHeader}
+            :param chunk: The chunk to read.
+            :type chunk: L{CgfFormat.Chunk}
+            :param is_caf: Whether the file is a caf file.
+            :type is_caf: ``bool``
+            :return: The copy of the chunk header, or ``None`` if the chunk
+                does not start with one.
+            """
+            logger = logging.getLogger("pyffi.cgf.data")
+            stream.seek(chunkhdr.offset)
+            logger.debug("Reading %s version 0x%08X at 0x%08X"
+                         % (chunk.__class__.__name__, chunkhdr.version,
+                            stream.tell()))
+
+            # in far cry, most chunks start with a copy of chunkhdr
+            # in crysis, more chunks start with chunkhdr
+            # caf files are special: they don't have headers on controllers
+            if not(self.user_version == CgfFormat.UVER_FARCRY
+                   and chunkhdr.type in [
+                       CgfFormat.ChunkType.SourceInfo,
+                       CgfFormat.ChunkType.BoneNameList,
+                       CgfFormat.ChunkType.BoneLightBinding,
+                       CgfFormat.ChunkType.BoneInitialPos,
+                       CgfFormat.ChunkType.MeshMorphTarget]) \
+                and not(self.user_version == CgfFormat.UVER_CRYSIS
+                        and chunkhdr.type in [
+                            CgfFormat.ChunkType.BoneNameList,
+                            CgfFormat.ChunkType.BoneInitialPos]) \
+                and not(is_caf
+                        and chunkhdr.type in [
+                            CgfFormat.ChunkType.Controller]) \
+                and not((self.game == "Aion") and chunkhdr.type in [
+                    CgfFormat.ChunkType.MeshPhysicsData,
+                    CgfFormat.ChunkType.MtlName]):
+                chunkhdr_copy = CgfFormat.ChunkHeader()
+                chunkhdr_copy.read(stream, self)
+                # check that the copy is valid
+                # note: chunkhdr_copy.offset != chunkhdr.offset check removed
+                # as many crysis cgf files have this wrong
+                if chunkhdr_copy.type != chunkhdr.type \
+                   or chunkhdr_copy.version != chunkhdr.version \
+                   or chunkhdr_copy.id != chunkhdr.id:
+                    raise ValueError(
+                        'chunk starts with invalid header:\n\
+expected\n%sbut got\n%s'%(chunkhdr, chunkhdr_copy))
+            else:
+                chunkhdr_copy = None
+
+            # quick hackish trick with version... not beautiful but it works
+            self.version = chunkhdr.version
+            try:
+                chunk.read(stream, self)
+            finally:
+                self.version = self.header.version
+            return chunkhdr_copy
+
         def write(self, stream):
             """Write a cgf file. The L{header} and L{chunk_table} are
             recalculated from L{chunks}. Returns number of padding bytes
@@ -348,10 +348,14 @@ end
 #
 # ***** END LICENSE BLOCK *****
 
+from bisect import bisect_left
 from itertools import repeat, chain
+import heapq
+import io
 import logging
 import math # math.pi
 import os
+import pickle
 import re
 import struct
 import sys
@@ -369,6 +373,7 @@ import pyffi.utils.mopp
 import pyffi.utils.tristrip
 import pyffi.utils.vertex_cache
 import pyffi.utils.quickhull
+import pyffi.utils.tangentspace
 # XXX convert the following to absolute imports
 from pyffi.object_models.editable import EditableBoolComboBox
 from pyffi.utils.graph import EdgeFilter
@@ -416,6 +421,8 @@ class NifFormat(FileFormat):
 
     class StringOffset(pyffi.object_models.common.Int):
         """This is just an integer with -1 as default value."""
+        __slots__ = ()
+
         def __init__(self, **kwargs):
             pyffi.object_models.common.Int.__init__(self, **kwargs)
             self.set_value(-1)
@@ -432,6 +439,8 @@ class NifFormat(FileFormat):
         >>> i.get_value()
         True
         """
+        __slots__ = ()
+
         def __init__(self, **kwargs):
             BasicBase.__init__(self, **kwargs)
             self.set_value(False)
@@ -480,32 +489,73 @@ class NifFormat(FileFormat):
                                          int(self._value)))
 
     class Flags(pyffi.object_models.common.UShort):
+        __slots__ = ()
+
         def __str__(self):
             return hex(self.get_value())
 
     class Ref(BasicBase):
         """Reference to another block."""
+        __slots__ = ("_template", "_owner", "__weakref__")
         _is_template = True
         _has_links = True
         _has_refs = True
+        # incremented whenever a link is set which does not belong to
+        # a block yet, see NifFormat.Data.replace_global_node
+        unowned_generation = 0
         def __init__(self, **kwargs):
             BasicBase.__init__(self, **kwargs)
             self._template = kwargs.get("template")
+            # weak reference to the block which has this link
+            self._owner = None
             self.set_value(None)
 
         def get_value(self):
             return self._value
 
         def set_value(self, value):
-            if value is None:
-                self._value = None
-            else:
-                if self._template != None:
+            if value is not None:
+                # blocks of unknown type can be linked from anywhere
+                if (self._template != None
+                    and not getattr(value, "_is_unknown", False)):
                     if not isinstance(value, self._template):
                         raise TypeError(
                             'expected an instance of %s but got instance of %s'
                             % (self._template, value.__class__))
-                self._value = value
+            self._set_referrer(value)
+            self._value = value
+            # the tree has changed: lookup tables are out of date
+            StructBase.link_generation += 1
+
+        def __getstate__(self):
+            # the block which has the link is not pickled
+            return self.arg, self._template, self.get_value()
+
+        def __setstate__(self, state):
+            self.arg, self._template, value = state
+            self._owner = None
+            self._value = None
+            self.set_value(value)
+
+        def _set_referrer(self, value):
+            """Move this link from the referrers of the block it
+            currently refers to, to the referrers of C{value}.
+            """
+            if self._owner is None:
+                if value is not None:
+                    NifFormat.Ref.unowned_generation += 1
+                return
+            # the block which has the link changes
+            owner = self._owner()
+            if owner is not None and owner._raw is not None:
+                owner._raw = None
+            old = self.get_value()
+            if old is not None and old._referrers:
+                old._referrers.pop(id(self), None)
+            if value is not None:
+                if value._referrers is None:
+                    value._referrers = {}
+                value._referrers[id(self)] = weakref.ref(self)
 
         def get_size(self, data=None):
             return 4
@@ -518,6 +568,8 @@ class NifFormat(FileFormat):
 
         def read(self, stream, data):
             self.set_value(None) # fix_links will set this field
+            if data._raw_fields is not None:
+                data._raw_fields.append((stream.tell(), self))
             block_index, = struct.unpack(data._byte_order + 'i',
                                          stream.read(4))
             data._link_stack.append(block_index)
@@ -542,6 +594,7 @@ class NifFormat(FileFormat):
 
         def fix_links(self, data):
             """Fix block links."""
+            self._owner = data._link_owner
             block_index = data._link_stack.pop(0)
             # case when there's no link
             if data.version >= 0x0303000D:
@@ -555,7 +608,7 @@ class NifFormat(FileFormat):
             # other case: look up the link and check the link type
             block = data._block_dct[block_index]
             self.set_value(block)
-            if self._template != None:
+            if self._template != None and not block._is_unknown:
                 if not isinstance(block, self._template):
                     #raise TypeError('expected an instance of %s but got instance of %s'%(self._template, block.__class__))
                     logging.getLogger("pyffi.nif.ref").warn(
@@ -613,6 +666,7 @@ class NifFormat(FileFormat):
 
     class Ptr(Ref):
         """A weak reference to another block, used to point up the hierarchy tree. The reference is not returned by the L{get_refs} function to avoid infinite recursion."""
+        __slots__ = ()
         _is_template = True
         _has_links = True
         _has_refs = False
@@ -624,14 +678,19 @@ class NifFormat(FileFormat):
 
         def set_value(self, value):
             if value is None:
+                self._set_referrer(None)
                 self._value = None
             else:
-                if self._template != None:
+                # blocks of unknown type can be linked from anywhere
+                if (self._template != None
+                    and not getattr(value, "_is_unknown", False)):
                     if not isinstance(value, self._template):
                         raise TypeError(
                             'expected an instance of %s but got instance of %s'
                             % (self._template, value.__class__))
+                self._set_referrer(value)
                 self._value = weakref.ref(value)
+            StructBase.link_generation += 1
 
         def __str__(self):
             # avoid infinite recursion
@@ -875,8 +934,14 @@ class NifFormat(FileFormat):
             stream.write('\x00'.encode("ascii"))
 
     class string(SizedString):
+        __slots__ = ()
         _has_strings = True
 
+        def set_value(self, value):
+            NifFormat.SizedString.set_value(self, value)
+            # names are looked up as well (see Data.get_blocks_by_name)
+            StructBase.link_generation += 1
+
         def get_size(self, data=None):
             ver = data.version if data else -1
             if ver >= 0x14010003:
@@ -885,6 +950,8 @@ class NifFormat(FileFormat):
                 return 4 + len(self._value)
 
         def read(self, stream, data):
+            if data._raw_fields is not None:
+                data._raw_fields.append((stream.tell(), self))
             n, = struct.unpack(data._byte_order + 'i', stream.read(4))
             if data.version >= 0x14010003:
                 if n == -1:
@@ -906,13 +973,9 @@ class NifFormat(FileFormat):
                     stream.write(
                         struct.pack(data._byte_order + 'i', -1))
                 else:
-                    try:
-                        stream.write(struct.pack(
-                            data._byte_order + 'i',
-                            data._string_list.index(self._value)))
-                    except ValueError:
-                        raise ValueError(
-                            "string '%s' not in string list" % self._value)
+                    stream.write(struct.pack(
+                        data._byte_order + 'i',
+                        data._get_string_index(self._value)))
             else:
                 stream.write(struct.pack(data._byte_order + 'I',
                                          len(self._value)))
@@ -931,6 +994,8 @@ class NifFormat(FileFormat):
 
     class FilePath(string):
         """A file path."""
+        __slots__ = ()
+
         def get_hash(self, data=None):
             """Returns a case insensitive hash value."""
             return self.get_value().lower()
@@ -1087,10 +1152,39 @@ class NifFormat(FileFormat):
         :type modification: ``str``
         """
 
+        strict_block_size = False
+        """Set to ``True`` to check the size of every block which is
+        read (for nif versions 20.2.0.7 and up) against the size which
+        is calculated by L{NifFormat.NiObject.get_size}, rather than
+        against the number of bytes that were read. This is slower,
+        but also catches errors in the size calculation, which is what
+        L{write} relies on.
+        """
+
         _link_stack = None
         _block_dct = None
         _string_list = None
+        # maps strings to their index in _string_list
+        _string_index_dct = None
+        # whether write is building _string_list
+        _building_string_list = False
         _block_index_dct = None
+        _lazy_reader = None
+        _unknown_blocks = None
+        # offset of every link and string in the block that is being
+        # decoded, see _decode_block
+        _raw_fields = None
+        # offset and size of every block that is read, see scan
+        _block_extents = None
+        _lookup = None
+        # weak reference to the block whose links are being fixed
+        _link_owner = None
+        # value of Ref.unowned_generation when all links in the tree
+        # were known to belong to a block, see replace_global_node
+        _referrers_generation = None
+
+        # classes for unknown block types, see _get_unknown_block_type
+        _unknown_block_types = {}
 
         class VersionUInt(pyffi.object_models.common.UInt):
             def set_value(self, value):
@@ -1246,12 +1340,90 @@ class NifFormat(FileFormat):
 
         def replace_global_node(self, oldbranch, newbranch,
                               edge_filter=EdgeFilter()):
+            """Replace C{oldbranch} by C{newbranch} in the roots, and
+            in all links in the tree.
+
+            Rather than walking the tree, this only visits the links
+            which refer to C{oldbranch}: every block keeps track of
+            these. Links are assigned to the block which has them when
+            they are fixed after reading, and the first call after
+            links were set which do not belong to a block yet (for
+            instance, when the tree was built from scratch) assigns
+            those by walking the tree once. Links in blocks which were
+            removed from the tree may be replaced as well; this is
+            harmless.
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> data = NifFormat.Data()
+            >>> root = NifFormat.NiNode()
+            >>> node = NifFormat.NiNode()
+            >>> shape = NifFormat.NiTriShape()
+            >>> root.add_child(node)
+            >>> root.add_child(shape)
+            >>> node.add_child(shape)
+            >>> data.roots = [root]
+            >>> other = NifFormat.NiTriShape()
+            >>> data.replace_global_node(shape, other)
+            >>> root.children[1] is other, node.children[0] is other
+            (True, True)
+            >>> data.replace_global_node(other, None)
+            >>> root.children[0] is node, root.children[1], node.children[0]
+            (True, None, None)
+            """
+            if oldbranch is None:
+                # every empty link would be replaced: walk the tree
+                for root in self.roots:
+                    root.replace_global_node(oldbranch, newbranch,
+                                             edge_filter=edge_filter)
+                return
             for i, root in enumerate(self.roots):
                 if root is oldbranch:
                     self.roots[i] = newbranch
+            if (self._referrers_generation
+                != NifFormat.Ref.unowned_generation):
+                self._update_referrers()
+            if not oldbranch._referrers:
+                return
+            for link in list(oldbranch._referrers.values()):
+                link = link()
+                if link is not None and link.get_value() is oldbranch:
+                    link.set_value(newbranch)
+
+        def _update_referrers(self):
+            """Assign all links in the tree which do not belong to a
+            block yet, to the block which has them.
+            """
+            for block in self._get_lookup().blocks:
+                owner = None
+                for link in self._get_links(block):
+                    if link._owner is None:
+                        if owner is None:
+                            owner = weakref.ref(block)
+                        link._owner = owner
+                        link._set_referrer(link.get_value())
+            self._referrers_generation = NifFormat.Ref.unowned_generation
+
+        @classmethod
+        def _get_links(cls, struct):
+            """Generator for all links (L{NifFormat.Ref} instances) of
+            a structure.
+            """
+            for attr in struct._get_filtered_attribute_list():
+                if not attr.type_._has_links:
+                    continue
+                value = getattr(struct, "_%s_value_" % attr.name)
+                if isinstance(value, NifFormat.Ref):
+                    yield value
+                elif isinstance(value, StructBase):
+                    for link in cls._get_links(value):
+                        yield link
                 else:
-                    root.replace_global_node(oldbranch, newbranch,
-                                           edge_filter=edge_filter)
+                    for elem in value._elementList():
+                        if isinstance(elem, NifFormat.Ref):
+                            yield elem
+                        else:
+                            for link in cls._get_links(elem):
+                                yield link
 
         def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
             yield self._version_value_
@@ -1283,11 +1455,143 @@ class NifFormat(FileFormat):
             finally:
                 stream.seek(pos)
 
-        def read(self, stream):
+        def scan(self, stream, block_types=()):
+            """Read the header, and return an iterator over the index,
+            type name, offset, and size of every block, and the block
+            itself if it is of one of the given types (or of a subclass
+            of them), or ``None`` otherwise, in the order in which the
+            blocks are stored. This is much faster than L{read} for
+            indexing files, as blocks of other types are not decoded.
+            Strings in decoded blocks are resolved, and the string
+            table is in L{header}.
+
+            For nif versions 20.2.0.7 and up, whose header stores the
+            type and size of every block, only blocks which are decoded
+            are read from the stream, and their links are not resolved,
+            and are ``None``. Earlier versions are read in full with
+            L{read}, once the iteration starts, so links are resolved,
+            and L{blocks} and L{roots} are set as well. Does not reset
+            stream position.
+
+            >>> from os.path import dirname, join
+            >>> dirpath = __file__
+            >>> for i in range(4): #recurse up to root repo dir
+            ...     dirpath = dirname(dirpath)
+            >>> stream = open(join(dirpath, 'tests', 'spells', 'nif', 'files',
+            ...                    'test_dump_tex.nif'), 'rb')
+            >>> data = NifFormat.Data()
+            >>> for index, block_type, offset, size, block in data.scan(
+            ...         stream, (NifFormat.NiSourceTexture,)):
+            ...     if block:
+            ...         print(index, block_type, block.file_name.decode())
+            4 NiSourceTexture bitmap2.dds
+            5 NiSourceTexture bitmap1.dds
+            >>> stream.close()
+
+            :param stream: The stream from which to read.
+            :type stream: ``file``
+            :param block_types: The block types to decode.
+            :type block_types: ``tuple`` of L{NifFormat.NiObject} classes
+            :return: An iterator over C{(block_index, block_type, offset,
+                size, block)} tuples.
+            """
+            pos = stream.tell()
+            self.inspect_version_only(stream)
+            self.header.read(stream, data=self)
+            self._string_list = [s for s in self.header.strings]
+            self._string_index_dct = None
+            self.roots = []
+            self.blocks = []
+            return self._scan_blocks(stream, pos, tuple(block_types))
+
+        def _scan_blocks(self, stream, pos, block_types):
+            """Iterate over the blocks for L{scan}, where C{pos} is the
+            position of the start of the file in the stream."""
+            if self.version < 0x14020007:
+                # no block sizes in the header: read all blocks
+                self._block_extents = []
+                try:
+                    stream.seek(pos)
+                    self.read(stream)
+                    extents = self._block_extents
+                finally:
+                    self._block_extents = None
+                for block_index, (block, (offset, size)) in enumerate(
+                        zip(self.blocks, extents)):
+                    yield (block_index, block.__class__.__name__,
+                           offset, size,
+                           block if isinstance(block, block_types) else None)
+                return
+            # maps each block type name to whether it is decoded
+            decoded = {}
+            offset = stream.tell()
+            for block_index in range(self.header.num_blocks):
+                block_type = self.header.block_types[
+                    self.header.block_type_index[block_index] & 0xfff]
+                block_type = block_type.decode("ascii")
+                data_stream = None
+                if block_type.startswith("NiDataStream\x01"):
+                    block_type, usage, access = block_type.split("\x01")
+                    data_stream = (int(usage), int(access))
+                size = self.header.block_size[block_index]
+                try:
+                    is_decoded = decoded[block_type]
+                except KeyError:
+                    block_class = getattr(NifFormat, block_type, None)
+                    is_decoded = decoded[block_type] = (
+                        block_class is not None
+                        and issubclass(block_class, block_types))
+                block = None
+                if is_decoded:
+                    block = getattr(NifFormat, block_type)()
+                    stream.seek(offset)
+                    self._link_stack = []
+                    block.read(stream, self)
+                    # links are not resolved
+                    self._link_stack = []
+                    if data_stream:
+                        block.usage = data_stream[0]
+                        block.access.populate_attribute_values(
+                            data_stream[1], self)
+                yield block_index, block_type, offset, size, block
+                offset += size
+            stream.seek(offset)
+
+        def read(self, stream, lazy=False, jobs=1):
             """Read a NIF file. Does not reset stream position.
 
+            In lazy mode, for nif versions 20.2.0.7 and up, whose
+            header stores the size of every block, the blocks are
+            not decoded while reading: they are created, and linked
+            from the L{roots}, but their attributes are only read
+            from the stored bytes the first time that any of them is
+            accessed. Blocks which are still undecoded when
+            L{write} is called are written back as they were read,
+            provided that the list of blocks and the version are
+            unchanged. In this mode, blocks of unknown type are kept
+            as well, and are written back in the same way.
+
+            Blocks which have been decoded keep their bytes too, until
+            they may have changed: when any of their attributes is
+            set, when any of their attributes which is not a basic
+            type (such as an array) is accessed, or when any of their
+            links is set, for instance by L{replace_global_node}.
+            Unless the version has changed, L{write} copies the bytes
+            of unchanged blocks, and only writes their links and
+            strings anew, as block indices and string indices may have
+            changed.
+
+            If more than one job is given, then for nif versions
+            20.2.0.7 and up, the blocks are decoded in a pool of as
+            many processes, which pays off for very large files. This
+            is ignored in lazy mode.
+
             :param stream: The stream from which to read.
             :type stream: ``file``
+            :param lazy: Whether to decode blocks on first access.
+            :type lazy: ``bool``
+            :param jobs: The number of processes which decode blocks.
+            :type jobs: ``int``
             """
             logger = logging.getLogger("pyffi.nif.data")
             # read header
@@ -1295,6 +1599,8 @@ class NifFormat(FileFormat):
             self.inspect_version_only(stream)
             logger.debug("Version 0x%08X" % self.version)
             self.header.read(stream, data=self)
+            lazy = lazy and self.version >= 0x14020007
+            parallel = jobs > 1 and not lazy and self.version >= 0x14020007
 
             # list of root blocks
             # for versions < 3.3.0.13 this list is updated through the
@@ -1306,9 +1612,24 @@ class NifFormat(FileFormat):
             # read the blocks
             self._link_stack = [] # list of indices, as they are added to the stack
             self._string_list = [s for s in self.header.strings]
+            self._string_index_dct = None
             self._block_dct = {} # maps block index to actual block
             self.blocks = [] # records all blocks as read from file in order
             block_num = 0 # the current block numner
+            self._lazy_reader = None
+            self._unknown_blocks = None
+            if lazy or parallel:
+                # read the bytes of all blocks at once; blocks keep a
+                # view on their part, and decode it on first access
+                # (or, send it to a process which decodes it)
+                buffer_ = memoryview(stream.read(sum(self.header.block_size)))
+                offset = 0
+            if lazy:
+                self._lazy_reader = self._get_lazy_reader()
+                self._unknown_blocks = {}
+            # (block type, bytes, data stream) for each block which
+            # is decoded in parallel
+            raw_blocks = []
 
             while True:
                 if self.version < 0x0303000D:
@@ -1370,14 +1691,49 @@ class NifFormat(FileFormat):
                             raise NifFormat.NifError(
                                 'duplicate block index (0x%08X at 0x%08X)'
                                 %(block_index, stream.tell()))
+                if lazy or parallel:
+                    size = self.header.block_size[block_num]
+                    raw = buffer_[offset:offset + size]
+                    offset += size
+                    if len(raw) != size:
+                        raise NifFormat.NifError(
+                            "unexpected end of file in %s block" % block_type)
+                    data_stream = (
+                        (data_stream_usage, data_stream_access)
+                        if block_type == "NiDataStream" else None)
+                if parallel:
+                    if getattr(NifFormat, block_type, None) is None:
+                        raise ValueError(
+                            "Unknown block type '%s'." % block_type)
+                    raw_blocks.append((block_type, raw.tobytes(), data_stream))
+                    block_num += 1
+                    if block_num >= self.header.num_blocks:
+                        break
+                    continue
+                if lazy:
+                    # create the block without decoding it
+                    block_class = getattr(NifFormat, block_type, None)
+                    if block_class is None:
+                        block_class = self._get_unknown_block_type(block_type)
+                    block = block_class.__new__(block_class)
+                    if block_class._is_unknown:
+                        self._unknown_blocks[block] = raw
+                    block._lazy = (self._lazy_reader, raw, data_stream)
+                    self._block_dct[block_index] = block
+                    self.blocks.append(block)
+                    block_num += 1
+                    if block_num >= self.header.num_blocks:
+                        break
+                    continue
                 # create the block
                 try:
                     block = getattr(NifFormat, block_type)()
                 except AttributeError:
                     raise ValueError(
                         "Unknown block type '%s'." % block_type)
+                block_pos = stream.tell()
                 logger.debug("Reading %s block at 0x%08X"
-                             % (block_type, stream.tell()))
+                             % (block_type, block_pos))
                 # read the block
                 try:
                     block.read(stream, self)
@@ -1397,7 +1753,10 @@ class NifFormat(FileFormat):
                 # check block size
                 if self.version >= 0x14020007:
                     logger.debug("Checking block size")
-                    calculated_size = block.get_size(data=self)
+                    if self.strict_block_size:
+                        calculated_size = block.get_size(data=self)
+                    else:
+                        calculated_size = stream.tell() - block_pos
                     if calculated_size != self.header.block_size[block_num]:
                         extra_size = self.header.block_size[block_num] - calculated_size
                         logger.error(
@@ -1407,6 +1766,9 @@ class NifFormat(FileFormat):
                                      % (extra_size, block.__class__.__name__))
                         # skip bytes that were missed
                         stream.seek(extra_size, 1)
+                if self._block_extents is not None:
+                    self._block_extents.append(
+                        (block_pos, stream.tell() - block_pos))
                 # add block to roots if flagged as such
                 if is_root:
                     self.roots.append(block)
@@ -1416,6 +1778,9 @@ class NifFormat(FileFormat):
                     if block_num >= self.header.num_blocks:
                         break
 
+            if parallel:
+                self._read_blocks_parallel(raw_blocks, jobs)
+
             # read footer
             ftr = NifFormat.Footer()
             ftr.read(stream, self)
@@ -1426,8 +1791,10 @@ class NifFormat(FileFormat):
                     'End of file not reached: corrupt NIF file?')
 
             # fix links in blocks and footer (header has no links)
-            for block in self.blocks:
-                block.fix_links(self)
+            # (lazily read blocks fix their links when they are decoded)
+            if not lazy:
+                for block in self.blocks:
+                    block.fix_links(self)
             ftr.fix_links(self)
             # the link stack should be empty now
             if self._link_stack:
@@ -1436,31 +1803,260 @@ class NifFormat(FileFormat):
             if self.version >= 0x0303000D:
                 for root in ftr.roots:
                     self.roots.append(root)
+            # all links now belong to a block
+            # (except for those of lazily read blocks, which are not
+            # fixed yet)
+            if not lazy:
+                self._referrers_generation = NifFormat.Ref.unowned_generation
+
+        def _read_blocks_parallel(self, raw_blocks, jobs):
+            """Decode blocks in a pool of processes, and add them.
+            Their links are added to the link stack, and are fixed as
+            usual.
+
+            :param raw_blocks: The type, bytes, and data stream usage
+                and access (or ``None``) of every block.
+            :type raw_blocks: ``list`` of ``tuple``
+            :param jobs: The number of processes.
+            :type jobs: ``int``
+            """
+            import multiprocessing
+            # split the blocks into several chunks of about equal size
+            # per process, so processes which are done early can pick
+            # up another chunk
+            chunk_size = sum(len(raw) for _, raw, _ in raw_blocks) // (
+                4 * jobs) + 1
+            chunks = [[]]
+            size = 0
+            for raw_block in raw_blocks:
+                if size >= chunk_size:
+                    chunks.append([])
+                    size = 0
+                chunks[-1].append(raw_block)
+                size += len(raw_block[1])
+            reader = (self.version, self.user_version, self.user_version_2,
+                      self._byte_order, self.modification,
+                      self._string_list, self.strict_block_size)
+            # chunks are added as soon as they are decoded, while the
+            # processes decode the next ones
+            with multiprocessing.Pool(jobs) as pool:
+                for result in pool.imap(
+                    _decode_blocks, [reader + (chunk,) for chunk in chunks]):
+                    self._add_decoded_blocks(pickle.loads(result))
+
+        def _add_decoded_blocks(self, decoded_blocks):
+            """Add blocks which were decoded by L{_decode_blocks}."""
+            logger = logging.getLogger("pyffi.nif.data")
+            for block, links, extra_size in decoded_blocks:
+                self._block_dct[len(self.blocks)] = block
+                self.blocks.append(block)
+                self._link_stack.extend(links)
+                if extra_size:
+                    logger.error(
+                        "Block size check failed: corrupt NIF file "
+                        "or bad nif.xml?")
+                    logger.error("Skipping %i bytes in %s"
+                                 % (extra_size, block.__class__.__name__))
+
+        def _get_lazy_reader(self):
+            """Return a copy of the state of the file that is needed to
+            decode lazily read blocks; unlike this instance, the copy
+            is not changed by L{write}.
+            """
+            reader = NifFormat.Data(
+                self.version, self.user_version, self.user_version_2)
+            reader._byte_order = self._byte_order
+            reader.modification = self.modification
+            reader._string_list = self._string_list
+            reader._block_dct = self._block_dct
+            return reader
+
+        @classmethod
+        def _get_unknown_block_type(cls, block_type):
+            """Return a block class, without attributes, to represent
+            blocks of a type which is not described in nif.xml.
+            """
+            try:
+                return cls._unknown_block_types[block_type]
+            except KeyError:
+                block_class = type(str(block_type), (NifFormat.NiObject,),
+                                   {"_is_unknown": True,
+                                    "__module__": NifFormat.__module__})
+                cls._unknown_block_types[block_type] = block_class
+                return block_class
+
+        def _decode_block(self, block):
+            """Decode a lazily read block. Called on the reader returned
+            by L{_get_lazy_reader}.
+            """
+            reader, raw, data_stream = block._lazy
+            block._lazy = None
+            block.__init__()
+            if block._is_unknown:
+                return
+            stream = io.BytesIO(raw)
+            link_stack = self._link_stack
+            self._link_stack = []
+            self._raw_fields = []
+            try:
+                block.read(stream, self)
+                # complete NiDataStream data
+                if data_stream:
+                    block.usage = data_stream[0]
+                    block.access.populate_attribute_values(
+                        data_stream[1], self)
+                block.fix_links(self)
+            except:
+                logging.getLogger("pyffi.nif.data").exception(
+                    "Reading %s failed" % block.__class__)
+                raise
+            finally:
+                self._link_stack = link_stack
+                raw_fields = self._raw_fields
+                self._raw_fields = None
+            # check block size
+            if self.strict_block_size:
+                size = block.get_size(data=self)
+            else:
+                size = stream.tell()
+            if size != len(raw):
+                logger = logging.getLogger("pyffi.nif.data")
+                logger.error(
+                    "Block size check failed: corrupt NIF file "
+                    "or bad nif.xml?")
+                logger.error("Skipping %i bytes in %s"
+                             % (len(raw) - size, block.__class__.__name__))
+            else:
+                # keep the bytes until the block changes
+                block._raw = (raw, raw_fields)
+
+        def _get_raw_blocks(self):
+            """Return a dictionary which maps each block that was read
+            lazily, and that is still undecoded (or whose type is
+            unknown), to its bytes.
+            """
+            if self._lazy_reader is None:
+                return {}
+            raw_blocks = dict(self._unknown_blocks)
+            for block in self._lazy_reader._block_dct.values():
+                if block._lazy is not None:
+                    raw_blocks[block] = block._lazy[1]
+            return raw_blocks
+
+        def _has_reader_version(self):
+            """Check whether the version and byte order are those of the
+            file that was read lazily, so the bytes of its blocks are
+            still valid.
+            """
+            reader = self._lazy_reader
+            return (reader is not None
+                    and self.version == reader.version
+                    and self.user_version == reader.user_version
+                    and self.user_version_2 == reader.user_version_2
+                    and self._byte_order == reader._byte_order)
+
+        def _check_raw_blocks(self, raw_blocks):
+            """Check whether blocks can be written back as they were
+            read, that is, whether the block indices and versions
+            which are stored in their bytes are unchanged. If so, and
+            if there are any such blocks, start the string table with
+            the strings as they were read, so string indices do not
+            change either. Return the dictionary of blocks to write as
+            bytes.
+            """
+            reader = self._lazy_reader
+            blocks = [reader._block_dct[i]
+                      for i in range(len(reader._block_dct))]
+            if (self._has_reader_version()
+                and len(self.blocks) == len(blocks)
+                and all(block is old_block
+                        for block, old_block in zip(self.blocks, blocks))):
+                if raw_blocks:
+                    self._string_list = list(reader._string_list)
+                return raw_blocks
+            for block in self.blocks:
+                if block._is_unknown:
+                    raise NifFormat.NifError(
+                        "cannot write %s block of unknown type: the block "
+                        "list or version has changed"
+                        % block.__class__.__name__)
+            return {}
 
         def write(self, stream):
             """Write a NIF file. The L{header} and the L{blocks} are recalculated
             from the tree at L{roots} (e.g. list of block types, number of blocks,
             list of block types, list of strings, list of block sizes etc.).
 
+            The tree is walked only once, to list the blocks. The blocks
+            are then written to a buffer, which collects the strings as
+            they are written and gives the block sizes, so the header
+            can be written in front of them.
+
             :param stream: The stream to which to write.
             :type stream: file
             """
             logger = logging.getLogger("pyffi.nif.data")
+            # blocks which can be written as they were read
+            # (get this before blocks are decoded when traversing the tree)
+            raw_blocks = self._get_raw_blocks()
             # set up index and type dictionary
             self.blocks = [] # list of all blocks to be written
             self._block_index_dct = {} # maps block to block index
             block_type_list = [] # list of all block type strings
             block_type_dct = {} # maps block to block type string index
-            self._string_list = []
+            block_type_index_dct = {} # maps block type string to its index
             for root in self.roots:
                 self._makeBlockList(root,
                                     self._block_index_dct,
-                                    block_type_list, block_type_dct)
-                for block in root.tree():
-                    self._string_list.extend(
-                        block.get_strings(self))
-            self._string_list = list(set(self._string_list)) # ensure unique elements
-            #print(self._string_list) # debug
+                                    block_type_list, block_type_dct,
+                                    block_type_index_dct)
+            # strings are added to the string list as they are written
+            self._string_list = []
+            if self._lazy_reader is not None:
+                raw_blocks = self._check_raw_blocks(raw_blocks)
+            self._string_index_dct = None
+            # decoded blocks which are unchanged can be copied as well
+            copy_blocks = self._has_reader_version()
+
+            # write the blocks
+            block_stream = io.BytesIO()
+            block_size_list = []
+            # strings which are written are added to the string list
+            self._building_string_list = True
+            try:
+                for block in self.blocks:
+                    # signal top level object if block is a root object
+                    if self.version < 0x0303000D and block in self.roots:
+                        s = NifFormat.SizedString()
+                        s.set_value("Top Level Object")
+                        s.write(block_stream, self)
+                    if self.version >= 0x05000001:
+                        if self.version <= 0x0A01006A:
+                            # write zero dummy separator
+                            block_stream.write('\x00\x00\x00\x00'.encode("ascii"))
+                    else:
+                        # write block type string
+                        s = NifFormat.SizedString()
+                        assert(block_type_list[block_type_dct[block]]
+                               == block.__class__.__name__) # debug
+                        s.set_value(block.__class__.__name__)
+                        s.write(block_stream, self)
+                    # write block index
+                    logger.debug("Writing %s block" % block.__class__.__name__)
+                    if self.version < 0x0303000D:
+                        block_stream.write(struct.pack(self._byte_order + 'i',
+                                                       self._block_index_dct[block]))
+                    # write block
+                    block_pos = block_stream.tell()
+                    if block in raw_blocks:
+                        block_stream.write(raw_blocks[block])
+                    elif copy_blocks and block._raw is not None:
+                        self._write_raw_block(block, block_stream)
+                    else:
+                        block.write(block_stream, self)
+                    block_size_list.append(block_stream.tell() - block_pos)
+            finally:
+                self._building_string_list = False
 
             self.header.user_version = self.user_version # TODO dedicated type for user_version similar to FileVersion
             # for oblivion CS; apparently this is the version of the bhk blocks
@@ -1482,8 +2078,8 @@ class NifFormat(FileFormat):
             for i, s in enumerate(self._string_list):
                 self.header.strings[i] = s
             self.header.block_size.update_size()
-            for i, block in enumerate(self.blocks):
-                self.header.block_size[i] = block.get_size(data=self)
+            for i, size in enumerate(block_size_list):
+                self.header.block_size[i] = size
             #if verbose >= 2:
             #    print(hdr)
 
@@ -1498,38 +2094,59 @@ class NifFormat(FileFormat):
             logger.debug("Writing header")
             #logger.debug("%s" % self.header)
             self.header.write(stream, self)
-            for block in self.blocks:
-                # signal top level object if block is a root object
-                if self.version < 0x0303000D and block in self.roots:
-                    s = NifFormat.SizedString()
-                    s.set_value("Top Level Object")
-                    s.write(stream, self)
-                if self.version >= 0x05000001:
-                    if self.version <= 0x0A01006A:
-                        # write zero dummy separator
-                        stream.write('\x00\x00\x00\x00'.encode("ascii"))
-                else:
-                    # write block type string
-                    s = NifFormat.SizedString()
-                    assert(block_type_list[block_type_dct[block]]
-                           == block.__class__.__name__) # debug
-                    s.set_value(block.__class__.__name__)
-                    s.write(stream, self)
-                # write block index
-                logger.debug("Writing %s block" % block.__class__.__name__)
-                if self.version < 0x0303000D:
-                    stream.write(struct.pack(self._byte_order + 'i',
-                                             self._block_index_dct[block]))
-                # write block
-                block.write(stream, self)
+            logger.debug("Writing blocks")
+            stream.write(block_stream.getbuffer())
             if self.version < 0x0303000D:
                 s = NifFormat.SizedString()
                 s.set_value("End Of File")
                 s.write(stream, self)
             ftr.write(stream, self)
 
+        def _write_raw_block(self, block, stream):
+            """Write an unchanged block by copying the bytes from which it
+            was read, and writing its links and strings anew.
+
+            :param block: The block, as decoded by L{_decode_block}.
+            :type block: L{NifFormat.NiObject}
+            :param stream: The stream to which to write.
+            :type stream: file
+            """
+            raw, fields = block._raw
+            pos = stream.tell()
+            stream.write(raw)
+            for offset, value in fields:
+                stream.seek(pos + offset)
+                value.write(stream, self)
+            stream.seek(pos + len(raw))
+
+        def _get_string_index(self, value):
+            """Return the index of a string in the string list, for
+            writing. While L{write} builds the string list, strings
+            which are not yet in the list are added to it.
+
+            :param value: The string.
+            :type value: str
+            :return: The index of the string.
+            :rtype: int
+            """
+            if self._string_index_dct is None:
+                self._string_index_dct = {}
+                for i, s in enumerate(self._string_list):
+                    self._string_index_dct.setdefault(s, i)
+            try:
+                return self._string_index_dct[value]
+            except KeyError:
+                if not self._building_string_list:
+                    raise ValueError(
+                        "string '%s' not in string list" % value)
+                index = len(self._string_list)
+                self._string_list.append(value)
+                self._string_index_dct[value] = index
+                return index
+
         def _makeBlockList(
-            self, root, block_index_dct, block_type_list, block_type_dct):
+            self, root, block_index_dct, block_type_list, block_type_dct,
+            block_type_index_dct):
             """This is a helper function for write to set up the list of all blocks,
             the block index map, and the block type map.
 
@@ -1544,6 +2161,9 @@ class NifFormat(FileFormat):
             :param block_type_dct: Dictionary mapping blocks in self.blocks to
                 their block type index.
             :type block_type_dct: dict
+            :param block_type_index_dct: Dictionary mapping block types
+                to their index in the list of all block types.
+            :type block_type_index_dct: dict
             """
 
             def _blockChildBeforeParent(block):
@@ -1560,7 +2180,7 @@ class NifFormat(FileFormat):
                         and not isinstance(block, NifFormat.bhkConstraint))
 
             # block already listed? if so, return
-            if root in self.blocks:
+            if root in block_index_dct:
                 return
             # add block type to block type dictionary
             block_type = root.__class__.__name__
@@ -1569,9 +2189,10 @@ class NifFormat(FileFormat):
                 block_type = ("NiDataStream\x01%i\x01%i"
                               % (root.usage, root.access.get_attributes_values(self)))
             try:
-                block_type_dct[root] = block_type_list.index(block_type)
-            except ValueError:
-                block_type_dct[root] = len(block_type_list)
+                block_type_dct[root] = block_type_index_dct[block_type]
+            except KeyError:
+                block_type_dct[root] = block_type_index_dct[block_type] = len(
+                    block_type_list)
                 block_type_list.append(block_type)
 
             # special case: add bhkConstraint entities before bhkConstraint
@@ -1580,7 +2201,8 @@ class NifFormat(FileFormat):
                 for entity in root.entities:
                     if entity is not None:
                         self._makeBlockList(
-                            entity, block_index_dct, block_type_list, block_type_dct)
+                            entity, block_index_dct, block_type_list, block_type_dct,
+                            block_type_index_dct)
 
             children_left = []
             # add children that come before the block
@@ -1588,7 +2210,8 @@ class NifFormat(FileFormat):
             for child in root.get_refs(data=self):
                 if _blockChildBeforeParent(child):
                     self._makeBlockList(
-                        child, block_index_dct, block_type_list, block_type_dct)
+                        child, block_index_dct, block_type_list, block_type_dct,
+                        block_type_index_dct)
                 else:
                     children_left.append(child)
 
@@ -1602,7 +2225,232 @@ class NifFormat(FileFormat):
             # add children that come after the block
             for child in children_left:
                 self._makeBlockList(
-                    child, block_index_dct, block_type_list, block_type_dct)
+                    child, block_index_dct, block_type_list, block_type_dct,
+                        block_type_index_dct)
+
+        class _Lookup(object):
+            """Lookup tables for all blocks in the tree at the roots
+            of the data. Blocks are listed in the order in which a
+            depth first walk from the roots (as L{NifFormat.NiObject.tree},
+            with C{unique=True}) first visits them, so the tree of each
+            block which is visited for the first time is a contiguous
+            range of this list, unless that tree links to blocks outside
+            it.
+
+            The tables are built from the tree as it is at the time of
+            construction. They are up to date as long as no link and no
+            string has been changed since (see L{is_fresh} and
+            L{StructBase.link_generation}).
+            """
+
+            def __init__(self, roots):
+                self.roots = list(roots)
+                self.blocks = []
+                # block -> position in self.blocks
+                self.position = {}
+                # block -> end (exclusive) of the range of its tree
+                self.end = {}
+                # block -> the parent through which it was first visited
+                self.tree_parent = {}
+                # block -> list of all parents
+                self.parents = {}
+                # blocks whose tree lies entirely within its range
+                self.closed = set()
+                # closed blocks whose tree is a tree: no block in it
+                # has more than one parent within it
+                self.treelike = set()
+                # exact block class -> list of blocks
+                self.by_class = {}
+                # block name -> list of blocks
+                self.by_name = {}
+                # block type -> (list of blocks, list of positions)
+                self._by_type = {}
+                self._build()
+                # (blocks which are read lazily change links when they
+                # are decoded, so only count changes from here on)
+                self.generation = StructBase.link_generation
+
+            def _visit(self, block, parent):
+                """Add a block which is visited for the first time."""
+                self.position[block] = len(self.blocks)
+                self.blocks.append(block)
+                self.tree_parent[block] = parent
+                self.parents[block] = [] if parent is None else [parent]
+                self.by_class.setdefault(block.__class__, []).append(block)
+                try:
+                    name = block.name
+                except AttributeError:
+                    pass
+                else:
+                    self.by_name.setdefault(name, []).append(block)
+                # (block, children, index of next child, closed, treelike)
+                return [block, block.get_refs(), 0, True, True]
+
+            def _build(self):
+                position = self.position
+                for root in self.roots:
+                    if root in position:
+                        continue
+                    stack = [self._visit(root, None)]
+                    while stack:
+                        entry = stack[-1]
+                        block, children, i = entry[:3]
+                        if i < len(children):
+                            entry[2] = i + 1
+                            child = children[i]
+                            if child not in position:
+                                stack.append(self._visit(child, block))
+                                continue
+                            self.parents[child].append(block)
+                            # child was visited before: the tree of block
+                            # is not a tree, and it is not closed if child
+                            # was visited before block
+                            entry[4] = False
+                            if (position[child] < position[block]
+                                or child not in self.closed):
+                                entry[3] = False
+                            continue
+                        # all children done
+                        stack.pop()
+                        self.end[block] = len(self.blocks)
+                        closed, treelike = entry[3:]
+                        if closed:
+                            self.closed.add(block)
+                            if treelike:
+                                self.treelike.add(block)
+                        if stack:
+                            parent_entry = stack[-1]
+                            parent_entry[3] = parent_entry[3] and closed
+                            parent_entry[4] = parent_entry[4] and treelike
+                ref = weakref.ref(self)
+                for block in self.blocks:
+                    block._lookup_ref = ref
+
+            def is_fresh(self):
+                """Check that no link or string has changed since the
+                tables were built."""
+                return self.generation == StructBase.link_generation
+
+            def get_blocks_by_type(self, block_type):
+                """Return list of all blocks which are an instance of
+                C{block_type}, and list of their positions."""
+                try:
+                    return self._by_type[block_type]
+                except KeyError:
+                    pass
+                blocks = sorted(
+                    chain.from_iterable(
+                        blocks for block_class, blocks in self.by_class.items()
+                        if issubclass(block_class, block_type)),
+                    key=self.position.__getitem__)
+                result = blocks, [self.position[block] for block in blocks]
+                self._by_type[block_type] = result
+                return result
+
+            def find(self, branch, block_name, block_type):
+                """Like L{NifFormat.NiObject.find}, for a closed
+                branch."""
+                if block_name:
+                    blocks = self.by_name.get(block_name, [])
+                    if block_type:
+                        blocks = [block for block in blocks
+                                  if isinstance(block, block_type)]
+                    positions = [self.position[block] for block in blocks]
+                elif block_type:
+                    blocks, positions = self.get_blocks_by_type(block_type)
+                else:
+                    return None
+                i = bisect_left(positions, self.position[branch])
+                if i == len(blocks) or positions[i] >= self.end[branch]:
+                    return None
+                return blocks[i]
+
+            def find_chain(self, branch, block, block_type):
+                """Like L{NifFormat.NiObject.find_chain}, for a branch
+                whose tree is a tree."""
+                position = self.position.get(block)
+                if (position is None
+                    or not (self.position[branch] < position
+                            < self.end[branch])):
+                    return []
+                chain = [block]
+                while block is not branch:
+                    if block_type and not isinstance(block, block_type):
+                        # there is no other chain
+                        return []
+                    block = self.tree_parent[block]
+                    chain.append(block)
+                chain.reverse()
+                return chain
+
+        def _get_lookup(self):
+            """Return lookup tables for the current tree, building
+            them if they are out of date."""
+            lookup = self._lookup
+            if (lookup is None or not lookup.is_fresh()
+                or len(lookup.roots) != len(self.roots)
+                or any(root is not old_root
+                       for root, old_root in zip(self.roots, lookup.roots))):
+                lookup = self._lookup = NifFormat.Data._Lookup(self.roots)
+            return lookup
+
+        def invalidate_lookup(self):
+            """Discard the lookup tables. They are rebuilt on demand.
+            Changes of links and strings are detected automatically
+            (see L{StructBase.link_generation}), so this is only needed
+            if the tree is changed by other means."""
+            self._lookup = None
+
+        def get_blocks_by_type(self, block_type):
+            """Return list of all blocks in the tree which are an
+            instance of C{block_type} (including its subclasses), in
+            the order in which they are first found when walking the
+            tree from the roots.
+
+            >>> data = NifFormat.Data()
+            >>> node = NifFormat.NiNode()
+            >>> shape = NifFormat.NiTriShape()
+            >>> node.add_child(shape)
+            >>> data.roots = [node]
+            >>> [block.__class__.__name__
+            ...  for block in data.get_blocks_by_type(NifFormat.NiAVObject)]
+            ['NiNode', 'NiTriShape']
+            >>> data.get_blocks_by_type(NifFormat.NiTriShape)[0] is shape
+            True
+            """
+            return list(self._get_lookup().get_blocks_by_type(block_type)[0])
+
+        def get_blocks_by_name(self, name):
+            """Return list of all blocks in the tree which have the
+            given name, in the order in which they are first found
+            when walking the tree from the roots.
+
+            >>> data = NifFormat.Data()
+            >>> node = NifFormat.NiNode()
+            >>> node.name = b"Bip01"
+            >>> data.roots = [node]
+            >>> data.get_blocks_by_name(b"Bip01")[0] is node
+            True
+            >>> data.get_blocks_by_name(b"Bip02")
+            []
+            """
+            return list(self._get_lookup().by_name.get(name, []))
+
+        def get_parents(self, block):
+            """Return list of all blocks in the tree which have a
+            reference to C{block}.
+
+            >>> data = NifFormat.Data()
+            >>> node = NifFormat.NiNode()
+            >>> shape = NifFormat.NiTriShape()
+            >>> node.add_child(shape)
+            >>> data.roots = [node]
+            >>> data.get_parents(shape)[0] is node
+            True
+            >>> data.get_parents(node)
+            []
+            """
+            return list(self._get_lookup().parents.get(block, []))
 
     # extensions of generated structures
 
@@ -1625,6 +2473,9 @@ class NifFormat(FileFormat):
             
 
     class Header:
+        # (block types, block classes, results of has_block_type)
+        _block_type_lookup = None
+
         def has_block_type(self, block_type):
             """Check if header has a particular block type.
 
@@ -1642,18 +2493,29 @@ class NifFormat(FileFormat):
             if self.num_block_types == 0:
                 raise ValueError("header does not store any block types")
             # quick first check, without hierarchy, using simple string comparisons
-            if block_type.__name__.encode() in self.block_types:
+            block_types = tuple(self.block_types)
+            if block_type.__name__.encode() in block_types:
                 return True
-            # slower check, using isinstance
-            for data_block_type in self.block_types:
-                data_block_type = data_block_type.decode("ascii")
-                # NiDataStreams are special
-                if data_block_type.startswith("NiDataStream\x01"):
-                    data_block_type = "NiDataStream"
-                if issubclass(getattr(NifFormat, data_block_type), block_type):
-                    return True
-            # requested block type is not in nif
-            return False
+            # slower check, using issubclass, whose results are kept
+            # for as long as the list of block types does not change
+            if (self._block_type_lookup is None
+                or self._block_type_lookup[0] != block_types):
+                block_classes = set()
+                for data_block_type in block_types:
+                    data_block_type = data_block_type.decode("ascii")
+                    # NiDataStreams are special
+                    if data_block_type.startswith("NiDataStream\x01"):
+                        data_block_type = "NiDataStream"
+                    block_classes.add(getattr(NifFormat, data_block_type))
+                self._block_type_lookup = (block_types, block_classes, {})
+            block_types, block_classes, result = self._block_type_lookup
+            try:
+                return result[block_type]
+            except KeyError:
+                result[block_type] = any(
+                    issubclass(block_class, block_type)
+                    for block_class in block_classes)
+                return result[block_type]
 
     class Matrix33:
         def as_list(self):
@@ -2451,58 +3313,60 @@ class NifFormat(FileFormat):
             """
             self.update_mopp_welding()
 
-        def update_mopp_welding(self):
-            """Update the MOPP data, scale, and origin, and welding info."""
+        def update_mopp_welding(self, use_mopper=True):
+            """Update the MOPP data, scale, and origin, and welding info.
+
+            :param use_mopper: Whether to try havok's mopper.exe (which
+                needs windows, or wine) first. If it is not used, or if
+                it fails, the mopp generator of pyffi is used instead
+                (see L{pyffi.utils.mopp.getOriginScaleCodeWelding}).
+            :type use_mopper: ``bool``
+            """
             logger = logging.getLogger("pyffi.mopp")
             # check type of shape
             if not isinstance(self.shape, NifFormat.bhkPackedNiTriStripsShape):
                 raise ValueError(
                     "expected bhkPackedNiTriStripsShape on mopp"
                     " but got %s instead" % self.shape.__class__.__name__)
-            # first try with pyffi.utils.mopp
-            failed = False
-            try:
-                print(pyffi.utils.mopp.getMopperCredits())
-            except (OSError, RuntimeError):
-                failed = True
-            else:
-                # find material indices per triangle
-                material_per_vertex = []
-                for subshape in self.shape.get_sub_shapes():
-                    material_per_vertex += (
-                        [subshape.material] * subshape.num_vertices)
-                material_per_triangle = [
-                    material_per_vertex[hktri.triangle.v_1]
-                    for hktri in self.shape.data.triangles]
-                # compute havok info
-                try:
-                    origin, scale, mopp, welding_infos \
-                    = pyffi.utils.mopp.getMopperOriginScaleCodeWelding(
-                        [vert.as_tuple() for vert in self.shape.data.vertices],
-                        [(hktri.triangle.v_1,
+            vertices = [vert.as_tuple() for vert in self.shape.data.vertices]
+            triangles = [(hktri.triangle.v_1,
                           hktri.triangle.v_2,
                           hktri.triangle.v_3)
-                         for hktri in self.shape.data.triangles],
-                        material_per_triangle)
+                         for hktri in self.shape.data.triangles]
+            result = None
+            if use_mopper:
+                try:
+                    print(pyffi.utils.mopp.getMopperCredits())
+                    # find material indices per triangle
+                    material_per_vertex = []
+                    for subshape in self.shape.get_sub_shapes():
+                        material_per_vertex += (
+                            [subshape.material] * subshape.num_vertices)
+                    material_per_triangle = [
+                        material_per_vertex[v_1] for v_1, v_2, v_3 in triangles]
+                    # compute havok info
+                    result = pyffi.utils.mopp.getMopperOriginScaleCodeWelding(
+                        vertices, triangles, material_per_triangle)
                 except (OSError, RuntimeError):
-                    failed = True
-                else:
-                    # must use calculated scale and origin
-                    self.scale = scale
-                    self.origin.x = origin[0]
-                    self.origin.y = origin[1]
-                    self.origin.z = origin[2]
-            # if havok's mopper failed, do a simple mopp
-            if failed:
-                logger.exception(
-                    "Havok mopp generator failed, falling back on simple mopp "
-                    "(but collisions may be flawed in-game!)."
-                    "If you are using the PyFFI that was shipped with Blender, "
-                    "and you are on Windows, then you may wish to install the "
-                    "full version of PyFFI from "
-                    "https://github.com/niftools/pyffi "
-                    "instead, which includes the (closed source) "
-                    "Havok mopp generator.")
+                    logger.exception(
+                        "Havok mopp generator failed, "
+                        "falling back on pyffi's mopp generator.")
+            if result is None:
+                try:
+                    result = pyffi.utils.mopp.getOriginScaleCodeWelding(
+                        vertices, triangles)
+                except ValueError:
+                    logger.exception(
+                        "Mopp generator failed, falling back on simple mopp "
+                        "(but collisions may be flawed in-game!).")
+            if result is not None:
+                # must use calculated scale and origin
+                origin, scale, mopp, welding_infos = result
+                self.scale = scale
+                self.origin.x = origin[0]
+                self.origin.y = origin[1]
+                self.origin.z = origin[2]
+            else:
                 self.update_origin_scale()
                 mopp = self._makeSimpleMopp()
                 # no welding info
@@ -2546,12 +3410,6 @@ class NifFormat(FileFormat):
             mopp.extend([BOUNDY, miny, maxy])
             mopp.extend([BOUNDX, minx, maxx])
 
-            # add tree using subsequent X-Y-Z splits
-            # (slow and no noticable difference from other simple tree so deactivated)
-            #tris = range(len(self.shape.data.triangles))
-            #tree = self.split_triangles(tris, [[minx,maxx],[miny,maxy],[minz,maxz]])
-            #mopp += self.mopp_from_tree(tree)
-
             # add a trivial tree
             # this prevents the player of walking through the model
             # but arrows may still fly through
@@ -2579,85 +3437,6 @@ class NifFormat(FileFormat):
             moppz = int((v.z - 0.1 - self.origin.z) / self._q)
             return [moppx, moppy, moppz]
 
-        def split_triangles(self, ts, bbox, dir=0):
-            """Direction 0=X, 1=Y, 2=Z"""
-            btest = [] # for bounding box tests
-            test = [] # for branch command
-            # check bounding box
-            tris = [ t.triangle for t in self.shape.data.triangles ]
-            tsverts = [ tris[t].v_1 for t in ts] + [ tris[t].v_2 for t in ts] + [ tris[t].v_3 for t in ts]
-            minx = min([self._vertsfloor[v][0] for v in tsverts])
-            miny = min([self._vertsfloor[v][1] for v in tsverts])
-            minz = min([self._vertsfloor[v][2] for v in tsverts])
-            maxx = max([self._vertsceil[v][0] for v in tsverts])
-            maxy = max([self._vertsceil[v][1] for v in tsverts])
-            maxz = max([self._vertsceil[v][2] for v in tsverts])
-            # add bounding box checks if it's reduced in a direction
-            if (maxx - minx < bbox[0][1] - bbox[0][0]):
-                btest += [ 0x26, minx, maxx ]
-                bbox[0][0] = minx
-                bbox[0][1] = maxx
-            if (maxy - miny < bbox[1][1] - bbox[1][0]):
-                btest += [ 0x27, miny, maxy ]
-                bbox[1][0] = miny
-                bbox[1][1] = maxy
-            if (maxz - minz < bbox[2][1] - bbox[2][0]):
-                btest += [ 0x28, minz, maxz ]
-                bbox[2][0] = minz
-                bbox[2][1] = maxz
-            # if only one triangle, no further split needed
-            if len(ts) == 1:
-                if ts[0] < 32:
-                    return [ btest, [ 0x30 + ts[0] ], [], [] ]
-                elif ts[0] < 256:
-                    return [ btest, [ 0x50, ts[0] ], [], [] ]
-                else:
-                    return [ btest, [ 0x51, ts[0] >> 8, ts[0] & 255 ], [], [] ]
-            # sort triangles in required direction
-            ts.sort(key = lambda t: max(self._vertsceil[tris[t].v_1][dir], self._vertsceil[tris[t].v_2][dir], self._vertsceil[tris[t].v_3][dir]))
-            # split into two
-            ts1 = ts[:len(ts)/2]
-            ts2 = ts[len(ts)/2:]
-            # get maximum coordinate of small group
-            ts1verts = [ tris[t].v_1 for t in ts1] + [ tris[t].v_2 for t in ts1] + [ tris[t].v_3 for t in ts1]
-            ts2verts = [ tris[t].v_1 for t in ts2] + [ tris[t].v_2 for t in ts2] + [ tris[t].v_3 for t in ts2]
-            ts1max = max([self._vertsceil[v][dir] for v in ts1verts])
-            # get minimum coordinate of large group
-            ts2min = min([self._vertsfloor[v][dir] for v in ts2verts])
-            # set up test
-            test += [0x10+dir, ts1max, ts2min]
-            # set up new bounding boxes for each subtree
-            # make copy
-            bbox1 = [[bbox[0][0],bbox[0][1]],[bbox[1][0],bbox[1][1]],[bbox[2][0],bbox[2][1]]]
-            bbox2 = [[bbox[0][0],bbox[0][1]],[bbox[1][0],bbox[1][1]],[bbox[2][0],bbox[2][1]]]
-            # update bound in test direction
-            bbox1[dir][1] = ts1max
-            bbox2[dir][0] = ts2min
-            # return result
-            nextdir = dir+1
-            if nextdir == 3: nextdir = 0
-            return [btest, test, self.split_triangles(ts1, bbox1, nextdir), self.split_triangles(ts2, bbox2, nextdir)]
-
-        def mopp_from_tree(self, tree):
-            if tree[1][0] in range(0x30, 0x52):
-                return tree[0] + tree[1]
-            mopp = tree[0] + tree[1]
-            submopp1 = self.mopp_from_tree(tree[2])
-            submopp2 = self.mopp_from_tree(tree[3])
-            if len(submopp1) < 256:
-                mopp += [ len(submopp1) ]
-                mopp += submopp1
-                mopp += submopp2
-            else:
-                jump = len(submopp2)
-                if jump <= 255:
-                    mopp += [2, 0x05, jump]
-                else:
-                    mopp += [3, 0x06, jump >> 8, jump & 255]
-                mopp += submopp2
-                mopp += submopp1
-            return mopp
-
         # ported and extended from NifVis/bhkMoppBvTreeShape.py
         def parse_mopp(self, start = 0, depth = 0, toffset = 0, verbose = False):
             """The mopp data is printed to the debug channel
@@ -4460,33 +5239,34 @@ class NifFormat(FileFormat):
             :return: A generator yielding a hash value for each vertex.
             """
             
-            verts = self.vertices if self.has_vertices else None
-            norms = self.normals if self.has_normals else None
-            uvsets = self.uv_sets if len(self.uv_sets) else None
-            vcols = self.vertex_colors if self.has_vertex_colors else None
-            vertexfactor = 10 ** vertexprecision
-            normalfactor = 10 ** normalprecision
-            uvfactor = 10 ** uvprecision
-            vcolfactor = 10 ** vcolprecision
-            for i in range(self.num_vertices):
-                h = []
-                if verts:
-                    h.extend([float_to_int(x * vertexfactor)
-                             for x in [verts[i].x, verts[i].y, verts[i].z]])
-                if norms:
-                    h.extend([float_to_int(x * normalfactor)
-                              for x in [norms[i].x, norms[i].y, norms[i].z]])
-                if uvsets:
-                    for uvset in uvsets:
-                        # uvs sometimes have NaN, for example:
-                        # oblivion/meshes/architecture/anvil/anvildooruc01.nif
-                        h.extend([float_to_int(x * uvfactor)
-                                  for x in [uvset[i].u, uvset[i].v]])
-                if vcols:
-                    h.extend([float_to_int(x * vcolfactor)
-                              for x in [vcols[i].r, vcols[i].g,
-                                        vcols[i].b, vcols[i].a]])
-                yield tuple(h)
+            num_vertices = self.num_vertices
+            # quantize all values column by column, which is much faster
+            # than quantizing vertex by vertex
+            columns = []
+            def add_columns(array, names, precision):
+                factor = 10 ** precision
+                for column in array.get_columns(names):
+                    if len(column) < num_vertices:
+                        raise IndexError("list index out of range")
+                    columns.append(
+                        float_to_int_list(column[:num_vertices], factor))
+            if self.has_vertices and self.vertices:
+                add_columns(self.vertices, ("x", "y", "z"), vertexprecision)
+            if self.has_normals and self.normals:
+                add_columns(self.normals, ("x", "y", "z"), normalprecision)
+            # uvs sometimes have NaN, for example:
+            # oblivion/meshes/architecture/anvil/anvildooruc01.nif
+            for uvset in self.uv_sets:
+                add_columns(uvset, ("u", "v"), uvprecision)
+            if self.has_vertex_colors and self.vertex_colors:
+                add_columns(self.vertex_colors, ("r", "g", "b", "a"),
+                            vcolprecision)
+            if columns:
+                for h in zip(*columns):
+                    yield h
+            else:
+                for i in range(num_vertices):
+                    yield ()
 
     class NiGeometry:
         """
@@ -5653,7 +6433,50 @@ class NifFormat(FileFormat):
             self.add_extra_data(extra)
 
     class NiObject:
+        # set on blocks which are read lazily, see NifFormat.Data.read
+        _lazy = None
+        # whether the block type is described in nif.xml
+        _is_unknown = False
+        # weak reference to the lookup tables which contain the block,
+        # see NifFormat.Data._Lookup
+        _lookup_ref = None
+        # maps id of each link to this block to a weak reference to
+        # the link, see NifFormat.Data.replace_global_node
+        _referrers = None
+
+        def __getattr__(self, name):
+            # only called if the attribute is not found: so if the
+            # block has not been decoded yet, then do it now
+            if self._lazy is None:
+                raise AttributeError(
+                    "'%s' object has no attribute '%s'"
+                    % (self.__class__.__name__, name))
+            self._lazy[0]._decode_block(self)
+            return getattr(self, name)
+
+        def fix_links(self, data):
+            # the links belong to this block
+            data._link_owner = weakref.ref(self)
+            try:
+                StructBase.fix_links(self, data)
+            finally:
+                data._link_owner = None
+
+        def _get_lookup(self):
+            """Return the lookup tables which contain this block, if
+            they exist and are up to date, otherwise ``None``."""
+            if self._lookup_ref is None:
+                return None
+            lookup = self._lookup_ref()
+            if lookup is None or not lookup.is_fresh():
+                return None
+            return lookup
+
         def find(self, block_name = None, block_type = None):
+            # use the lookup tables, if available (see NifFormat.Data)
+            lookup = self._get_lookup()
+            if lookup is not None and self in lookup.closed:
+                return lookup.find(self, block_name, block_type)
             # does this block match the search criteria?
             if block_name and block_type:
                 if isinstance(self, block_type):
@@ -5686,6 +6509,10 @@ class NifFormat(FileFormat):
             :param block_type: The type that blocks should have in this chain."""
 
             if self is block: return [self]
+            # use the lookup tables, if available (see NifFormat.Data)
+            lookup = self._get_lookup()
+            if lookup is not None and self in lookup.treelike:
+                return lookup.find_chain(self, block, block_type)
             for child in self.get_refs():
                 if block_type and not isinstance(child, block_type): continue
                 child_chain = child.find_chain(block, block_type)
@@ -5711,11 +6538,11 @@ class NifFormat(FileFormat):
             :param unique: Whether the generator can return the same block twice or not."""
             # unique blocks: reduce this to the case of non-unique blocks
             if unique:
-                block_list = []
+                block_ids = set()
                 for block in self.tree(block_type = block_type, follow_all = follow_all, unique = False):
-                    if not block in block_list:
+                    if not id(block) in block_ids:
                         yield block
-                        block_list.append(block)
+                        block_ids.add(id(block))
                 return
 
             # yield self
@@ -5738,11 +6565,11 @@ class NifFormat(FileFormat):
             # will visit some child more than once (and as a consequence, infinitely
             # many times). So, walk the reference tree and check that every block is
             # only visited once.
-            children = []
+            children = set()
             for child in self.tree():
-                if child in children:
+                if id(child) in children:
                     raise ValueError('cyclic references detected')
-                children.append(child)
+                children.add(id(child))
 
         def is_interchangeable(self, other):
             """Are the two blocks interchangeable?
@@ -5757,6 +6584,18 @@ class NifFormat(FileFormat):
                 # for blocks with references: quick check only
                 return self is other
 
+        def get_interchangeable_hash(self):
+            """Hash value for finding interchangeable blocks: blocks that
+            are interchangeable have equal hash values, so only blocks
+            with equal hash values need to be checked with
+            L{is_interchangeable}. Returns ``None`` if the block is
+            only interchangeable with itself.
+            """
+            if isinstance(self, (NifFormat.NiProperty, NifFormat.NiSourceTexture)):
+                return (self.__class__, self.get_hash())
+            else:
+                return None
+
     class NiMaterialProperty:
         def is_interchangeable(self, other):
             """Are the two material blocks interchangeable?"""
@@ -5772,6 +6611,11 @@ class NifFormat(FileFormat):
                 # ignore name
                 return self.get_hash()[1:] == other.get_hash()[1:]
 
+        def get_interchangeable_hash(self):
+            """Hash value for finding interchangeable blocks, ignoring
+            the name (see L{is_interchangeable})."""
+            return (self.__class__, self.get_hash()[1:])
+
     class ATextureRenderData:
         def save_as_dds(self, stream):
             """Save image as DDS file."""
@@ -6050,6 +6894,43 @@ class NifFormat(FileFormat):
             # looks pretty identical!
             return True
 
+        def get_interchangeable_hash(self):
+            """Hash value for finding interchangeable geometries:
+            geometries with different hash values are never
+            interchangeable (see L{is_interchangeable}).
+
+            >>> from pyffi.formats.nif import NifFormat
+            >>> geomdata = NifFormat.NiTriShapeData()
+            >>> geomdata.num_vertices = 3
+            >>> geomdata.has_vertices = True
+            >>> geomdata.vertices.update_size()
+            >>> geomdata.vertices[1].x = 1.0
+            >>> geomdata.vertices[2].y = 1.0
+            >>> geomdata.set_triangles([(0, 1, 2)])
+            >>> other = NifFormat.NiTriShapeData()
+            >>> other.num_vertices = 3
+            >>> other.has_vertices = True
+            >>> other.vertices.update_size()
+            >>> other.vertices[2].x = 1.0
+            >>> other.vertices[0].y = 1.0
+            >>> other.set_triangles([(1, 2, 0)])
+            >>> geomdata.get_interchangeable_hash() == other.get_interchangeable_hash()
+            True
+            >>> geomdata.is_interchangeable(other)
+            True
+            """
+            # center is compared with a tolerance, so it is left out
+            verthashes = list(self.get_vertex_hash_generator())
+            return (self.__class__,
+                    tuple(getattr(self, attribute) for attribute in (
+                        "num_vertices", "keep_flags", "compress_flags",
+                        "has_vertices", "num_uv_sets", "has_normals",
+                        "radius", "has_vertex_colors", "has_uv",
+                        "consistency_flags")),
+                    frozenset(verthashes),
+                    frozenset(tuple(verthashes[i] for i in tri)
+                              for tri in self.get_triangles()))
+
         def get_triangle_indices(self, triangles):
             """Yield list of triangle indices (relative to
             self.get_triangles()) of given triangles. Degenerate triangles in
@@ -6148,7 +7029,7 @@ class NifFormat(FileFormat):
 
             return zip(self.data.normals, tangents, bitangents)
 
-        def update_tangent_space(self, as_extra=None, vertexprecision=3, normalprecision=3):
+        def update_tangent_space(self, as_extra=None, vertexprecision=3, normalprecision=3, welding_groups=None):
             """Recalculate tangent space data.
 
             :param as_extra: Whether to store the tangent space data as extra data
@@ -6156,6 +7037,12 @@ class NifFormat(FileFormat):
                 Oblivion if an extra data block is found, otherwise does default.
                 Set it to override this detection (for example when using this
                 function to create tangent space data) and force behaviour.
+            :param welding_groups: Welding group of every vertex, as a list
+                of ints numbered from zero; vertices in the same group share
+                their tangent space. If not set, vertices are grouped by
+                (vertex, normal) hash, using C{vertexprecision} and
+                C{normalprecision}. Set it to reuse a map that was already
+                computed, for instance when removing duplicate vertices.
             """
             # check that self.data exists and is valid
             if not isinstance(self.data, NifFormat.NiTriBasedGeomData):
@@ -6176,138 +7063,46 @@ class NifFormat(FileFormat):
             # check that shape has norms and uvs
             if len(uvs) == 0 or len(norms) == 0: return
 
-            # identify identical (vertex, normal) pairs to avoid issues along
-            # uv seams due to vertex duplication
-            # implementation note: uvprecision and vcolprecision 0
-            # should be enough, but use -2 just to be really sure
-            # that this is ignored
-            v_hash_map = list(
-                self.data.get_vertex_hash_generator(
-                    vertexprecision=vertexprecision,
-                    normalprecision=normalprecision,
-                    uvprecision=-2,
-                    vcolprecision=-2))
-
-            # tangent and binormal dictionaries by vertex hash
-            bin = dict((h, NifFormat.Vector3()) for h in v_hash_map)
-            tan = dict((h, NifFormat.Vector3()) for h in v_hash_map)
-
-            # calculate tangents and binormals from vertex and texture coordinates
-            for t1, t2, t3 in self.data.get_triangles():
-                # find hash values
-                h1 = v_hash_map[t1]
-                h2 = v_hash_map[t2]
-                h3 = v_hash_map[t3]
-                # skip degenerate triangles
-                if h1 == h2 or h2 == h3 or h3 == h1:
+            if welding_groups is None:
+                # identify identical (vertex, normal) pairs to avoid issues
+                # along uv seams due to vertex duplication
+                # implementation note: uvprecision and vcolprecision 0
+                # should be enough, but use -2 just to be really sure
+                # that this is ignored
+                welding_groups = pyffi.utils.unique_map(
+                    self.data.get_vertex_hash_generator(
+                        vertexprecision=vertexprecision,
+                        normalprecision=normalprecision,
+                        uvprecision=-2,
+                        vcolprecision=-2))[0]
+            num_vertices = len(welding_groups)
+
+            # normalize the normals; if the normal has NAN values or is
+            # zero, just pick something in that case
+            normals = []
+            for i, (x, y, z) in enumerate(zip(*[
+                    column[:num_vertices]
+                    for column in norms.get_columns(("x", "y", "z"))])):
+                norm = x * x + y * y + z * z
+                if not norm:
+                    normals.append((0.0, 1.0, 0.0))
                     continue
-
-                v_1 = verts[t1]
-                v_2 = verts[t2]
-                v_3 = verts[t3]
-                w1 = uvs[t1]
-                w2 = uvs[t2]
-                w3 = uvs[t3]
-                v_2v_1 = v_2 - v_1
-                v_3v_1 = v_3 - v_1
-                w2w1 = w2 - w1
-                w3w1 = w3 - w1
-
-                # surface of triangle in texture space
-                r = w2w1.u * w3w1.v - w3w1.u * w2w1.v
-
-                # sign of surface
-                r_sign = (1 if r >= 0 else -1)
-
-                # contribution of this triangle to tangents and binormals
-                sdir = NifFormat.Vector3()
-                sdir.x = (w3w1.v * v_2v_1.x - w2w1.v * v_3v_1.x) * r_sign
-                sdir.y = (w3w1.v * v_2v_1.y - w2w1.v * v_3v_1.y) * r_sign
-                sdir.z = (w3w1.v * v_2v_1.z - w2w1.v * v_3v_1.z) * r_sign
-                try:
-                    sdir.normalize()
-                except ZeroDivisionError: # catches zero vector
-                    continue # skip triangle
-                except ValueError: # catches invalid data
-                    continue # skip triangle
-
-                tdir = NifFormat.Vector3()
-                tdir.x = (w2w1.u * v_3v_1.x - w3w1.u * v_2v_1.x) * r_sign
-                tdir.y = (w2w1.u * v_3v_1.y - w3w1.u * v_2v_1.y) * r_sign
-                tdir.z = (w2w1.u * v_3v_1.z - w3w1.u * v_2v_1.z) * r_sign
-                try:
-                    tdir.normalize()
-                except ZeroDivisionError: # catches zero vector
-                    continue # skip triangle
-                except ValueError: # catches invalid data
-                    continue # skip triangle
-
-                # vector combination algorithm could possibly be improved
-                for h in [h1, h2, h3]:
-                    # addition inlined for speed
-                    tanh = tan[h]
-                    tanh.x += tdir.x
-                    tanh.y += tdir.y
-                    tanh.z += tdir.z
-                    binh = bin[h]
-                    binh.x += sdir.x
-                    binh.y += sdir.y
-                    binh.z += sdir.z
-
-            xvec = NifFormat.Vector3()
-            xvec.x = 1.0
-            xvec.y = 0.0
-            xvec.z = 0.0
-            yvec = NifFormat.Vector3()
-            yvec.x = 0.0
-            yvec.y = 1.0
-            yvec.z = 0.0
-            for n, h in zip(norms, v_hash_map):
-                binh = bin[h]
-                tanh = tan[h]
-                try:
-                    n.normalize()
-                except (ValueError, ZeroDivisionError):
-                    # this happens if the normal has NAN values or is zero
-                    # just pick something in that case
-                    n = yvec
-                try:
-                    # turn n, bin, tan into a base via Gram-Schmidt
-                    # bin[h] -= n * (n * bin[h])
-                    # inlined for speed
-                    scalar = n * binh
-                    binh.x -= n.x * scalar
-                    binh.y -= n.y * scalar
-                    binh.z -= n.z * scalar
-                    binh.normalize()
-
-                    # tan[h] -= n * (n * tan[h])
-                    # tan[h] -= bin[h] * (bin[h] * tan[h])
-                    # inlined for speed
-                    scalar = n * tanh
-                    tanh.x -= n.x * scalar
-                    tanh.y -= n.y * scalar
-                    tanh.z -= n.z * scalar
-                    
-                    scalar = binh * tanh
-                    tanh.x -= binh.x * scalar
-                    tanh.y -= binh.y * scalar
-                    tanh.z -= binh.z * scalar
-                    tanh.normalize()
-                except ZeroDivisionError:
-                    # insuffient data to set tangent space for this vertex
-                    # in that case pick a space
-                    binh = xvec.crossproduct(n)
-                    try:
-                        binh.normalize()
-                    except ZeroDivisionError:
-                        binh = yvec.crossproduct(n)
-                        binh.normalize() # should work now
-                    tanh = n.crossproduct(binh)
-
-            # tangent and binormal lists by vertex index
-            tan = [tan[h] for h in v_hash_map]
-            bin = [bin[h] for h in v_hash_map]
+                factor = 1.0 / math.sqrt(norm)
+                normal = (x * factor, y * factor, z * factor)
+                if normal != (x, y, z):
+                    norms[i].x, norms[i].y, norms[i].z = normal
+                normals.append(normal)
+
+            tan, bin = pyffi.utils.tangentspace.getWeldedTangentSpace(
+                vertices=list(zip(*[
+                    column[:num_vertices]
+                    for column in verts.get_columns(("x", "y", "z"))])),
+                normals=normals,
+                uvs=list(zip(*[
+                    column[:num_vertices]
+                    for column in uvs.get_columns(("u", "v"))])),
+                triangles=self.data.get_triangles(),
+                groups=welding_groups)
 
             # find possible extra data block
             for extra in self.get_extra_datas():
@@ -6333,11 +7128,9 @@ class NifFormat(FileFormat):
                     self.add_extra_data(extra)
 
                 # write the data
-                binarydata = bytearray()
-                for vec in tan + bin:
-                    # XXX _byte_order!! assuming little endian
-                    binarydata += struct.pack('<fff', vec.x, vec.y, vec.z)
-                extra.binary_data = bytes(binarydata)
+                # XXX _byte_order!! assuming little endian
+                extra.binary_data = struct.pack(
+                    '<%if' % (6 * len(tan)), *chain(*(tan + bin)))
             else:
                 # set tangent space flag
                 self.data.extra_vectors_flags = 16
@@ -6346,13 +7139,9 @@ class NifFormat(FileFormat):
                 self.data.tangents.update_size()
                 self.data.bitangents.update_size()
                 for vec, data_tans in zip(tan, self.data.tangents):
-                    data_tans.x = vec.x
-                    data_tans.y = vec.y
-                    data_tans.z = vec.z
+                    data_tans.x, data_tans.y, data_tans.z = vec
                 for vec, data_bins in zip(bin, self.data.bitangents):
-                    data_bins.x = vec.x
-                    data_bins.y = vec.y
-                    data_bins.z = vec.z
+                    data_bins.x, data_bins.y, data_bins.z = vec
                     
                 
 
@@ -6451,7 +7240,23 @@ class NifFormat(FileFormat):
             if triangles is None:
                 triangles = geomdata.get_triangles()
 
+            # bones of every vertex, as a bitset
+            def get_bitset(weight):
+                bitset = 0
+                for bonenum, boneweight in weight:
+                    bitset |= 1 << bonenum
+                return bitset
+            def count_bits(bitset):
+                return bin(bitset).count("1")
+            vertexbones = [get_bitset(weight) for weight in weights]
+
             for tri in triangles:
+                # skip triangles which already meet the target
+                tribones = 0
+                for t in tri:
+                    tribones |= vertexbones[t]
+                if count_bits(tribones) <= maxbonesperpartition:
+                    continue
                 while True:
                     # find the bones influencing this triangle
                     tribones = []
@@ -6508,79 +7313,114 @@ class NifFormat(FileFormat):
                             totalweight = sum([x[1] for x in weight])
                             for x in weight:
                                 x[1] /= totalweight
+                for t in tri:
+                    vertexbones[t] = get_bitset(weights[t])
 
             # split triangles into partitions
             logger.info("Creating partitions")
+            # triangles beyond the end of trianglepartmap are dropped
+            tripartindices = list(zip(triangles, trianglepartmap))
+            triangles = [tri for tri, partindex in tripartindices]
+            trianglepartmap = [partindex for tri, partindex in tripartindices]
+            del tripartindices
+            num_triangles = len(triangles)
+            tribones = [vertexbones[t0] | vertexbones[t1] | vertexbones[t2]
+                        for t0, t1, t2 in triangles]
+            # triangles by partition index and by bones, in order
+            buckets = {}
+            for i, (partindex, bones) in enumerate(
+                zip(trianglepartmap, tribones)):
+                buckets.setdefault(partindex, {}).setdefault(
+                    bones, []).append(i)
+            # triangles of every vertex, in order
+            vertextriangles = [[] for weight in weights]
+            for i, tri in enumerate(triangles):
+                for t in tri:
+                    vertextriangles[t].append(i)
+            remaining = bytearray(b"\x01") * num_triangles
+            firsttriangle = 0
             parts = []
             # keep creating partitions as long as there are triangles left
-            while triangles:
+            while True:
+                while (firsttriangle < num_triangles
+                       and not remaining[firsttriangle]):
+                    firsttriangle += 1
+                if firsttriangle == num_triangles:
+                    break
                 # create a partition
-                part = [set(), [], None] # bones, triangles, partition index
+                part = [0, [], trianglepartmap[firsttriangle]] # bones, triangles, partition index
                 usedverts = set()
-                addtriangles = True
-                # keep adding triangles to it as long as the flag is set
-                while addtriangles:
-                    # newtriangles is a list of triangles that have not been added to
-                    # the partition, similar for newtrianglepartmap
-                    newtriangles = []
-                    newtrianglepartmap = []
-                    for tri, partindex in zip(triangles, trianglepartmap):
-                        # find the bones influencing this triangle
-                        tribones = []
-                        for t in tri:
-                            tribones.extend([
-                                bonenum for bonenum, boneweight in weights[t]])
-                        tribones = set(tribones)
-                        # if part has no bones,
-                        # or if part has all bones of tribones and index coincides
-                        # then add this triangle to this part
-                        if ((not part[0])
-                            or ((part[0] >= tribones) and (part[2] == partindex))):
-                            part[0] |= tribones
-                            part[1].append(tri)
-                            usedverts |= set(tri)
-                            # if part was empty, assign it the index
-                            if part[2] is None:
-                                part[2] = partindex
-                        else:
-                            newtriangles.append(tri)
-                            newtrianglepartmap.append(partindex)
-                    triangles = newtriangles
-                    trianglepartmap = newtrianglepartmap
-
+                # remaining triangles which are adjacent to the partition,
+                # and have the same index
+                adjacent = set()
+                # adjacent triangles which have too many bones for the
+                # partition (the partition only gains bones, so these
+                # will never fit)
+                rejected = set()
+                def add_triangle(i):
+                    """Add triangle to the partition, and return the
+                    triangles which have become adjacent."""
+                    remaining[i] = 0
+                    part[0] |= tribones[i]
+                    part[1].append(triangles[i])
+                    newadjacent = []
+                    for t in triangles[i]:
+                        if t in usedverts:
+                            continue
+                        usedverts.add(t)
+                        for j in vertextriangles[t]:
+                            if (remaining[j] and j not in adjacent
+                                and j not in rejected
+                                and trianglepartmap[j] == part[2]):
+                                adjacent.add(j)
+                                newadjacent.append(j)
+                    return newadjacent
+                # as long as the partition has no bones, add all
+                # following triangles
+                for i in range(firsttriangle, num_triangles):
+                    if part[0]:
+                        break
+                    if remaining[i]:
+                        add_triangle(i)
+                # keep adding triangles to it as long as possible
+                subsetbones = None
+                while True:
+                    # add all triangles whose bones the partition has
+                    if part[0] != subsetbones:
+                        subsetbones = part[0]
+                        partbuckets = buckets.get(part[2], {})
+                        subset = []
+                        for bones in [bones for bones in partbuckets
+                                      if not bones & ~subsetbones]:
+                            subset.extend(i for i in partbuckets.pop(bones)
+                                          if remaining[i])
+                        for i in sorted(subset):
+                            add_triangle(i)
                     # if we have room left in the partition
-                    # then add adjacent triangles
+                    # then add adjacent triangles, in order; triangles
+                    # which become adjacent but come before the current
+                    # one are tried in the next run
+                    if count_bits(part[0]) >= maxbonesperpartition:
+                        break
                     addtriangles = False
-                    newtriangles = []
-                    newtrianglepartmap = []
-                    if len(part[0]) < maxbonesperpartition:
-                        for tri, partindex in zip(triangles, trianglepartmap):
-                            # if triangle is adjacent, and has same index
-                            # then check if it can be added to the partition
-                            if (usedverts & set(tri)) and (part[2] == partindex):
-                                # find the bones influencing this triangle
-                                tribones = []
-                                for t in tri:
-                                    tribones.extend([
-                                        bonenum for bonenum, boneweight in weights[t]])
-                                tribones = set(tribones)
-                                # and check if we exceed the maximum number of allowed
-                                # bones
-                                if len(part[0] | tribones) <= maxbonesperpartition:
-                                    part[0] |= tribones
-                                    part[1].append(tri)
-                                    usedverts |= set(tri)
-                                    # signal another try in adding triangles to
-                                    # the partition
-                                    addtriangles = True
-                                else:
-                                    newtriangles.append(tri)
-                                    newtrianglepartmap.append(partindex)
-                            else:
-                                newtriangles.append(tri)
-                                newtrianglepartmap.append(partindex)
-                        triangles = newtriangles
-                        trianglepartmap = newtrianglepartmap
+                    candidates = sorted(adjacent)
+                    while candidates:
+                        i = heapq.heappop(candidates)
+                        adjacent.discard(i)
+                        if not remaining[i]:
+                            continue
+                        # check if we exceed the maximum number of allowed
+                        # bones
+                        if (count_bits(part[0] | tribones[i])
+                            <= maxbonesperpartition):
+                            for j in add_triangle(i):
+                                if j > i:
+                                    heapq.heappush(candidates, j)
+                            addtriangles = True
+                        else:
+                            rejected.add(i)
+                    if not addtriangles:
+                        break
 
                 parts.append(part)
 
@@ -6593,27 +7433,27 @@ class NifFormat(FileFormat):
                 merged = False
                 # newparts is to contain the updated merged partitions as we go
                 newparts = []
-                # addedparts is the set of all partitions from parts that have been
+                # addedparts flags all partitions from parts that have been
                 # added to newparts
-                addedparts = set()
+                addedparts = bytearray(len(parts))
                 # try all combinations
                 for a, parta in enumerate(parts):
-                    if a in addedparts:
+                    if addedparts[a]:
                         continue
                     newparts.append(parta)
-                    addedparts.add(a)
-                    for b, partb in enumerate(parts):
-                        if b <= a:
-                            continue
-                        if b in addedparts:
+                    addedparts[a] = 1
+                    for b in range(a + 1, len(parts)):
+                        if addedparts[b]:
                             continue
+                        partb = parts[b]
                         # if partition indices are the same, and bone limit is not
                         # exceeded, merge them
                         if ((parta[2] == partb[2])
-                            and (len(parta[0] | partb[0]) <= maxbonesperpartition)):
+                            and (count_bits(parta[0] | partb[0])
+                                 <= maxbonesperpartition)):
                             parta[0] |= partb[0]
                             parta[1] += partb[1]
-                            addedparts.add(b)
+                            addedparts[b] = 1
                             merged = True # signal another try in merging partitions
                 # update partitions to the merged partitions
                 parts = newparts
@@ -6655,7 +7495,8 @@ class NifFormat(FileFormat):
                     parts = []
                     for otherpart in oldparts:
                         # check if bones can be added
-                        if len(sharedboneset | otherpart[0]) <= maxbonesperpartition:
+                        if (count_bits(sharedboneset | otherpart[0])
+                            <= maxbonesperpartition):
                             # ok, we can share bones!
                             # update set of shared bones
                             sharedboneset |= otherpart[0]
@@ -6693,20 +7534,27 @@ class NifFormat(FileFormat):
                     # store part for next iteration
                     lastpart = part
 
-            for skinpartblock, part in zip(skinpart.skin_partition_blocks, parts):
+            for partnum, (skinpartblock, part) in enumerate(
+                zip(skinpart.skin_partition_blocks, parts)):
                 # get sorted list of bones
-                bones = sorted(list(part[0]))
+                bones = [bonenum for bonenum in range(part[0].bit_length())
+                         if part[0] >> bonenum & 1]
                 triangles = part[1]
                 logger.info("Optimizing triangle ordering in partition %i"
-                            % parts.index(part))
+                            % partnum)
                 # optimize triangles for vertex cache and calculate strips
                 triangles = pyffi.utils.vertex_cache.get_cache_optimized_triangles(
                     triangles)
-                strips = pyffi.utils.vertex_cache.stable_stripify(
-                    triangles, stitchstrips=stitchstrips)
+                if stripify is False:
+                    strips = []
+                else:
+                    strips = pyffi.utils.vertex_cache.stable_stripify(
+                        triangles, stitchstrips=stitchstrips)
                 triangles_size = 3 * len(triangles)
                 strips_size = len(strips) + sum(len(strip) for strip in strips)
                 vertices = []
+                # maps each vertex to its index in vertices
+                vertexindex = {}
                 # decide whether to use strip or triangles as primitive
                 if stripify is None:
                     stripifyblock = (
@@ -6725,7 +7573,8 @@ class NifFormat(FileFormat):
                     for strip in strips:
                         numtriangles += len(strip) - 2
                         for t in strip:
-                            if t not in vertices:
+                            if t not in vertexindex:
+                                vertexindex[t] = len(vertices)
                                 vertices.append(t)
                 else:
                     numtriangles = len(triangles)
@@ -6734,7 +7583,8 @@ class NifFormat(FileFormat):
                     # by triangle
                     for tri in triangles:
                         for t in tri:
-                            if t not in vertices:
+                            if t not in vertexindex:
+                                vertexindex[t] = len(vertices)
                                 vertices.append(t)
                 # set all the data
                 skinpartblock.num_vertices = len(vertices)
@@ -6768,12 +7618,6 @@ class NifFormat(FileFormat):
                     skinpartblock.vertex_map[i] = v
                 skinpartblock.has_vertex_weights = True
                 skinpartblock.vertex_weights.update_size()
-                for i, v in enumerate(vertices):
-                    for j in range(skinpartblock.num_weights_per_vertex):
-                        if j < len(weights[v]):
-                            skinpartblock.vertex_weights[i][j] = weights[v][j][1]
-                        else:
-                            skinpartblock.vertex_weights[i][j] = 0.0
                 if stripifyblock:
                     skinpartblock.has_faces = True
                     skinpartblock.strip_lengths.update_size()
@@ -6782,7 +7626,7 @@ class NifFormat(FileFormat):
                     skinpartblock.strips.update_size()
                     for i, strip in enumerate(strips):
                         for j, v in enumerate(strip):
-                            skinpartblock.strips[i][j] = vertices.index(v)
+                            skinpartblock.strips[i][j] = vertexindex[v]
                 else:
                     skinpartblock.has_faces = True
                     # clear strip lengths array
@@ -6791,43 +7635,41 @@ class NifFormat(FileFormat):
                     skinpartblock.strips.update_size()
                     skinpartblock.triangles.update_size()
                     for i, (v_1,v_2,v_3) in enumerate(triangles):
-                        skinpartblock.triangles[i].v_1 = vertices.index(v_1)
-                        skinpartblock.triangles[i].v_2 = vertices.index(v_2)
-                        skinpartblock.triangles[i].v_3 = vertices.index(v_3)
+                        skinpartblock.triangles[i].v_1 = vertexindex[v_1]
+                        skinpartblock.triangles[i].v_2 = vertexindex[v_2]
+                        skinpartblock.triangles[i].v_3 = vertexindex[v_3]
                 skinpartblock.has_bone_indices = True
                 skinpartblock.bone_indices.update_size()
+                boneindex = dict((bonenum, i) for i, bonenum in enumerate(bones))
+                num_weights_per_vertex = skinpartblock.num_weights_per_vertex
                 for i, v in enumerate(vertices):
                     # the boneindices set keeps track of indices that have not been
                     # used yet
                     boneindices = set(range(skinpartblock.num_bones))
-                    for j in range(len(weights[v])):
-                        skinpartblock.bone_indices[i][j] = bones.index(weights[v][j][0])
-                        boneindices.remove(skinpartblock.bone_indices[i][j])
-                    for j in range(len(weights[v]),skinpartblock.num_weights_per_vertex):
+                    vweights = []
+                    for bonenum, boneweight in weights[v]:
+                        vweights.append([boneindex[bonenum], boneweight])
+                        boneindices.remove(boneindex[bonenum])
+                    for j in range(len(weights[v]), num_weights_per_vertex):
                         if padbones:
                             # if padbones is True then we have enforced
                             # num_bones == num_weights_per_vertex so this will not trigger
                             # a KeyError
-                            skinpartblock.bone_indices[i][j] = boneindices.pop()
+                            vweights.append([boneindices.pop(), 0.0])
                         else:
-                            skinpartblock.bone_indices[i][j] = 0
-
-                # sort weights
-                for i, v in enumerate(vertices):
-                    vweights = []
-                    for j in range(skinpartblock.num_weights_per_vertex):
-                        vweights.append([
-                            skinpartblock.bone_indices[i][j],
-                            skinpartblock.vertex_weights[i][j]])
+                            vweights.append([0, 0.0])
+                    # sort weights
                     if padbones:
                         # by bone index (for ffvt3r)
                         vweights.sort(key=lambda w: w[0])
                     else:
                         # by weight (for fallout 3, largest weight first)
                         vweights.sort(key=lambda w: -w[1])
-                    for j in range(skinpartblock.num_weights_per_vertex):
-                        skinpartblock.bone_indices[i][j] = vweights[j][0]
-                        skinpartblock.vertex_weights[i][j] = vweights[j][1]
+                    bone_indices = skinpartblock.bone_indices[i]
+                    vertex_weights = skinpartblock.vertex_weights[i]
+                    for j in range(num_weights_per_vertex):
+                        bone_indices[j] = vweights[j][0]
+                        vertex_weights[j] = vweights[j][1]
 
             return lostweight
 
@@ -7244,6 +8086,41 @@ class NifFormat(FileFormat):
             v.v = -self.v
             return v
 
+def _decode_blocks(args):
+    """Decode blocks in a worker process, for
+    L{NifFormat.Data._read_blocks_parallel}. Returns, pickled, a list
+    with for every block the block, its links (as block indices), and
+    the number of bytes by which its stored size exceeds its size as
+    read (see L{NifFormat.Data.strict_block_size}).
+    """
+    (version, user_version, user_version_2, byte_order, modification,
+     string_list, strict_block_size, raw_blocks) = args
+    data = NifFormat.Data(version, user_version, user_version_2)
+    data._byte_order = byte_order
+    data.modification = modification
+    data._string_list = string_list
+    result = []
+    for block_type, raw, data_stream in raw_blocks:
+        block = getattr(NifFormat, block_type)()
+        stream = io.BytesIO(raw)
+        data._link_stack = []
+        try:
+            block.read(stream, data)
+            # complete NiDataStream data
+            if data_stream:
+                block.usage = data_stream[0]
+                block.access.populate_attribute_values(data_stream[1], data)
+        except:
+            logging.getLogger("pyffi.nif.data").exception(
+                "Reading %s failed" % block.__class__)
+            raise
+        if strict_block_size:
+            size = block.get_size(data=data)
+        else:
+            size = stream.tell()
+        result.append((block, data._link_stack, len(raw) - size))
+    return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+
 if __name__=='__main__':
     import doctest
     doctest.testmod()
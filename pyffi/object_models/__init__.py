@@ -82,6 +82,7 @@ import sys # version_info
 
 import pyffi.utils
 import pyffi.utils.graph
+from pyffi.utils.memory_stream import open_file
 
 
 class MetaFileFormat(type):
@@ -333,13 +334,15 @@ class FileFormat(object):
         :param topdown: Determines whether subdirectories should be iterated
             over first.
         :type topdown: ``bool``
-        :param mode: The mode in which to open files.
+        :param mode: The mode in which to open files. Files that are
+            opened in ``'rb'`` mode are mapped in memory (see
+            :class:`~pyffi.utils.memory_stream.MemoryStream`).
         :type mode: ``str``
         """
         # now walk over all these files in directory top
         for filename in pyffi.utils.walk(top, topdown, onerror=None,
                                          re_filename=cls.RE_FILENAME):
-            stream = open(filename, mode)
+            stream = open_file(filename, mode)
             try:
                 # return data for the stream
                 # the caller can call data.read(stream),
@@ -365,13 +368,15 @@ class FileFormat(object):
         :param topdown: Determines whether subdirectories should be iterated
             over first.
         :type topdown: ``bool``
-        :param mode: The mode in which to open files.
+        :param mode: The mode in which to open files. Files that are
+            opened in ``'rb'`` mode are mapped in memory (see
+            :class:`~pyffi.utils.memory_stream.MemoryStream`).
         :type mode: ``str``
         """
         # now walk over all these files in directory top
         for filename in pyffi.utils.walk(top, topdown, onerror=None,
                                          re_filename=cls.RE_FILENAME):
-            stream = open(filename, mode)
+            stream = open_file(filename, mode)
             try:
                 yield stream
             finally:
@@ -45,6 +45,7 @@ from pyffi.object_models.editable import EditableSpinBox
 from pyffi.object_models.editable import EditableFloatSpinBox
 from pyffi.object_models.editable import EditableLineEdit
 from pyffi.object_models.editable import EditableBoolComboBox
+from pyffi.utils.memory_stream import MemoryStream
 
 # TODO get rid of these
 _b = b''
@@ -118,6 +119,7 @@ class Int(BasicBase, EditableSpinBox):
     >>> hex(i.get_value())
     '0x44332211'
     """
+    __slots__ = ()
 
     _min = -0x80000000 #: Minimum value.
     _max = 0x7fffffff  #: Maximum value.
@@ -163,6 +165,13 @@ class Int(BasicBase, EditableSpinBox):
         :param stream: The stream to read from.
         :type stream: file
         """
+        if stream.__class__ is MemoryStream:
+            # unpack without copying
+            pos = stream.pos
+            self._value = struct.unpack_from(
+                data._byte_order + self._struct, stream.buffer, pos)[0]
+            stream.pos = pos + self._size
+            return
         self._value = struct.unpack(data._byte_order + self._struct,
                                     stream.read(self._size))[0]
 
@@ -208,6 +217,7 @@ class Int(BasicBase, EditableSpinBox):
 
 class UInt(Int):
     """Implementation of a 32-bit unsigned integer type."""
+    __slots__ = ()
     _min = 0
     _max = 0xffffffff
     _struct = 'I'
@@ -215,6 +225,7 @@ class UInt(Int):
 
 class Int64(Int):
     """Implementation of a 64-bit signed integer type."""
+    __slots__ = ()
     _min = -0x8000000000000000
     _max = 0x7fffffffffffffff
     _struct = 'q'
@@ -222,6 +233,7 @@ class Int64(Int):
 
 class UInt64(Int):
     """Implementation of a 64-bit unsigned integer type."""
+    __slots__ = ()
     _min = 0
     _max = 0xffffffffffffffff
     _struct = 'Q'
@@ -229,6 +241,7 @@ class UInt64(Int):
 
 class Byte(Int):
     """Implementation of a 8-bit signed integer type."""
+    __slots__ = ()
     _min = -0x80
     _max = 0x7f
     _struct = 'b'
@@ -236,6 +249,7 @@ class Byte(Int):
 
 class UByte(Int):
     """Implementation of a 8-bit unsigned integer type."""
+    __slots__ = ()
     _min = 0
     _max = 0xff
     _struct = 'B'
@@ -243,6 +257,7 @@ class UByte(Int):
 
 class Short(Int):
     """Implementation of a 16-bit signed integer type."""
+    __slots__ = ()
     _min = -0x8000
     _max = 0x7fff
     _struct = 'h'
@@ -250,6 +265,7 @@ class Short(Int):
 
 class UShort(UInt):
     """Implementation of a 16-bit unsigned integer type."""
+    __slots__ = ()
     _min = 0
     _max = 0xffff
     _struct = 'H'
@@ -259,6 +275,8 @@ class ULittle32(UInt):
     """Little endian 32 bit unsigned integer (ignores specified data
     byte order).
     """
+    __slots__ = ()
+
     def read(self, stream, data):
         """Read value from stream.
 
@@ -278,6 +296,7 @@ class ULittle32(UInt):
 
 class Bool(UByte, EditableBoolComboBox):
     """Simple bool implementation."""
+    __slots__ = ()
 
     def get_value(self):
         """Return stored value.
@@ -296,6 +315,7 @@ class Bool(UByte, EditableBoolComboBox):
 
 class Char(BasicBase, EditableLineEdit):
     """Implementation of an (unencoded) 8-bit character."""
+    __slots__ = ()
 
     def __init__(self, **kwargs):
         """Initialize the character."""
@@ -354,6 +374,7 @@ class Char(BasicBase, EditableLineEdit):
 
 class Float(BasicBase, EditableFloatSpinBox):
     """Implementation of a 32-bit float."""
+    __slots__ = ()
 
     def __init__(self, **kwargs):
         """Initialize the float."""
@@ -381,6 +402,13 @@ class Float(BasicBase, EditableFloatSpinBox):
         :param stream: The stream to read from.
         :type stream: file
         """
+        if stream.__class__ is MemoryStream:
+            # unpack without copying
+            pos = stream.pos
+            self._value = struct.unpack_from(
+                data._byte_order + 'f', stream.buffer, pos)[0]
+            stream.pos = pos + 4
+            return
         self._value = struct.unpack(data._byte_order + 'f',
                                     stream.read(4))[0]
 
@@ -434,6 +462,7 @@ class ZString(BasicBase, EditableLineEdit):
     >>> str(m)
     'Hi There!'
     """
+    __slots__ = ()
     _maxlen = 1000 #: The maximum length.
 
     def __init__(self, **kwargs):
@@ -529,6 +558,7 @@ class FixedString(BasicBase, EditableLineEdit):
     >>> str(m)
     'Hi There'
     """
+    __slots__ = ()
     _len = 0
 
     def __init__(self, **kwargs):
@@ -614,6 +644,7 @@ class SizedString(BasicBase, EditableLineEdit):
     >>> str(m)
     'Hi There'
     """
+    __slots__ = ()
 
     def __init__(self, **kwargs):
         """Initialize the string."""
@@ -661,8 +692,15 @@ class SizedString(BasicBase, EditableLineEdit):
         :param stream: The stream to read from.
         :type stream: file
         """
-        length, = struct.unpack(data._byte_order + 'I',
-                                stream.read(4))
+        if stream.__class__ is MemoryStream:
+            # unpack without copying
+            pos = stream.pos + 4
+            length, = struct.unpack_from(
+                data._byte_order + 'I', stream.buffer, pos - 4)
+            stream.pos = pos
+        else:
+            length, = struct.unpack(data._byte_order + 'I',
+                                    stream.read(4))
         if length > 10000:
             raise ValueError('string too long (0x%08X at 0x%08X)'
                              % (length, stream.tell()))
@@ -680,6 +718,8 @@ class SizedString(BasicBase, EditableLineEdit):
 
 class UndecodedData(BasicBase):
     """Basic type for undecoded data trailing at the end of a file."""
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         BasicBase.__init__(self, **kwargs)
         self._value = b''
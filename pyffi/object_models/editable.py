@@ -47,6 +47,8 @@ graphical user interface.
 
 class EditableBase(object):
     """The base class for all delegates."""
+    __slots__ = ()
+
     def get_editor_value(self):
         """Return data as a value to initialize an editor with.
         Override this method.
@@ -74,6 +76,8 @@ class EditableSpinBox(EditableBase):
     Requirement: get_editor_value must return an ``int``, set_editor_value
     must take an ``int``.
     """
+    __slots__ = ()
+
     def get_editor_value(self):
         return self.get_value()
 
@@ -94,6 +98,7 @@ class EditableFloatSpinBox(EditableSpinBox):
     Requirement: get_editor_value must return a ``float``, set_editor_value
     must take a ``float``.
     """
+    __slots__ = ()
 
     def get_editor_decimals(self):
         return 5
@@ -105,7 +110,7 @@ class EditableLineEdit(EditableBase):
     Requirement: get_editor_value must return a ``str``, set_editor_value
     must take a ``str``.
     """
-    pass
+    __slots__ = ()
 
 class EditableTextEdit(EditableLineEdit):
     """Abstract base class for data that can be edited with a multiline editor.
@@ -113,7 +118,7 @@ class EditableTextEdit(EditableLineEdit):
     Requirement:  get_editor_value must return a ``str``, set_editor_value
     must take a ``str``.
     """
-    pass
+    __slots__ = ()
 
 class EditableComboBox(EditableBase):
     """Abstract base class for data that can be edited with combo boxes.
@@ -122,6 +127,7 @@ class EditableComboBox(EditableBase):
     Requirement: get_editor_value must return an ``int``, set_editor_value
     must take an ``int`` (this integer is the index in the list of keys).
     """
+    __slots__ = ()
 
     def get_editor_keys(self):
         """Tuple of strings, each string describing an item."""
@@ -132,6 +138,8 @@ class EditableBoolComboBox(EditableComboBox):
 
     Requirement: get_value must return a ``bool``, set_value must take a ``bool``.
     """
+    __slots__ = ()
+
     def get_editor_keys(self):
         return ("False", "True")
 
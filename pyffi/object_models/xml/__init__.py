@@ -39,6 +39,8 @@ file, and xml handler for converting the xml description into Python classes.
 #
 # ***** END LICENSE BLOCK *****
 
+from functools import partial
+import io
 import logging
 import time # for timing stuff
 import types
@@ -52,6 +54,7 @@ from pyffi.object_models.xml.basic      import BasicBase
 from pyffi.object_models.xml.bit_struct import BitStructBase
 from pyffi.object_models.xml.enum       import EnumBase
 from pyffi.object_models.xml.expression import Expression
+import pyffi.object_models.xml.cache
 
 
 class MetaFileFormat(pyffi.object_models.MetaFileFormat):
@@ -90,24 +93,42 @@ class MetaFileFormat(pyffi.object_models.MetaFileFormat):
         # the hierarchy
         xml_file_name = dct.get('xml_file_name')
         if xml_file_name:
+            # read XML file
+            xml_file = cls.openfile(xml_file_name, cls.xml_file_path)
+            try:
+                xml_text = xml_file.read()
+            finally:
+                xml_file.close()
+
+            handler = XmlSaxHandler(cls, name, bases, dct)
+
+            # generate the classes from the cached description, if any
+            cache_file_name = pyffi.object_models.xml.cache.get_file_name(
+                name, xml_text)
+            if cache_file_name:
+                description = pyffi.object_models.xml.cache.load(
+                    cache_file_name)
+                if description is not None:
+                    cls.logger.debug("Generating classes from %s."
+                                     % cache_file_name)
+                    handler.replay(description)
+                    return
+
             # set up XML parser
             parser = xml.sax.make_parser()
-            parser.setContentHandler(XmlSaxHandler(cls, name, bases, dct))
-
-            # open XML file
-            xml_file = cls.openfile(xml_file_name, cls.xml_file_path)
+            parser.setContentHandler(handler)
+            if cache_file_name:
+                handler.on_description = partial(
+                    pyffi.object_models.xml.cache.save, cache_file_name)
 
             # parse the XML file: control is now passed on to XmlSaxHandler
             # which takes care of the class creation
             cls.logger.debug("Parsing %s and generating classes."
                              % xml_file_name)
-            start = time.clock()
-            try:
-                parser.parse(xml_file)
-            finally:
-                xml_file.close()
+            start = time.perf_counter()
+            parser.parse(io.StringIO(xml_text))
             cls.logger.debug("Parsing finished in %.3f seconds."
-                             % (time.clock() - start))
+                             % (time.perf_counter() - start))
 
 
 class FileFormat(pyffi.object_models.FileFormat, metaclass=MetaFileFormat):
@@ -189,6 +210,9 @@ class StructAttribute(object):
     is_abstract = False
     """Whether the attribute is abstract or not (read and written)."""
 
+    type_name = None
+    """The name of the type of this member variable, as in the xml."""
+
     def __init__(self, cls, attrs):
         """Initialize attribute from the xml attrs dictionary of an
         add tag.
@@ -203,6 +227,7 @@ class StructAttribute(object):
         except KeyError:
             raise AttributeError("'%s' is missing a type attribute"
                                  % self.displayname)
+        self.type_name = attrs_type_str
         if attrs_type_str != "TEMPLATE":
             try:
                 self.type_ = getattr(cls, attrs_type_str)
@@ -255,6 +280,13 @@ class StructAttribute(object):
         if self.ver2:
             self.ver2 = cls.version_number(self.ver2)
 
+    def __getstate__(self):
+        # generated classes cannot be pickled, so store the type by
+        # name; it is resolved again by XmlSaxHandler.replay
+        state = self.__dict__.copy()
+        state["type_"] = self.type_name
+        return state
+
 
 class BitStructAttribute(object):
     """Helper class to collect attribute data of bitstruct bits tags."""
@@ -369,6 +401,14 @@ class XmlSaxHandler(xml.sax.handler.ContentHandler):
         self.class_name = None
         self.class_dict = None
         self.class_bases = ()
+        # name of the base class, as in the xml
+        self.class_base_name = None
+
+        # the class definitions, in order, for get_description
+        self.definitions = []
+
+        # called with the description at the end of the document
+        self.on_description = None
 
         # elements for basic classes
         self.basic_class = None
@@ -474,6 +514,7 @@ class XmlSaxHandler(xml.sax.handler.ContentHandler):
                 # if inherit attribute is defined, then look for corresponding
                 # base block
                 class_basename = attrs.get("inherit")
+                self.class_base_name = class_basename
                 if class_basename:
                     # if that base struct has not yet been assigned to a
                     # class, then we have a problem
@@ -499,16 +540,8 @@ class XmlSaxHandler(xml.sax.handler.ContentHandler):
             # fileformat -> basic
             elif tag == self.tag_basic:
                 self.class_name = attrs["name"]
-                # Each basic type corresponds to a type defined in C{self.cls}.
-                # The link between basic types and C{self.cls} types is done
-                # via the name of the class.
-                self.basic_class = getattr(self.cls, self.class_name)
-                # check the class variables
-                is_template = (attrs.get("istemplate") == "1")
-                if self.basic_class._is_template != is_template:
-                    raise XmlError(
-                        'class %s should have _is_template = %s'
-                        % (self.class_name, is_template))
+                self.basic_class = self.get_basic_class(
+                    attrs.get("istemplate") == "1")
 
             # fileformat -> enum
             elif tag == self.tag_enum:
@@ -536,6 +569,7 @@ class XmlSaxHandler(xml.sax.handler.ContentHandler):
             elif tag == self.tag_alias:
                 self.class_name = attrs["name"]
                 typename = attrs["type"]
+                self.class_base_name = typename
                 try:
                     self.class_bases += (getattr(self.cls, typename),)
                 except AttributeError:
@@ -647,70 +681,170 @@ but got %s instead""" % name)
                      self.tag_enum,
                      self.tag_alias,
                      self.tag_bit_struct):
-            # create class
-            # assign it to cls.<class_name> if it has not been implemented
-            # internally
-            cls_klass = getattr(self.cls, self.class_name, None)
-            if cls_klass and issubclass(cls_klass, BasicBase):
-                # overrides a basic type - not much to do
-                pass
-            else:
-                # check if we have a customizer class
-                if cls_klass:
-                    # exists: create and add to base class of customizer
-                    gen_klass = type(
-                        "_" + str(self.class_name),
-                        self.class_bases, self.class_dict)
-                    setattr(self.cls, "_" + self.class_name, gen_klass)
-                    # recreate the class, to ensure that the
-                    # metaclass is called!!
-                    # (otherwise, cls_klass does not have correct
-                    # _attribute_list, etc.)
-                    cls_klass = type(
-                        cls_klass.__name__,
-                        (gen_klass,) + cls_klass.__bases__,
-                        dict(cls_klass.__dict__))
-                    setattr(self.cls, self.class_name, cls_klass)
-                    # if the class derives from Data, then make an alias
-                    if issubclass(
-                        cls_klass,
-                        pyffi.object_models.FileFormat.Data):
-                        self.cls.Data = cls_klass
-                    # for the stuff below
-                    gen_class = cls_klass
-                else:
-                    # does not yet exist: create it and assign to class dict
-                    gen_klass = type(
-                        str(self.class_name), self.class_bases, self.class_dict)
-                    setattr(self.cls, self.class_name, gen_klass)
-                # append class to the appropriate list
-                if tag == self.tag_struct:
-                    self.cls.xml_struct.append(gen_klass)
-                elif tag == self.tag_enum:
-                    self.cls.xml_enum.append(gen_klass)
-                elif tag == self.tag_alias:
-                    self.cls.xml_alias.append(gen_klass)
-                elif tag == self.tag_bit_struct:
-                    self.cls.xml_bit_struct.append(gen_klass)
-            # reset variables
-            self.class_name = None
-            self.class_dict = None
-            self.class_bases = ()
+            self.definitions.append(
+                (tag, self.class_name, self.class_base_name, self.class_dict))
+            self.create_class(tag)
         elif tag == self.tag_basic:
-            # link class cls.<class_name> to self.basic_class
-            setattr(self.cls, self.class_name, self.basic_class)
-            # reset variable
-            self.basic_class = None
+            self.definitions.append(
+                (tag, self.class_name, None,
+                 {"_is_template": self.basic_class._is_template}))
+            self.link_basic_class()
         elif tag == self.tag_version:
             # reset variable
             self.version_string = None
 
+    def get_basic_class(self, is_template):
+        """Return the class in C{self.cls} which implements the basic
+        type C{self.class_name}.
+
+        :param is_template: Whether the xml declares the type as template.
+        """
+        # Each basic type corresponds to a type defined in C{self.cls}.
+        # The link between basic types and C{self.cls} types is done
+        # via the name of the class.
+        basic_class = getattr(self.cls, self.class_name)
+        # check the class variables
+        if basic_class._is_template != is_template:
+            raise XmlError(
+                'class %s should have _is_template = %s'
+                % (self.class_name, is_template))
+        return basic_class
+
+    def link_basic_class(self):
+        """Link class C{self.cls.<class_name>} to C{self.basic_class}."""
+        setattr(self.cls, self.class_name, self.basic_class)
+        # reset variable
+        self.basic_class = None
+
+    def create_class(self, tag):
+        """Create the class C{self.class_name} from C{self.class_bases}
+        and C{self.class_dict}.
+
+        :param tag: The tag of the class: struct, enum, alias, or bitstruct.
+        """
+        # create class
+        # assign it to cls.<class_name> if it has not been implemented
+        # internally
+        cls_klass = getattr(self.cls, self.class_name, None)
+        if cls_klass and issubclass(cls_klass, BasicBase):
+            # overrides a basic type - not much to do
+            pass
+        else:
+            # check if we have a customizer class
+            if cls_klass:
+                # exists: create and add to base class of customizer
+                gen_klass = type(
+                    "_" + str(self.class_name),
+                    self.class_bases, self.class_dict)
+                self.set_class("_" + self.class_name, gen_klass)
+                # recreate the class, to ensure that the
+                # metaclass is called!!
+                # (otherwise, cls_klass does not have correct
+                # _attribute_list, etc.)
+                # (the __dict__ and __weakref__ descriptors of the
+                # customizer do not apply to instances of the new class)
+                cls_klass = type(
+                    cls_klass.__name__,
+                    (gen_klass,) + cls_klass.__bases__,
+                    dict((name, value)
+                         for name, value in cls_klass.__dict__.items()
+                         if name not in ("__dict__", "__weakref__")))
+                self.set_class(self.class_name, cls_klass)
+                # if the class derives from Data, then make an alias
+                if issubclass(
+                    cls_klass,
+                    pyffi.object_models.FileFormat.Data):
+                    self.cls.Data = cls_klass
+                # for the stuff below
+                gen_class = cls_klass
+            else:
+                # does not yet exist: create it and assign to class dict
+                gen_klass = type(
+                    str(self.class_name), self.class_bases, self.class_dict)
+                self.set_class(self.class_name, gen_klass)
+            # append class to the appropriate list
+            if tag == self.tag_struct:
+                self.cls.xml_struct.append(gen_klass)
+            elif tag == self.tag_enum:
+                self.cls.xml_enum.append(gen_klass)
+            elif tag == self.tag_alias:
+                self.cls.xml_alias.append(gen_klass)
+            elif tag == self.tag_bit_struct:
+                self.cls.xml_bit_struct.append(gen_klass)
+        # reset variables
+        self.class_name = None
+        self.class_dict = None
+        self.class_bases = ()
+        self.class_base_name = None
+
+    def set_class(self, name, klass):
+        """Assign a generated class to the file format class, and name
+        it accordingly, so it can be found by its qualified name (for
+        instance, when instances are unpickled).
+
+        :param name: The name of the class attribute.
+        :param klass: The class.
+        """
+        klass.__module__ = self.cls.__module__
+        klass.__qualname__ = "%s.%s" % (self.cls.__qualname__, name)
+        setattr(self.cls, name, klass)
+
+    def get_description(self):
+        """Return the description of the format, that is, everything
+        that is needed to generate the classes again with L{replay},
+        without parsing the xml file. This must be called before the
+        forward declarations are resolved in L{endDocument}.
+        """
+        return {"versions": self.cls.versions,
+                "games": self.cls.games,
+                "definitions": self.definitions}
+
+    def replay(self, description):
+        """Generate the classes from a description that was returned
+        by L{get_description}, as if the xml file were parsed.
+
+        :param description: The description.
+        :type description: ``dict``
+        """
+        self.cls.versions.update(description["versions"])
+        self.cls.games.update(description["games"])
+        for tag, class_name, base_name, class_dict in description[
+            "definitions"]:
+            self.class_name = class_name
+            if tag == self.tag_basic:
+                self.basic_class = self.get_basic_class(
+                    class_dict["_is_template"])
+                self.link_basic_class()
+                continue
+            if base_name:
+                self.class_bases = (getattr(self.cls, base_name),)
+            elif tag == self.tag_struct:
+                self.class_bases = (StructBase,)
+            elif tag == self.tag_enum:
+                self.class_bases = (EnumBase,)
+            elif tag == self.tag_bit_struct:
+                self.class_bases = (BitStructBase,)
+            if tag == self.tag_struct:
+                # resolve types as in StructAttribute.__init__
+                for attr in class_dict["_attrs"]:
+                    if attr.type_name == "TEMPLATE":
+                        attr.type_ = type(None)
+                    else:
+                        attr.type_ = getattr(
+                            self.cls, attr.type_name, attr.type_name)
+            self.class_base_name = base_name
+            self.class_dict = class_dict
+            self.create_class(tag)
+        self.endDocument()
+
     def endDocument(self):
         """Called when the xml is completely parsed.
 
         Searches and adds class customized functions.
         For version tags, adds version to version and game lists.
         """
+        if self.on_description:
+            self.on_description(self.get_description())
         # get 'name_attribute' for all classes
         # we need this to fix them in cond="..." later
         klass_filter = {}
@@ -40,21 +40,111 @@
 # --------------------------------------------------------------------------
 
 # note: some imports are defined at the end to avoid problems with circularity
+import copyreg
 import logging
+import operator
+import struct
 import weakref
 
 from pyffi.utils.graph import DetailNode, EdgeFilter
 
+class _PackedElements(object):
+    """Elements of fixed layout which have been read from a stream in a
+    single chunk, but which have not yet been unpacked into element
+    instances."""
+
+    __slots__ = ("buffer", "format", "count", "template", "argument", "key")
+
+    def __init__(self, buffer, format, count, template, argument, key):
+        self.buffer = buffer
+        """The raw bytes of all elements."""
+        self.format = format
+        """As returned by
+        :func:`~pyffi.object_models.xml.codec.get_packed_format`."""
+        self.count = count
+        """Number of elements."""
+        self.template = template
+        self.argument = argument
+        self.key = key
+        """Codec key of the data from which the elements were read."""
+
+    @classmethod
+    def read(cls, stream, data, format, count, template, argument):
+        """Read C{count} elements from C{stream}."""
+        size = format[0].size * count
+        buffer = stream.read(size)
+        if len(buffer) != size:
+            raise struct.error(
+                "unpack requires a buffer of %i bytes" % size)
+        return cls(buffer, format, count, template, argument,
+                   get_codec_key(data))
+
+    def __getstate__(self):
+        return (bytes(self.buffer), self.format[0].format, self.format[1],
+                self.count, self.template, self.argument, self.key)
+
+    def __setstate__(self, state):
+        (self.buffer, format, names,
+         self.count, self.template, self.argument, self.key) = state
+        self.format = struct.Struct(format), names
+
+    def unpack(self, element_type, parent):
+        """Return list of element instances."""
+        return _create_elements(
+            element_type, self.format, self.format[0].iter_unpack(self.buffer),
+            self.template, self.argument, parent)
+
+def _create_elements(element_type, format, rows, template, argument, parent):
+    """Return list of element instances, whose values are taken from
+    C{rows}, as unpacked with C{format} (see
+    :func:`~pyffi.object_models.xml.codec.get_packed_format`)."""
+    names = format[1]
+    elems = []
+    if names is None:
+        for value, in rows:
+            elem = element_type(
+                template = template,
+                argument = argument,
+                parent = parent)
+            elem._value = value
+            elems.append(elem)
+    else:
+        attr_names = ["_%s_value_" % name for name in names]
+        for values in rows:
+            elem = element_type(
+                template = template,
+                argument = argument,
+                parent = parent)
+            for attr_name, value in zip(attr_names, values):
+                getattr(elem, attr_name)._value = value
+            elems.append(elem)
+    return elems
+
 class _ListWrap(list, DetailNode):
     """A wrapper for list, which uses get_value and set_value for
-    getting and setting items of the basic type."""
+    getting and setting items of the basic type.
+
+    The list can also hold its elements in packed form (see
+    L{Array.use_packed}), in which case they are unpacked as soon as
+    the list is accessed in any way, except for its length.
+    """
+
+    _packed = None
+
+    # cached hash, and weak reference to the structure or array which
+    # contains the list (see StructBase.use_hash_cache)
+    _hash = None
+    _hash_parent = None
 
     def __init__(self, element_type, parent = None):
         self._parent = weakref.ref(parent) if parent else None
         self._elementType = element_type
+        self._set_item_hooks()
+
+    def _set_item_hooks(self):
         # we link to the unbound methods (that is, self.__class__.xxx
         # instead of self.xxx) to avoid circular references!!
-        if issubclass(element_type, BasicBase):
+        if issubclass(self._elementType, BasicBase):
             self._get_item_hook = self.__class__.get_basic_item
             self._set_item_hook = self.__class__.set_basic_item
             self._iter_item_hook = self.__class__.iter_basic_item
@@ -63,15 +153,54 @@ class _ListWrap(list, DetailNode):
             self._set_item_hook = self.__class__._not_implemented_hook
             self._iter_item_hook = self.__class__.iter_item
 
+    def __reduce__(self):
+        # the parent is not pickled: it is restored by the structure
+        # which has the list (see StructBase.__setstate__)
+        state = dict(
+            (name, value) for name, value in self.__dict__.items()
+            if name not in self._unpickled_names)
+        state["_items"] = list(list.__iter__(self))
+        return copyreg.__newobj__, (self.__class__,), state
+
+    # attributes which are not pickled
+    _unpickled_names = frozenset([
+        "_parent", "_count1", "_count2", "_hash", "_hash_parent",
+        "_get_item_hook", "_set_item_hook", "_iter_item_hook"])
+
+    def __setstate__(self, state):
+        state = dict(state)
+        list.extend(self, state.pop("_items"))
+        self.__dict__.update(state)
+        self._parent = None
+        self._set_item_hooks()
+
     def __getitem__(self, index):
+        if self._packed is not None:
+            self._materialize()
         return self._get_item_hook(self, index)
 
     def __setitem__(self, index, value):
+        if self._packed is not None:
+            self._materialize()
         return self._set_item_hook(self, index, value)
 
     def __iter__(self):
+        if self._packed is not None:
+            self._materialize()
         return self._iter_item_hook(self)
 
+    def __len__(self):
+        if self._packed is not None:
+            return self._packed.count
+        return list.__len__(self)
+
+    def _materialize(self):
+        """Unpack packed elements, if there are any."""
+        packed = self._packed
+        if packed is not None:
+            self._packed = None
+            list.extend(self, packed.unpack(self._elementType, self))
+
     def __contains__(self, value):
         # ensure that the "in" operator uses self.__iter__() rather than
         # list.__iter__()
@@ -96,12 +225,34 @@ class _ListWrap(list, DetailNode):
         for elem in list.__iter__(self):
             yield elem
 
+    def get_columns(self, names):
+        """Return, for every basic attribute name in C{names}, the list
+        of values of that attribute for all (struct) items. Packed
+        elements are unpacked straight from their buffer, without
+        creating element instances."""
+        packed = self._packed
+        if (packed is not None and packed.format[1] is not None
+                and all(name in packed.format[1] for name in names)):
+            rows = list(packed.format[0].iter_unpack(packed.buffer))
+            return [
+                list(map(operator.itemgetter(packed.format[1].index(name)),
+                         rows))
+                for name in names]
+        elems = list(self.__iter__())
+        get_value = operator.methodcaller("get_value")
+        return [
+            list(map(get_value,
+                     map(operator.attrgetter("_%s_value_" % name), elems)))
+            for name in names]
+
     def get_basic_item(self, index):
         """Item getter which calls C{get_value()} on the C{index}'d item."""
         return list.__getitem__(self, index).get_value()
 
     def set_basic_item(self, index, value):
         """Item setter which calls C{set_value()} on the C{index}'d item."""
+        if self._hash is not None:
+            invalidate_hash(self)
         return list.__getitem__(self, index).set_value(value)
 
     def get_item(self, index):
@@ -109,15 +260,73 @@ class _ListWrap(list, DetailNode):
         elements."""
         return list.__getitem__(self, index)
 
+    def get_hash(self, data=None):
+        """Calculate a hash value for the list, as a tuple."""
+        self._materialize()
+        if not StructBase.use_hash_cache or self._elementType._has_links:
+            return tuple(elem.get_hash(data)
+                         for elem in list.__iter__(self))
+        key = get_plan_key(data)
+        if self._hash is not None and self._hash[0] == key:
+            return self._hash[1]
+        hsh = []
+        if issubclass(self._elementType, BasicBase):
+            for elem in list.__iter__(self):
+                hsh.append(elem.get_hash(data))
+        else:
+            ref = weakref.ref(self)
+            for elem in list.__iter__(self):
+                hsh.append(elem.get_hash(data))
+                elem._hash_parent = ref
+        hsh = tuple(hsh)
+        self._hash = (key, hsh)
+        return hsh
+
     # DetailNode
 
     def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
         """Yield children."""
+        self._materialize()
+        # the items can be changed through the returned instances
+        if self._hash is not None:
+            invalidate_hash(self)
         return (item for item in list.__iter__(self))
 
     def get_detail_child_names(self, edge_filter=EdgeFilter()):
         """Yield child names."""
-        return ("[%i]" % row for row in range(list.__len__(self)))
+        return ("[%i]" % row for row in range(self.__len__()))
+
+def _materializing(name, modifies):
+    """Return list method C{name}, wrapped so it unpacks all packed
+    elements first (including those of list arguments), and, if the
+    method C{modifies} the list, invalidates its cached hash."""
+    method = getattr(list, name)
+    def wrapper(self, *args, **kwargs):
+        if self._packed is not None:
+            self._materialize()
+        for arg in args:
+            if isinstance(arg, _ListWrap) and arg._packed is not None:
+                arg._materialize()
+        if modifies:
+            if self._hash is not None:
+                invalidate_hash(self)
+            if self._elementType._has_links:
+                StructBase.link_generation += 1
+        return method(self, *args, **kwargs)
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+for _name in ("__reversed__", "__repr__",
+              "__eq__", "__ne__", "__lt__", "__le__", "__gt__", "__ge__",
+              "__add__", "__mul__", "__rmul__",
+              "index", "count", "copy"):
+    setattr(_ListWrap, _name, _materializing(_name, False))
+for _name in ("__delitem__", "__iadd__", "__imul__",
+              "append", "extend", "insert", "pop", "remove", "clear",
+              "sort", "reverse"):
+    setattr(_ListWrap, _name, _materializing(_name, True))
+del _name
 
 class Array(_ListWrap):
     """A general purpose class for 1 or 2 dimensional arrays consisting of
@@ -126,6 +335,13 @@ class Array(_ListWrap):
     logger = logging.getLogger("pyffi.nif.data.array")
     arg = None # default argument
 
+    use_packed = False
+    """Set to ``True`` to read arrays whose elements have a fixed
+    layout (such as floats, or vectors of floats) with a single read
+    call, and to keep the elements packed in a bytes buffer until the
+    array is accessed. Arrays which are never accessed are written back
+    unchanged, and do not use any memory for element instances."""
+
     def __init__(
         self,
         element_type = None,
@@ -176,6 +392,18 @@ class Array(_ListWrap):
                     elem.append(elem_instance)
                 self.append(elem)
 
+    def _restore_parent(self, parent, count1, count2):
+        """Restore the parent and the count expressions of an array
+        which was unpickled. Called by the parent.
+        """
+        self._parent = weakref.ref(parent)
+        self._count1 = count1
+        self._count2 = count2
+        if count2 is not None:
+            ref = weakref.ref(self)
+            for elemlist in list.__iter__(self):
+                elemlist._parent = ref
+
     def _len1(self):
         """The length the array should have, obtained by evaluating
         the count1 expression."""
@@ -223,8 +451,31 @@ class Array(_ListWrap):
                     else:
                         self[i][j] = block[i][j]
 
+    def _materialize(self):
+        """Unpack packed elements of the array, and of all its rows."""
+        _ListWrap._materialize(self)
+        if self._count2 is not None:
+            for elemlist in list.__iter__(self):
+                elemlist._materialize()
+
+    def _get_packed_format(self, data):
+        """Return format of packed elements, or ``None`` if elements
+        cannot be packed."""
+        if not self.use_packed or self._elementTypeArgument is not None:
+            return None
+        return get_packed_format(self._elementType, data)
+
+    def _rows(self):
+        """List all rows of the array: the array itself if it is one
+        dimensional."""
+        if self._count2 is None:
+            return [self]
+        else:
+            return list(list.__iter__(self))
+
     # string of the array
     def __str__(self):
+        self._materialize()
         text = '%s instance at 0x%08X\n' % (self.__class__, id(self))
         if self._count2 is None:
             for i, element in enumerate(list.__iter__(self)):
@@ -253,6 +504,10 @@ class Array(_ListWrap):
         """Update the array size. Call this function whenever the size
         parameters change in C{parent}."""
         ## TODO also update row numbers
+        if self._hash is not None:
+            invalidate_hash(self)
+        if self._elementType._has_links:
+            StructBase.link_generation += 1
         old_size = len(self)
         new_size = self._len1()
         if self._count2 is None:
@@ -292,10 +547,33 @@ class Array(_ListWrap):
         self.logger.debug("Reading array of size " + str(len1))
         if len1 > 0x10000000:
             raise ValueError('array too long (%i)' % len1)
-        del self[0:self.__len__()]
+        if self._hash is not None:
+            invalidate_hash(self)
+        if self._elementType._has_links:
+            StructBase.link_generation += 1
+        self._packed = None
+        list.__delitem__(self, slice(0, list.__len__(self)))
+        packed_format = self._get_packed_format(data)
+        # from memory, elements of fixed layout are unpacked in one go
+        mapped_format = None
+        if (not packed_format and stream.__class__ is MemoryStream
+                and self._elementTypeArgument is None):
+            mapped_format = get_packed_format(self._elementType, data)
 
         # read array
         if self._count2 is None:
+            if packed_format:
+                self._packed = _PackedElements.read(
+                    stream, data, packed_format, len1,
+                    self._elementTypeTemplate, self._elementTypeArgument)
+                return
+            if mapped_format:
+                list.extend(self, _create_elements(
+                    self._elementType, mapped_format,
+                    stream.iter_unpack(mapped_format[0], len1),
+                    self._elementTypeTemplate, self._elementTypeArgument,
+                    self))
+                return
             for i in range(len1):
                 elem = self._elementType(
                     template = self._elementTypeTemplate,
@@ -309,6 +587,20 @@ class Array(_ListWrap):
                 if len2i > 0x10000000:
                     raise ValueError('array too long (%i)' % len2i)
                 elemlist = _ListWrap(self._elementType, parent = self)
+                if packed_format:
+                    elemlist._packed = _PackedElements.read(
+                        stream, data, packed_format, len2i,
+                        self._elementTypeTemplate, self._elementTypeArgument)
+                    self.append(elemlist)
+                    continue
+                if mapped_format:
+                    list.extend(elemlist, _create_elements(
+                        self._elementType, mapped_format,
+                        stream.iter_unpack(mapped_format[0], len2i),
+                        self._elementTypeTemplate, self._elementTypeArgument,
+                        elemlist))
+                    self.append(elemlist)
+                    continue
                 for j in range(len2i):
                     elem = self._elementType(
                         template = self._elementTypeTemplate,
@@ -328,6 +620,8 @@ describing number of elements (%i)'%(self.__len__(),len1))
         if len1 > 0x10000000:
             raise ValueError('array too long (%i)' % len1)
         if self._count2 is None:
+            if self._write_packed(stream, data):
+                return
             for elem in list.__iter__(self):
                 elem.write(stream, data)
         else:
@@ -338,9 +632,26 @@ describing number of elements (%i)'%(self.__len__(),len1))
 describing number of elements (%i)"%(elemlist.__len__(),len2i))
                 if len2i > 0x10000000:
                     raise ValueError('array too long (%i)' % len2i)
+                if elemlist._packed is not None:
+                    if elemlist._packed.key == get_codec_key(data):
+                        stream.write(elemlist._packed.buffer)
+                        continue
+                    elemlist._materialize()
                 for elem in list.__iter__(elemlist):
                     elem.write(stream, data)
 
+    def _write_packed(self, stream, data):
+        """Write packed elements of a one dimensional array, if they were
+        read with the same data layout. Returns ``True`` if the
+        elements were written."""
+        if self._packed is None:
+            return False
+        if self._packed.key == get_codec_key(data):
+            stream.write(self._packed.buffer)
+            return True
+        self._materialize()
+        return False
+
     def fix_links(self, data):
         """Fix the links in the array by calling C{fix_links} on all elements
         of the array."""
@@ -381,23 +692,50 @@ describing number of elements (%i)"%(elemlist.__len__(),len2i))
 
     def get_size(self, data=None):
         """Calculate the sum of the size of all elements in the array."""
-        return sum(
-            (elem.get_size(data) for elem in self._elementList()), 0)
+        size = 0
+        for elemlist in self._rows():
+            packed = elemlist._packed
+            if packed is not None:
+                if data is not None and packed.key == get_codec_key(data):
+                    size += len(packed.buffer)
+                    continue
+                elemlist._materialize()
+            size += sum(
+                (elem.get_size(data) for elem in list.__iter__(elemlist)), 0)
+        return size
 
     def get_hash(self, data=None):
         """Calculate a hash value for the array, as a tuple."""
+        if self._count2 is None:
+            return _ListWrap.get_hash(self, data)
+        if not StructBase.use_hash_cache or self._elementType._has_links:
+            hsh = []
+            for elem in self._elementList():
+                hsh.append(elem.get_hash(data))
+            return tuple(hsh)
+        # join the (cached) hashes of all rows
+        key = get_plan_key(data)
+        if self._hash is not None and self._hash[0] == key:
+            return self._hash[1]
         hsh = []
-        for elem in self._elementList():
-            hsh.append(elem.get_hash(data))
-        return tuple(hsh)
+        ref = weakref.ref(self)
+        for elemlist in list.__iter__(self):
+            hsh.extend(elemlist.get_hash(data))
+            elemlist._hash_parent = ref
+        hsh = tuple(hsh)
+        self._hash = (key, hsh)
+        return hsh
 
     def replace_global_node(self, oldbranch, newbranch, **kwargs):
         """Calculate a hash value for the array, as a tuple."""
+        if not self._elementType._has_links:
+            return
         for elem in self._elementList():
             elem.replace_global_node(oldbranch, newbranch, **kwargs)
 
     def _elementList(self, **kwargs):
         """Generator for listing all elements."""
+        self._materialize()
         if self._count2 is None:
             for elem in list.__iter__(self):
                 yield elem
@@ -407,4 +745,7 @@ describing number of elements (%i)"%(elemlist.__len__(),len2i))
                     yield elem
 
 from pyffi.object_models.xml.basic import BasicBase
-from pyffi.object_models.xml.struct_ import StructBase
+from pyffi.object_models.xml.struct_ import (
+    StructBase, get_plan_key, invalidate_hash)
+from pyffi.object_models.xml.codec import get_codec_key, get_packed_format
+from pyffi.utils.memory_stream import MemoryStream
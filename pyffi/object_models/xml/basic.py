@@ -80,7 +80,11 @@ class BasicBase(DetailNode):
     _has_links = False # does the type contain a Ref or a Ptr?
     _has_refs = False # does the type contain a Ref?
     _has_strings = False # does the type contain a string?
-    arg = None # default argument
+
+    # there are many instances of basic types, so store their data in
+    # slots to save memory (subclasses which do not define __slots__ get
+    # an instance dictionary as usual)
+    __slots__ = ("_value", "arg")
 
     def __init__(self, template = None, argument = None, parent = None):
         """Initializes the instance.
@@ -92,7 +96,22 @@ class BasicBase(DetailNode):
             instance is an attribute of."""
         # parent disabled for performance
         #self._parent = weakref.ref(parent) if parent else None
-        pass
+        self.arg = None # default argument
+
+    # pickle the value and argument as a tuple, which is much faster
+    # than the default, followed by the instance dictionary if there
+    # is a non-empty one
+    def __getstate__(self):
+        dct = getattr(self, "__dict__", None)
+        if dct:
+            return self._value, self.arg, dct
+        return self._value, self.arg
+
+    def __setstate__(self, state):
+        self._value = state[0]
+        self.arg = state[1]
+        if len(state) > 2:
+            self.__dict__.update(state[2])
 
     # string representation
     def __str__(self):
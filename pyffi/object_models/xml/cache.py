@@ -0,0 +1,156 @@
+"""Implements an on-disk cache for parsed xml format descriptions.
+
+Parsing a large format description, such as :file:`nif.xml`, with the
+sax parser takes a substantial part of the time needed to import a
+format module. This module stores the result of the parse, that is,
+the sequence of class definitions before they are turned into
+classes, as a pickle, so that the classes can be generated again
+without parsing the xml file. See
+:meth:`pyffi.object_models.xml.XmlSaxHandler.get_description` and
+:meth:`pyffi.object_models.xml.XmlSaxHandler.replay`.
+
+Cache files are keyed by a hash of the content of the xml file, by the
+pyffi version, and by the python version, so a stale cache file is
+never used. They are stored in the directory given by the
+:envvar:`PYFFI_CACHE_DIR` environment variable, or, if it is not set,
+in a :file:`pyffi` folder in the user's cache directory. Set
+:envvar:`PYFFI_CACHE_DIR` to an empty string to disable the cache.
+Any error while reading or writing a cache file is logged, and the
+xml file is parsed as usual.
+
+>>> import tempfile
+>>> dirname = tempfile.mkdtemp()
+>>> file_name = get_file_name("Test", "<fileformat/>", dirname)
+>>> load(file_name) is None
+True
+>>> save(file_name, {"classes": []})
+>>> load(file_name)
+{'classes': []}
+>>> file_name == get_file_name("Test", "<fileformat/>", dirname)
+True
+>>> file_name == get_file_name("Test", "<fileformat></fileformat>", dirname)
+False
+>>> os.remove(file_name)
+>>> os.rmdir(dirname)
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import hashlib
+import logging
+import os
+import pickle
+import sys
+import tempfile
+
+import pyffi
+
+logger = logging.getLogger("pyffi.object_models.xml.cache")
+
+#: Increase whenever the layout of the cached description changes.
+CACHE_VERSION = 1
+
+def get_cache_dir():
+    """Return the directory where descriptions are cached, or ``None``
+    if the cache is disabled.
+    """
+    cache_dir = os.environ.get("PYFFI_CACHE_DIR")
+    if cache_dir is not None:
+        return cache_dir or None
+    if sys.platform.startswith("win"):
+        base_dir = os.environ.get("LOCALAPPDATA")
+    else:
+        base_dir = os.environ.get("XDG_CACHE_HOME")
+    if not base_dir:
+        base_dir = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base_dir, "pyffi")
+
+def get_file_name(name, xml_text, cache_dir=None):
+    """Return the name of the cache file for the format class C{name}
+    with xml description C{xml_text}, or ``None`` if the cache is
+    disabled.
+
+    :param name: The name of the format class, for example 'NifFormat'.
+    :type name: ``str``
+    :param xml_text: The content of the xml file.
+    :type xml_text: ``str``
+    :param cache_dir: The cache directory; defaults to
+        L{get_cache_dir}.
+    :type cache_dir: ``str``
+    """
+    if cache_dir is None:
+        cache_dir = get_cache_dir()
+        if cache_dir is None:
+            return None
+    key = hashlib.sha1(xml_text.encode("utf-8"))
+    key.update(("%s-%s-%i.%i" % ((pyffi.__version__, CACHE_VERSION)
+                                 + tuple(sys.version_info[:2])))
+               .encode("ascii"))
+    return os.path.join(cache_dir, "%s-%s.pickle" % (name, key.hexdigest()))
+
+def load(file_name):
+    """Return the description stored in C{file_name}, or ``None`` if
+    it cannot be read.
+    """
+    try:
+        with open(file_name, "rb") as stream:
+            return pickle.load(stream)
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.warning("failed to load %s (%s)" % (file_name, exc))
+        return None
+
+def save(file_name, description):
+    """Store C{description} in C{file_name}. The file is written under a
+    temporary name first, and then renamed, so other processes never
+    see a partially written file.
+    """
+    try:
+        dirname = os.path.dirname(file_name)
+        os.makedirs(dirname, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as stream:
+                pickle.dump(description, stream, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_name, file_name)
+        except:
+            os.remove(temp_name)
+            raise
+    except Exception as exc:
+        logger.warning("failed to save %s (%s)" % (file_name, exc))
@@ -0,0 +1,406 @@
+"""Implements compiled read, write, and size codecs for struct types.
+
+The generic :meth:`~pyffi.object_models.xml.struct_.StructBase.read`,
+:meth:`~pyffi.object_models.xml.struct_.StructBase.write`, and
+:meth:`~pyffi.object_models.xml.struct_.StructBase.get_size` methods
+interpret the attribute list of the structure on every call. This
+module instead generates, for a given struct class and a given
+combination of version, user version, user version 2, and byte order,
+a specialized Python function for each of these operations, in which
+all static version checks have been resolved, and in which runs of
+fixed size basic attributes are packed and unpacked with a single
+:class:`struct.Struct` call.
+
+Codecs are opt-in: set
+:attr:`~pyffi.object_models.xml.struct_.StructBase.use_codecs` to ``True``
+to enable them. Codecs are built on first use and cached on the
+class. If a codec cannot be generated for a class, then the generic
+implementation is used instead.
+
+>>> from pyffi.object_models.xml.basic import BasicBase
+>>> from pyffi.object_models.xml.struct_ import StructBase
+>>> from pyffi.object_models.xml import StructAttribute as Attr
+>>> from pyffi.object_models.common import UInt, Float
+>>> from pyffi.object_models import FileFormat
+>>> class SimpleFormat(object):
+...     UInt = UInt
+...     Float = Float
+...     @staticmethod
+...     def name_attribute(name):
+...         return name
+>>> class X(StructBase):
+...     _is_template = False
+...     _attrs = [
+...         Attr(SimpleFormat, dict(name='a', type='UInt')),
+...         Attr(SimpleFormat, dict(name='b', type='Float')),
+...         Attr(SimpleFormat, dict(name='c', type='UInt', cond='a == 3'))]
+>>> codec = get_codec(X, FileFormat.Data())
+>>> x = X()
+>>> x.a = 3
+>>> x.b = 0.5
+>>> x.c = 7
+>>> codec.get_size(x, FileFormat.Data())
+12
+>>> from io import BytesIO
+>>> stream = BytesIO()
+>>> codec.write(x, stream, FileFormat.Data())
+>>> stream.getvalue()
+b'\\x03\\x00\\x00\\x00\\x00\\x00\\x00?\\x07\\x00\\x00\\x00'
+>>> y = X()
+>>> _ = stream.seek(0)
+>>> codec.read(y, stream, FileFormat.Data())
+>>> (y.a, y.b, y.c)
+(3, 0.5, 7)
+"""
+
+# --------------------------------------------------------------------------
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+# --------------------------------------------------------------------------
+
+import logging
+import struct
+
+from pyffi.object_models.xml.basic import BasicBase
+from pyffi.object_models.xml.enum import EnumBase
+
+
+class StructCodec(object):
+    """Compiled read, write, and get_size functions for a particular
+    struct class and codec key (see :func:`get_codec_key`).
+
+    Each function takes the struct instance as first argument, and
+    otherwise has the same signature as the corresponding
+    :class:`~pyffi.object_models.xml.struct_.StructBase` method.
+    """
+
+    def __init__(self, cls, key, source, namespace):
+        self.cls = cls
+        self.key = key
+        self.source = source
+        """The generated Python source, useful for debugging."""
+        self.read = namespace["read"]
+        self.write = namespace["write"]
+        self.get_size = namespace["get_size"]
+
+
+def get_codec_key(data):
+    """Return the key under which codecs for *data* are cached.
+
+    >>> from pyffi.object_models import FileFormat
+    >>> get_codec_key(FileFormat.Data())
+    (None, None, None, '<')
+    """
+    return (data.version, data.user_version,
+            getattr(data, "user_version_2", None), data._byte_order)
+
+
+def get_codec(cls, data):
+    """Return the codec of struct class *cls* for *data*, generating and
+    caching it on first use. Returns ``None`` if no codec could be
+    generated, in which case the caller must use the generic
+    implementation.
+    """
+    key = get_codec_key(data)
+    codecs = cls._codecs
+    try:
+        return codecs[key]
+    except KeyError:
+        pass
+    try:
+        codec = _CodecBuilder(cls, data).build(key)
+    except Exception:
+        logging.getLogger("pyffi.object_models.xml.codec").warning(
+            "cannot compile codec for %s, using generic implementation"
+            % cls.__name__, exc_info=True)
+        codec = None
+    codecs[key] = codec
+    return codec
+
+
+# cache for get_packed_format, keyed by element type and codec key
+_packed_formats = {}
+
+
+def get_packed_format(type_, data):
+    """Return a (:class:`struct.Struct`, names) pair describing the
+    fixed layout of elements of type *type_* in *data*, or ``None`` if
+    the type has no such layout. For basic types, names is ``None``.
+    For struct types, names lists the attributes which correspond to
+    the unpacked values.
+
+    >>> from pyffi.object_models import FileFormat
+    >>> from pyffi.object_models.common import UShort, SizedString
+    >>> fmt, names = get_packed_format(UShort, FileFormat.Data())
+    >>> fmt.format, names
+    ('<H', None)
+    >>> print(get_packed_format(SizedString, FileFormat.Data()))
+    None
+    """
+    key = (type_, get_codec_key(data))
+    try:
+        return _packed_formats[key]
+    except KeyError:
+        pass
+    # imported here, to avoid problems with circularity
+    from pyffi.object_models.xml.struct_ import StructBase
+    result = None
+    basic_format = _get_basic_format(type_)
+    if basic_format:
+        result = struct.Struct(data._byte_order + basic_format[0]), None
+    elif (isinstance(type_, type) and issubclass(type_, StructBase)
+          and type_.read is StructBase.read
+          and type_.write is StructBase.write
+          and type_.get_size is StructBase.get_size):
+        instance_attrs = {}
+        for attr in type_._attribute_list:
+            instance_attrs.setdefault(attr.name, attr)
+        fmts = []
+        names = []
+        for attr, cond, vercond, track in type_._get_attribute_plan(data):
+            if attr.is_abstract:
+                continue
+            instance_attr = instance_attrs[attr.name]
+            if (cond is not None or vercond is not None
+                or instance_attr.arr1 is not None or attr.arg is not None):
+                break
+            basic_format = _get_basic_format(instance_attr.type_)
+            if not basic_format:
+                break
+            fmts.append(basic_format[0])
+            names.append(attr.name)
+        else:
+            if names:
+                result = (struct.Struct(data._byte_order + "".join(fmts)),
+                          names)
+    _packed_formats[key] = result
+    return result
+
+
+def _get_basic_format(type_):
+    """Return the struct format character and size of a basic type
+    whose read and write methods simply unpack and pack its ``_value``
+    in the byte order of the data, or ``None`` for any other type.
+    """
+    # imported here, as pyffi.object_models.common imports this package
+    from pyffi.object_models.common import Int, Float
+    if not (isinstance(type_, type) and issubclass(type_, BasicBase)):
+        return None
+    if (type_.read is Int.read and type_.write is Int.write
+            and getattr(type_.get_size, "__func__", None)
+            is Int.get_size.__func__):
+        return type_._struct, type_._size
+    if (type_.read is Float.read and type_.write is Float.write
+            and type_.get_size is Float.get_size):
+        return 'f', 4
+    if (issubclass(type_, EnumBase)
+            and type_.read is EnumBase.read and type_.write is EnumBase.write
+            and type_.get_size is EnumBase.get_size):
+        return type_._struct, type_._numbytes
+    return None
+
+
+class _CodecBuilder(object):
+    """Generates the source code of a codec."""
+
+    def __init__(self, cls, data):
+        self.cls = cls
+        self.data = data
+        self.namespace = {"struct": struct}
+        self.num_consts = 0
+
+    def add_const(self, obj):
+        """Store *obj* in the namespace of the generated functions,
+        and return the name under which it is stored.
+        """
+        name = "_k%i" % self.num_consts
+        self.num_consts += 1
+        self.namespace[name] = obj
+        return name
+
+    def get_plan(self):
+        """Return list of (attribute, conditions) pairs, where
+        conditions is a list of source snippets that must all be true
+        at runtime for the attribute to be active, and the set of
+        names that must be tracked at runtime to skip duplicates. This
+        follows the logic of
+        :meth:`~pyffi.object_models.xml.struct_.StructBase._get_filtered_attribute_list`
+        exactly.
+        """
+        plan = []
+        tracked = set()
+        for attr, cond, vercond, track in self.cls._get_attribute_plan(
+                self.data):
+            conditions = []
+            if track:
+                conditions.append("not seen_%s" % attr.name)
+                tracked.add(attr.name)
+            if cond is not None:
+                conditions.append("%s.eval(self)" % self.add_const(cond))
+            if vercond is not None:
+                conditions.append("%s.eval(data)" % self.add_const(vercond))
+            plan.append((attr, conditions))
+        return plan, tracked
+
+    def get_arg_source(self, attr):
+        """Return source for the runtime argument of *attr*."""
+        if isinstance(attr.arg, (int, type(None))):
+            return repr(attr.arg)
+        else:
+            return "getattr(self, %r)" % attr.arg
+
+    def get_groups(self, plan):
+        """Split the plan into groups: a group is either a run of
+        unconditional fixed size basic attributes, or a single other
+        attribute.
+        """
+        # the instance of an attribute is created from the first
+        # attribute with that name (see StructBase.__init__), so
+        # this determines how the attribute is read and written
+        instance_attrs = {}
+        for attr in self.cls._attribute_list:
+            instance_attrs.setdefault(attr.name, attr)
+        groups = []
+        run = []
+        for attr, conditions in plan:
+            fmt = None
+            instance_attr = instance_attrs[attr.name]
+            if (instance_attr.arr1 is None and attr.arg is None
+                and not attr.is_abstract):
+                fmt = _get_basic_format(instance_attr.type_)
+            if fmt and not conditions:
+                run.append((attr, fmt))
+                continue
+            if run:
+                groups.append((run, []))
+                run = []
+            groups.append(([(attr, fmt)], conditions))
+        if run:
+            groups.append((run, []))
+        return groups
+
+    def build(self, key):
+        """Generate the codec."""
+        plan, tracked = self.get_plan()
+        groups = self.get_groups(plan)
+        byte_order = key[3]
+        lines = []
+        for func in ("read", "write", "get_size"):
+            if func == "get_size":
+                lines.append("def get_size(self, data):")
+                lines.append("    size = 0")
+            else:
+                lines.append("def %s(self, stream, data):" % func)
+            for name in sorted(tracked):
+                lines.append("    seen_%s = False" % name)
+            for run, conditions in groups:
+                indent = "    "
+                if conditions:
+                    lines.append(indent + "if %s:" % " and ".join(conditions))
+                    indent += "    "
+                    if run[0][0].name in tracked:
+                        lines.append(indent + "seen_%s = True" % run[0][0].name)
+                    if run[0][0].is_abstract:
+                        lines.append(indent + "pass")
+                        continue
+                elif run[0][0].is_abstract:
+                    continue
+                getattr(self, "emit_" + func)(lines, indent, run, byte_order)
+            if func == "get_size":
+                lines.append("    return size")
+            else:
+                lines.append("    return")
+            lines.append("")
+        source = "\n".join(lines)
+        exec(compile(source, "<codec %s>" % self.cls.__name__, "exec"),
+             self.namespace)
+        return StructCodec(self.cls, key, source, self.namespace)
+
+    def get_struct(self, run, byte_order):
+        """Return name of a :class:`struct.Struct` for a run of basic
+        attributes, and its size.
+        """
+        fmt = byte_order + "".join(fmt[0] for attr, fmt in run)
+        packer = struct.Struct(fmt)
+        return self.add_const(packer), packer.size
+
+    def emit_read(self, lines, indent, run, byte_order):
+        attr, fmt = run[0]
+        if fmt is None:
+            lines.append(indent + "value = self._%s_value_" % attr.name)
+            if attr.arg is not None:
+                lines.append(indent + "value.arg = %s"
+                             % self.get_arg_source(attr))
+            lines.append(indent + "value.read(stream, data)")
+            return
+        packer, size = self.get_struct(run, byte_order)
+        targets = "".join("self._%s_value_._value, " % attr.name
+                          for attr, fmt in run)
+        lines.append(indent + "%s= %s.unpack(stream.read(%i))"
+                     % (targets, packer, size))
+
+    def emit_write(self, lines, indent, run, byte_order):
+        attr, fmt = run[0]
+        if fmt is None:
+            lines.append(indent + "value = self._%s_value_" % attr.name)
+            if attr.arg is not None:
+                lines.append(indent + "value.arg = %s"
+                             % self.get_arg_source(attr))
+            lines.append(indent + "value.write(stream, data)")
+            return
+        packer, size = self.get_struct(run, byte_order)
+        values = ", ".join("self._%s_value_._value" % attr.name
+                           for attr, fmt in run)
+        # on failure (value out of range, float overflow, ...) fall back
+        # on the write method of each attribute, so the behaviour is
+        # identical to the generic implementation
+        lines.append(indent + "try:")
+        lines.append(indent + "    buf = %s.pack(%s)" % (packer, values))
+        lines.append(indent + "except (struct.error, OverflowError):")
+        for attr, fmt in run:
+            lines.append(indent + "    self._%s_value_.write(stream, data)"
+                         % attr.name)
+        lines.append(indent + "else:")
+        lines.append(indent + "    stream.write(buf)")
+
+    def emit_get_size(self, lines, indent, run, byte_order):
+        attr, fmt = run[0]
+        if fmt is None:
+            lines.append(indent + "size += self._%s_value_.get_size(data)"
+                         % attr.name)
+            return
+        lines.append(indent + "size += %i" % sum(fmt[1] for attr, fmt in run))
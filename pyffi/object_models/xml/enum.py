@@ -49,6 +49,14 @@ class _MetaEnumBase(type):
     and _numbytes attributes. It also adds enum class attributes.
 
     Used as metaclass of EnumBase."""
+    def __new__(metacls, name, bases, dct):
+        # enums only store their value, which is in a slot of BasicBase,
+        # so there is no need for an instance dictionary
+        if '__slots__' not in dct:
+            dct = dict(dct, __slots__=())
+        return super(_MetaEnumBase, metacls).__new__(
+            metacls, name, bases, dct)
+
     def __init__(cls, name, bases, dct):
         super(_MetaEnumBase, cls).__init__(name, bases, dct)
         # consistency checks
@@ -40,6 +40,7 @@
 # ***** END LICENSE BLOCK *****
 # --------------------------------------------------------------------------
 
+import keyword
 import re
 import sys  # stderr (for debugging)
 
@@ -78,6 +79,15 @@ class Expression(object):
     operators = set(('==', '!=', '>=', '<=', '&&', '||', '&', '|', '-', '!',
                      '<', '>', '/', '*', '+'))
 
+    _op_templates = {
+        '==': "%s == %s", '!=': "%s != %s", '>=': "%s >= %s",
+        '<=': "%s <= %s", '&&': "%s and %s", '||': "%s or %s",
+        '&': "%s & %s", '|': "%s | %s", '-': "%s - %s", '!': "not %.0s%s",
+        '>': "%s > %s", '<': "%s < %s", '/': "%s / %s", '*': "%s * %s",
+        '+': "%s + %s"}
+    """Python source templates for each operator, taking the left and
+    right operand."""
+
     def __init__(self, expr_str, name_filter=None):
         try:
             left, self._op, right = self._partition(expr_str)
@@ -86,77 +96,116 @@ class Expression(object):
         except:
             print("error while parsing expression '%s'" % expr_str)
             raise
+        self._compile()
+
+    def __getstate__(self):
+        # compiled functions cannot be pickled
+        state = self.__dict__.copy()
+        state.pop("eval", None)
+        return state
+
+    def __setstate__(self, state):
+        # compiled on first evaluation, see eval
+        self.__dict__.update(state)
 
     def eval(self, data=None):
-        """Evaluate the expression to an integer."""
+        """Evaluate the expression to an integer.
 
-        if isinstance(self._left, Expression):
-            left = self._left.eval(data)
-        elif isinstance(self._left, str):
-            if self._left == '""':
-                left = ""
-            else:
-                left = data
-                for part in self._left.split("."):
-                    left = getattr(left, part)
-        elif isinstance(self._left, type):
-            left = isinstance(data, self._left)
-        elif self._left is None:
-            pass
-        else:
-            assert (isinstance(self._left, int))  # debug
-            left = self._left
+        The expression is compiled into a Python function when it is
+        created, and that function replaces this method on the
+        instance, so this method is only called if the expression was
+        not compiled yet (for instance, after unpickling).
+        """
+        self._compile()
+        return self.eval(data)
+
+    def _compile(self):
+        """Compile the expression into a Python function, and store it
+        as the C{eval} attribute of the instance. The function
+        evaluates all operands in the same order as the expression
+        tree, so it raises the same exceptions.
+
+        >>> e = Expression('(b.c & 3) || a')
+        >>> print(e._get_source()) # doctest: +NORMALIZE_WHITESPACE
+        def eval(data=None):
+            v0 = data.b.c
+            v1 = v0 & 3
+            v2 = data.a
+            v3 = v1 or v2
+            return v3
+        """
+        namespace = {}
+        code = compile(self._get_source(namespace),
+                       "<expression %s>" % self, "exec")
+        exec(code, namespace)
+        self.eval = namespace["eval"]
 
+    def _get_source(self, namespace=None):
+        """Return source code of a function that evaluates the
+        expression. Operands which cannot be represented in source
+        code, such as types, are stored in C{namespace}.
+        """
+        if namespace is None:
+            namespace = {}
+        lines = []
+        result = self._emit(lines, namespace)
+        return "\n".join(
+            ["def eval(data=None):"]
+            + ["    " + line for line in lines]
+            + ["    return %s" % result])
+
+    def _emit(self, lines, namespace):
+        """Append statements that evaluate the expression to C{lines},
+        and return the source of the result.
+        """
+        left = self._emit_operand(self._left, lines, namespace, True)
         if not self._op:
             return left
+        right = self._emit_operand(self._right, lines, namespace, False)
+        try:
+            template = self._op_templates[self._op]
+        except KeyError:
+            raise NotImplementedError(
+                "expression syntax error: operator '"
+                + self._op + "' not implemented")
+        return self._emit_value(template % (left, right), lines)
 
-        if isinstance(self._right, Expression):
-            right = self._right.eval(data)
-        elif isinstance(self._right, str):
-            if (not self._right) or self._right == '""':
-                right = ""
-            else:
-                right = getattr(data, self._right)
-        elif isinstance(self._right, type):
-            right = isinstance(data, self._right)
-        elif self._right is None:
-            pass
-        else:
-            assert (isinstance(self._right, int))  # debug
-            right = self._right
-
-        if self._op == '==':
-            return left == right
-        elif self._op == '!=':
-            return left != right
-        elif self._op == '>=':
-            return left >= right
-        elif self._op == '<=':
-            return left <= right
-        elif self._op == '&&':
-            return left and right
-        elif self._op == '||':
-            return left or right
-        elif self._op == '&':
-            return left & right
-        elif self._op == '|':
-            return left | right
-        elif self._op == '-':
-            return left - right
-        elif self._op == '!':
-            return not (right)
-        elif self._op == '>':
-            return left > right
-        elif self._op == '<':
-            return left < right
-        elif self._op == '/':
-            return left / right
-        elif self._op == '*':
-            return left * right
-        elif self._op == '+':
-            return left + right
+    def _emit_operand(self, operand, lines, namespace, is_left):
+        """Return source of an operand, appending statements to
+        C{lines} if needed. Dotted names are only followed in the left
+        operand.
+        """
+        if isinstance(operand, Expression):
+            return operand._emit(lines, namespace)
+        elif isinstance(operand, str):
+            if (not operand) or operand == '""':
+                return '""'
+            parts = operand.split(".") if is_left else [operand]
+            source = "data"
+            for part in parts:
+                if part.isidentifier() and not keyword.iskeyword(part):
+                    source += "." + part
+                else:
+                    source = "getattr(%s, %r)" % (source, part)
+            return self._emit_value(source, lines)
+        elif isinstance(operand, type):
+            name = "c%i" % len(namespace)
+            namespace[name] = operand
+            return self._emit_value("isinstance(data, %s)" % name, lines)
+        elif operand is None:
+            return "None"
         else:
-            raise NotImplementedError("expression syntax error: operator '" + self._op + "' not implemented")
+            assert (isinstance(operand, int))  # debug
+            return repr(operand)
+
+    @staticmethod
+    def _emit_value(source, lines):
+        """Append statement that stores the value of C{source} in a new
+        variable, and return the name of that variable.
+        """
+        name = "v%i" % len(lines)
+        lines.append("%s = %s" % (name, source))
+        return name
 
     def __str__(self):
         """Reconstruct the expression to a string."""
@@ -338,6 +387,23 @@ class Expression(object):
                 raise ValueError("expression syntax error (non-matching brackets?)")
         return start_pos, end_pos
 
+    def get_names(self):
+        """Return set of all names that the expression refers to. Only
+        the first component of dotted names is returned.
+
+        >>> sorted(Expression('(a == 1) && (b.c != d)').get_names())
+        ['a', 'b', 'd']
+        >>> sorted(Expression('!(1 <= 2)').get_names())
+        []
+        """
+        names = set()
+        for operand in (self._left, self._right):
+            if isinstance(operand, Expression):
+                names |= operand.get_names()
+            elif isinstance(operand, str) and operand and operand != '""':
+                names.add(operand.split(".")[0])
+        return names
+
     def map_(self, func):
         if isinstance(self._left, Expression):
             self._left.map_(func)
@@ -347,6 +413,9 @@ class Expression(object):
             self._right.map_(func)
         else:
             self._right = func(self._right)
+        # recompile, unless compilation was deferred until evaluation
+        if "eval" in self.__dict__:
+            self._compile()
 
 
 if __name__ == "__main__":
@@ -42,17 +42,64 @@
 # note: some imports are defined at the end to avoid problems with circularity
 import logging
 from functools import partial
+import weakref
 
 
 from pyffi.utils.graph import DetailNode, GlobalNode, EdgeFilter
 import pyffi.object_models.common
 
+# names on the data element that are part of the attribute plan key
+_PLAN_KEY_NAMES = frozenset(("version", "user_version", "user_version_2"))
+
+
+def get_plan_key(data):
+    """Return the versions of *data* on which the attribute plans
+    and the hashes of structures depend.
+
+    >>> from pyffi.object_models import FileFormat
+    >>> get_plan_key(FileFormat.Data())
+    (None, None, None)
+    >>> get_plan_key(None)
+    (None, None, None)
+    """
+    if data is None:
+        return (None, None, None)
+    return (data.version, data.user_version,
+            getattr(data, "user_version_2", None))
+
+
+def invalidate_hash(node):
+    """Forget the cached hash of *node* (a structure or an array),
+    and of all structures and arrays which contain it. See
+    L{StructBase.use_hash_cache}."""
+    while node is not None and node._hash is not None:
+        node._hash = None
+        parent = node._hash_parent
+        node = parent() if parent is not None else None
+
+
 class _MetaStructBase(type):
     """This metaclass checks for the presence of _attrs and _is_template
     attributes. For each attribute in _attrs, an
     <attrname> property is generated which gets and sets basic types,
     and gets other types (struct and array). Used as metaclass of
     StructBase."""
+    def __new__(metacls, name, bases, dct):
+        # store the attribute instances in slots rather than in the
+        # instance dictionary, to save memory
+        if '_attrs' in dct and '__slots__' not in dct:
+            slots = []
+            for attr in dct['_attrs']:
+                slot = "_%s_value_" % attr.name
+                # names which are not identifiers go into the dictionary
+                if (not slot.isidentifier() or slot in slots
+                    or any(hasattr(base, slot) for base in bases)):
+                    continue
+                slots.append(slot)
+            dct = dict(dct, __slots__=tuple(slots))
+        return super(_MetaStructBase, metacls).__new__(
+            metacls, name, bases, dct)
+
     def __init__(cls, name, bases, dct):
         super(_MetaStructBase, cls).__init__(name, bases, dct)
         # does the type contain a Ref or a Ptr?
@@ -134,6 +181,15 @@ class _MetaStructBase(type):
         # precalculate the attribute name list
         cls._names = cls._get_names()
 
+        # compiled codecs, see pyffi.object_models.xml.codec
+        # (always reset, as customized classes copy the dictionary of the
+        # generated class)
+        cls._codecs = {}
+
+        # attribute plans, see StructBase._get_attribute_plan
+        # (always reset, for the same reason)
+        cls._attribute_plans = {}
+
     def __repr__(cls):
         return "<struct '%s'>"%(cls.__name__)
 
@@ -224,9 +280,47 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
     _is_template = False
     _attrs = []
     _games = {}
-    arg = None
     logger = logging.getLogger("pyffi.nif.data.struct")
 
+    # attribute instances are stored in slots (see _MetaStructBase)
+    __slots__ = ("arg", "_hash", "_hash_parent")
+
+    use_codecs = False
+    """Set to ``True`` to read, write, and calculate the size of
+    structures through codecs compiled for each class and version
+    (see :mod:`pyffi.object_models.xml.codec`). Codecs give the same
+    result as the generic implementation, but are much faster. They
+    are not used when debug logging is enabled."""
+
+    use_hash_cache = False
+    """Set to ``True`` to keep the result of L{get_hash} for
+    structures without links, and for arrays whose elements have no
+    links, until they are changed. Hashes of structures which contain
+    links are still calculated every time, as they depend on the
+    blocks which are linked, but the hashes of their other attributes
+    are taken from the cache.
+
+    Changes through attributes, array items, list methods,
+    L{read}, and L{Array.update_size} invalidate the cached hash of
+    the changed structure or array, and of all cached structures and
+    arrays which contain it. Changes which bypass these, such as
+    calling C{set_value} on an instance obtained from
+    L{get_attribute}, are not noticed."""
+
+    link_generation = 0
+    """Incremented whenever a link is set, or added to or removed
+    from an array, so that anything derived from the links of a tree
+    (such as the lookup tables of L{pyffi.formats.nif.NifFormat.Data})
+    can tell whether it is out of date. File formats may increment it
+    on other changes which such tables depend on as well."""
+
+    # bytes from which the structure was read, for file formats which
+    # write unchanged structures back as they were read (see
+    # pyffi.formats.nif.NifFormat.Data.read); forgotten as soon as the
+    # structure may change, that is, when an attribute is set, or when
+    # an attribute which is not a basic type is accessed
+    _raw = None
+
     # initialize all attributes
     def __init__(self, template = None, argument = None, parent = None):
         """The constructor takes a tempate: any attribute whose type,
@@ -245,12 +339,11 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
         names = set()
         # initialize argument
         self.arg = argument
+        # no hash cached yet (see get_hash)
+        self._hash = None
+        self._hash_parent = None
         # save parent (note: disabled for performance)
         #self._parent = weakref.ref(parent) if parent else None
-        # initialize item list
-        # this list is used for instance by qskope to display the structure
-        # in a tree view
-        self._items = []
         # initialize attributes
         for attr in self._attribute_list:
             # skip attributes with dupiclate names
@@ -293,8 +386,50 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
             # assign attribute value
             setattr(self, "_%s_value_" % attr.name, attr_instance)
 
-            # add instance to item list
-            self._items.append(attr_instance)
+    @classmethod
+    def _get_pickle_plan(cls):
+        """Return the names under which the attribute values are
+        stored, and the name and count expressions of every array
+        attribute.
+        """
+        plan = cls.__dict__.get("_pickle_plan")
+        if plan is None:
+            names = []
+            arrays = []
+            for attr in cls._attribute_list:
+                name = "_%s_value_" % attr.name
+                if name in names:
+                    continue
+                names.append(name)
+                if attr.arr1 is not None:
+                    arrays.append((name, attr.arr1, attr.arr2))
+            plan = cls._pickle_plan = tuple(names), tuple(arrays)
+        return plan
+
+    def __getstate__(self):
+        # the attribute values are pickled, and any public attributes
+        # which were added to the instance (but not private ones, such
+        # as caches)
+        names = self._get_pickle_plan()[0]
+        dct = self.__dict__
+        if dct:
+            dct = dict((name, value) for name, value in dct.items()
+                       if not name.startswith("_"))
+        return (self.arg, tuple([getattr(self, name) for name in names]),
+                dct or None)
+
+    def __setstate__(self, state):
+        names, arrays = self._get_pickle_plan()
+        self.arg, values, dct = state
+        self._hash = None
+        self._hash_parent = None
+        for name, value in zip(names, values):
+            setattr(self, name, value)
+        if dct:
+            self.__dict__.update(dct)
+        # arrays do not pickle their parent and count expressions
+        for name, count1, count2 in arrays:
+            getattr(self, name)._restore_parent(self, count1, count2)
 
     def deepcopy(self, block):
         """Copy attributes from a given block (one block class must be a
@@ -341,6 +476,10 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
         return text
 
     def _log_struct(self, stream, attr):
+        # formatting the value is expensive, and it would unpack packed
+        # arrays, so only do so if the message is actually logged
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
         val = getattr(self, "_%s_value_" % attr.name)  # debug
         if not isinstance(val, BasicBase):  # debug
             self.logger.debug(val.__class__.__name__ + ":" + attr.name)
@@ -354,8 +493,24 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
                 hex_ver = "0x%08X" % offset
                 self.logger.debug("* {0}.{1} = {2} : type {3} at {4} offset {5} - ".format(self.__class__.__name__, attr.name, str(out), attr.type_, hex_ver, offset ))  # debug
 
+    def _get_codec(self, data):
+        """Return the compiled codec for this structure, or ``None`` if
+        the generic implementation must be used."""
+        if not self.use_codecs or data is None:
+            return None
+        return get_codec(self.__class__, data)
+
     def read(self, stream, data):
         """Read structure from stream."""
+        if self._hash is not None:
+            invalidate_hash(self)
+        if self._raw is not None:
+            self._raw = None
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            codec = self._get_codec(data)
+            if codec is not None:
+                codec.read(self, stream, data)
+                return
         # read all attributes
         for attr in self._get_filtered_attribute_list(data):
             # skip abstract attributes
@@ -375,6 +530,11 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
 
     def write(self, stream, data):
         """Write structure to stream."""
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            codec = self._get_codec(data)
+            if codec is not None:
+                codec.write(self, stream, data)
+                return
         # write all attributes
         for attr in self._get_filtered_attribute_list(data):
             # skip abstract attributes
@@ -449,6 +609,9 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
 
     def get_size(self, data=None):
         """Calculate the structure size in bytes."""
+        codec = self._get_codec(data)
+        if codec is not None:
+            return codec.get_size(self, data)
         # calculate size
         size = 0
         for attr in self._get_filtered_attribute_list(data):
@@ -460,6 +623,8 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
 
     def get_hash(self, data=None):
         """Calculate a hash for the structure, as a tuple."""
+        if self.use_hash_cache and not self._has_links:
+            return self._get_cached_hash(data)
         # calculate hash
         hsh = []
         for attr in self._get_filtered_attribute_list(data):
@@ -467,6 +632,25 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
                 getattr(self, "_%s_value_" % attr.name).get_hash(data))
         return tuple(hsh)
 
+    def _get_cached_hash(self, data):
+        """Return the hash from the cache, or calculate and cache it.
+        Attributes which can cache their hash as well are told that they
+        belong to this structure, so changing them invalidates the
+        cache of this structure too."""
+        key = get_plan_key(data)
+        if self._hash is not None and self._hash[0] == key:
+            return self._hash[1]
+        hsh = []
+        ref = weakref.ref(self)
+        for attr in self._get_filtered_attribute_list(data):
+            value = getattr(self, "_%s_value_" % attr.name)
+            hsh.append(value.get_hash(data))
+            if not isinstance(value, BasicBase):
+                value._hash_parent = ref
+        hsh = tuple(hsh)
+        self._hash = (key, hsh)
+        return hsh
+
     def replace_global_node(self, oldbranch, newbranch, **kwargs):
         for attr in self._get_filtered_attribute_list():
             # check if there are any links at all
@@ -517,65 +701,100 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
                 names.append(attr.name)
         return names
 
-    def _get_filtered_attribute_list(self, data=None):
-        """Generator for listing all 'active' attributes, that is,
-        attributes whose condition evaluates ``True``, whose version
-        interval contains C{version}, and whose user version is
-        C{user_version}. ``None`` for C{version} or C{user_version} means
-        that these checks are ignored. Duplicate names are skipped as
-        well.
-
-        Note: version and user_version arguments are deprecated, use
-        the data argument instead.
+    @classmethod
+    def _get_attribute_plan(cls, data=None):
+        """Return the list of attributes that pass all checks which
+        only depend on C{version}, C{user_version}, and
+        C{user_version_2} of C{data}, as (attr, cond, vercond, track)
+        tuples. Here, C{cond} and C{vercond} are the conditions that
+        must still be evaluated at runtime (C{cond} on the structure,
+        C{vercond} on C{data}), or C{None}, and C{track} tells whether
+        the attribute name must be checked for duplicates at runtime.
+        Duplicates that can be resolved statically are removed.
+
+        The plan is cached per class and per versions, so it is only
+        calculated once.
         """
-        if data is not None:
-            version = data.version
-            user_version = data.user_version
-        else:
-            version = None
-            user_version = None
-        names = set()
-        for attr in self._attribute_list:
-            #print(attr.name, version, attr.ver1, attr.ver2) # debug
-
+        key = get_plan_key(data)
+        version, user_version = key[:2]
+        try:
+            return cls._attribute_plans[key]
+        except KeyError:
+            pass
+        entries = []
+        # names of attributes that are always active
+        definitely_seen = set()
+        # names of attributes that are active depending on a condition
+        maybe_seen = set()
+        for attr in cls._attribute_list:
             # check version
             if version is not None:
                 if attr.ver1 is not None and version < attr.ver1:
                     continue
                 if attr.ver2 is not None and version > attr.ver2:
                     continue
-            #print("version check passed") # debug
-
             # check user version
             if (attr.userver is not None and user_version is not None
                 and user_version != attr.userver):
                 continue
-            #print("user version check passed") # debug
-
-            # check conditions
-            if attr.cond is not None and not attr.cond.eval(self):
-                continue
-
+            # check version condition: if it only depends on versions
+            # then it can be resolved now
+            vercond = None
             if (version is not None and user_version is not None
                 and attr.vercond is not None):
-                if not attr.vercond.eval(data):
-                    continue
-
-            #print("condition passed") # debug
+                if attr.vercond.get_names() <= _PLAN_KEY_NAMES:
+                    if not attr.vercond.eval(data):
+                        continue
+                else:
+                    vercond = attr.vercond
+            # skip duplicate names
+            if attr.name in definitely_seen:
+                continue
+            if attr.cond is None and vercond is None:
+                definitely_seen.add(attr.name)
+            else:
+                maybe_seen.add(attr.name)
+            entries.append((attr, attr.cond, vercond))
+        # names which can only be resolved at runtime
+        tracked = set(attr.name for attr, cond, vercond in entries
+                      if attr.name in maybe_seen)
+        plan = [(attr, cond, vercond, attr.name in tracked)
+                for attr, cond, vercond in entries]
+        cls._attribute_plans[key] = plan
+        return plan
 
-            # skip dupiclate names
+    def _get_filtered_attribute_list(self, data=None):
+        """Generator for listing all 'active' attributes, that is,
+        attributes whose condition evaluates ``True``, whose version
+        interval contains C{version}, and whose user version is
+        C{user_version}. ``None`` for C{version} or C{user_version} means
+        that these checks are ignored. Duplicate names are skipped as
+        well.
 
-            if attr.name in names:
+        Note: version and user_version arguments are deprecated, use
+        the data argument instead.
+        """
+        names = set()
+        for attr, cond, vercond, track in self._get_attribute_plan(data):
+            # skip duplicate names
+            if track and attr.name in names:
                 continue
-            #print("duplicate check passed") # debug
-
-            names.add(attr.name)
+            # check conditions
+            if cond is not None and not cond.eval(self):
+                continue
+            if vercond is not None and not vercond.eval(data):
+                continue
+            if track:
+                names.add(attr.name)
             # passed all tests
             # so yield the attribute
             yield attr
 
     def get_attribute(self, name):
         """Get a (non-basic) attribute."""
+        if self._raw is not None:
+            # the attribute can be changed through the returned instance
+            self._raw = None
         return getattr(self, "_" + name + "_value_")
 
     # important note: to apply partial(set_attribute, name = 'xyz') the
@@ -590,6 +809,12 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
                                value.__class__.__name__))
         # set it
         setattr(self, "_" + name + "_value_", value)
+        if self._hash is not None:
+            invalidate_hash(self)
+        if self._raw is not None:
+            self._raw = None
+        # the attribute may hold links
+        StructBase.link_generation += 1
 
     def get_basic_attribute(self, name):
         """Get a basic attribute."""
@@ -600,6 +825,10 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
     def set_basic_attribute(self, value, name):
         """Set the value of a basic attribute."""
         getattr(self, "_" + name + "_value_").set_value(value)
+        if self._hash is not None:
+            invalidate_hash(self)
+        if self._raw is not None:
+            self._raw = None
 
     def get_template_attribute(self, name):
         """Get a template attribute."""
@@ -628,7 +857,12 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
 
     def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
         """Yield children of this structure."""
-        return (item for item in self._items)
+        # the children can be changed through the returned instances
+        if self._hash is not None:
+            invalidate_hash(self)
+        if self._raw is not None:
+            self._raw = None
+        return (getattr(self, "_%s_value_" % name) for name in self._names)
 
     def get_detail_child_names(self, edge_filter=EdgeFilter()):
         """Yield names of the children of this structure."""
@@ -649,3 +883,4 @@ class StructBase(GlobalNode, metaclass=_MetaStructBase):
 
 from pyffi.object_models.xml.basic import BasicBase
 from pyffi.object_models.xml.array import Array
+from pyffi.object_models.xml.codec import get_codec
@@ -140,8 +140,7 @@ from copy import deepcopy
 import gc
 
 import logging  # Logger
-import concurrent.futures  # ProcessPoolExecutor
-import multiprocessing  # current_process, cpu_count
+import multiprocessing  # current_process, cpu_count, Pool
 import optparse
 import os  # remove
 import os.path  # getsize, split, join
@@ -152,6 +151,8 @@ import tempfile
 
 import pyffi  # for pyffi.__version__
 import pyffi.object_models  # pyffi.object_models.FileFormat
+import pyffi.object_models.xml.struct_  # StructBase.use_hash_cache
+from pyffi.utils.memory_stream import open_file
 
 
 class Spell(object):
@@ -388,6 +389,37 @@ class Spell(object):
         """
         pass
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        """Called in a worker process, when the toaster runs more than
+        one job, after the worker has toasted a single file. Returns
+        the statistics which the spell aggregated on the worker's
+        toaster for that file, so they can be merged into the main
+        toaster with :meth:`toastreduce`. The result must be
+        picklable. The default implementation returns ``None``.
+
+        :param toaster: The toaster of the worker process.
+        :type toaster: :class:`Toaster`
+        :return: The partial aggregate of the file.
+        """
+        return None
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        """Called in the main process, for every partial aggregate
+        returned by :meth:`toastpartial`, as soon as the file is done.
+        Spells that initialize statistics in :meth:`toastentry`, and
+        report on them in :meth:`toastexit`, should override both
+        methods, so their report covers the files of all processes.
+        The default implementation does nothing.
+
+        :param toaster: The toaster this spell is called from.
+        :type toaster: :class:`Toaster`
+        :param partial: The partial aggregate of a file, as returned by
+            :meth:`toastpartial`.
+        """
+        pass
+
     @classmethod
     def get_toast_stream(cls, toaster, filename, test_exists=False):
         """Returns the stream that the toaster will write to. The
@@ -455,6 +487,16 @@ class SpellGroupBase(Spell):
         for spellclass in cls.ACTIVESPELLCLASSES:
             spellclass.toastexit(toaster)
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        return [spellclass.toastpartial(toaster)
+                for spellclass in cls.ACTIVESPELLCLASSES]
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        for spellclass, spellpartial in zip(cls.ACTIVESPELLCLASSES, partial):
+            spellclass.toastreduce(toaster, spellpartial)
+
 
 class SpellGroupSeriesBase(SpellGroupBase):
     """Base class for running spells in series."""
@@ -607,6 +649,12 @@ class fake_logger:
 def _toaster_job(args):
     """For multiprocessing. This function creates a new toaster, with the
     given options and spells, and calls the toaster on filename.
+
+    :return: ``None`` if the spell does not apply, otherwise the
+        :attr:`Toaster.files_done`, :attr:`Toaster.files_skipped`, and
+        :attr:`Toaster.files_failed` of the new toaster, along with the
+        partial aggregate of the spell (see :meth:`Spell.toastpartial`),
+        to be merged with :meth:`Toaster._reduce`.
     """
 
     class multiprocessing_fake_logger(fake_logger):
@@ -626,14 +674,17 @@ def _toaster_job(args):
     # toast entry code
     if not toaster.spellclass.toastentry(toaster):
         print("pyffi.toaster:%s" % "Spell does not apply! quiting early...")
-        return
+        return None
 
     # toast single file
-    stream = open(filename, mode='rb' if toaster.spellclass.READONLY else 'r+b')
-    toaster._toast(stream)
+    # (files are mapped in memory for read only spells)
+    with open_file(filename,
+                   mode='rb' if toaster.spellclass.READONLY else 'r+b') as stream:
+        toaster._toast(stream)
 
-    # toast exit code
-    toaster.spellclass.toastexit(toaster)
+    # the main process calls the toast exit code, once all results are merged
+    return (toaster.files_done, toaster.files_skipped, toaster.files_failed,
+            toaster.spellclass.toastpartial(toaster))
 
 # CPU_COUNT is used for default number of jobs
 if multiprocessing:
@@ -677,6 +728,7 @@ class Toaster(object):
         archives=False,
         resume=False,
         gccollect=False,
+        hashcache=False,
         inifile="")
     """List of spell classes of the particular :class:`Toaster` instance."""
 
@@ -777,6 +829,10 @@ class Toaster(object):
             re.compile(regex) for regex in self.options["skip"])
         self.only_regexs = tuple(
             re.compile(regex) for regex in self.options["only"])
+        # keep hashes of structures until they change
+        # (the cache stays enabled for the rest of the process)
+        if self.options["hashcache"]:
+            pyffi.object_models.xml.struct_.StructBase.use_hash_cache = True
 
     def _update_spellclass(self):
         """Update spell class from given list of spell names."""
@@ -1027,7 +1083,7 @@ class Toaster(object):
             "--refresh", dest="refresh",
             type="int",
             metavar="REFRESH",
-            help="start new process pool every JOBS * REFRESH files"
+            help="restart each process after it has toasted REFRESH files"
                  " if JOBS is 2 or more"
                  " (when processing a large number of files, this prevents"
                  " leaking memory on some operating systems) [default: %default]")
@@ -1079,6 +1135,12 @@ class Toaster(object):
             action="store_true",
             help="run garbage collector after every spell"
                  " (slows down toaster but may save memory)")
+        parser.add_option(
+            "--hash-cache", dest="hashcache",
+            action="store_true",
+            help="keep hashes of blocks until they are changed"
+                 " (speeds up spells which compare blocks, such as"
+                 " opt_mergeduplicates, in particular in a series)")
         parser.set_defaults(**deepcopy(self.DEFAULT_OPTIONS))
         (options, args) = parser.parse_args()
 
@@ -1172,24 +1234,20 @@ class Toaster(object):
         :type top: str
         """
 
-        def file_pools(chunksize):
-            """Helper function which generates list of files, sorted by size,
-            in chunks of given size.
+        def file_queue():
+            """Helper function which lists all files, largest first, so
+            the slowest files do not end up last in the queue.
             """
-            all_files = pyffi.utils.walk(
-                top, onerror=None,
-                re_filename=self.FILEFORMAT.RE_FILENAME)
-            while True:
-                # fetch chunksize files from all files
-                file_pool = [
-                    filename for i, filename in zip(
-                        range(chunksize), all_files)]
-                if not file_pool:
-                    # done!
-                    break
-                # sort files by size
-                file_pool.sort(key=os.path.getsize, reverse=True)
-                yield file_pool
+            def get_size(filename):
+                try:
+                    return os.path.getsize(filename)
+                except OSError:
+                    return 0
+            return sorted(
+                pyffi.utils.walk(
+                    top, onerror=None,
+                    re_filename=self.FILEFORMAT.RE_FILENAME),
+                key=get_size, reverse=True)
 
         # toast entry code
         if not self.spellclass.toastentry(self):
@@ -1255,22 +1313,40 @@ class Toaster(object):
                     # force free memory (helps when parsing many files)
                     gc.collect()
         else:
-            chunksize = self.options["refresh"] * self.options["jobs"]
-            self.msg("toasting with %i threads in chunks of %i files"
-                     % (jobs, chunksize))
-            for file_pool in file_pools(chunksize):
-                self.logger.debug("process file pool:")
-                for filename in file_pool:
-                    self.logger.debug("  " + filename)
-                with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
-                    list(executor.map(
+            refresh = self.options["refresh"]
+            self.msg("toasting with %i processes" % jobs)
+            # a single pool for all files; every file is handed out
+            # as soon as a process is free
+            with multiprocessing.Pool(
+                    processes=jobs, maxtasksperchild=refresh or None) as pool:
+                for result in pool.imap_unordered(
                         _toaster_job,
-                        ((self.__class__, filename, self.options, self.spellnames)
-                         for filename in file_pool)))
+                        ((self.__class__, filename, self.options,
+                          self.spellnames)
+                         for filename in file_queue())):
+                    self._reduce(result)
 
         # toast exit code
         self.spellclass.toastexit(self)
 
+    def _reduce(self, result):
+        """Merge the result of a file that was toasted in another
+        process into this toaster: the file is added to
+        :attr:`files_done`, :attr:`files_skipped`, or
+        :attr:`files_failed`, and the partial aggregate of the spell is
+        passed to :meth:`Spell.toastreduce`.
+
+        :param result: The result of the file, or ``None`` if the spell
+            did not apply.
+        """
+        if result is None:
+            return
+        files_done, files_skipped, files_failed, partial = result
+        self.files_done.update(files_done)
+        self.files_skipped.update(files_skipped)
+        self.files_failed.update(files_failed)
+        self.spellclass.toastreduce(self, partial)
+
     def toast_archives(self, top):
         """Toast all files in all archives."""
         if not self.FILEFORMAT.ARCHIVE_CLASSES:
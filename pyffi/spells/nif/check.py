@@ -113,6 +113,16 @@ class SpellNodeNamesByFlag(pyffi.spells.nif.NifSpell):
         for flag, names in toaster.flagdict.items():
             toaster.msg("%s %s" % (flag, names))
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        return toaster.flagdict
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        for flag, names in partial.items():
+            flagnames = toaster.flagdict.setdefault(flag, [])
+            flagnames.extend(name for name in names if name not in flagnames)
+
     def datainspect(self):
         return self.inspectblocktype(NifFormat.NiNode)
 
@@ -702,6 +712,14 @@ class SpellCheckTriStrip(pyffi.spells.nif.NifSpell):
                     % (sum(toaster.striplengths)
                        / float(len(toaster.striplengths))))
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        return toaster.striplengths
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        toaster.striplengths += partial
+
     def datainspect(self):
         return self.inspectblocktype(NifFormat.NiTriBasedGeomData)
 
@@ -814,6 +832,28 @@ class SpellCheckVersion(pyffi.spells.nif.NifSpell):
             toaster.msg("user version2: %s" % toaster.user_version_2s[version])
             toaster.msgblockend()
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        return (toaster.versions, toaster.user_versions,
+                toaster.user_version_2s)
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        versions, user_versions, user_version_2s = partial
+        for version, num_nifs in versions.items():
+            if version not in toaster.versions:
+                toaster.versions[version] = 0
+                toaster.user_versions[version] = []
+                toaster.user_version_2s[version] = []
+            toaster.versions[version] += num_nifs
+            for all_user_versions, file_user_versions in (
+                    (toaster.user_versions, user_versions),
+                    (toaster.user_version_2s, user_version_2s)):
+                all_user_versions[version].extend(
+                    user_version
+                    for user_version in file_user_versions[version]
+                    if user_version not in all_user_versions[version])
+
     def datainspect(self):
         # some shortcuts
         version = self.data.version
@@ -890,6 +930,14 @@ class SpellCheckTriangles(pyffi.spells.nif.NifSpell):
         toaster.geometries = []
         return True
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        return [list(triangles) for triangles in toaster.geometries]
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        toaster.geometries += partial
+
     def branchinspect(self, branch):
         # only inspect the NiAVObject branch
         return isinstance(branch, NifFormat.NiAVObject)
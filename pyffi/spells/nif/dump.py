@@ -65,6 +65,7 @@ def dumpArray(arr):
     :return: String describing the array.
     """
     text = ""
+    arr._materialize()
     if arr._count2 == None:
         for i, element in enumerate(list.__iter__(arr)):
             if i > 16:
@@ -273,6 +274,19 @@ class SpellHtmlReport(NifSpell):
         else:
             toaster.msg('No Report Generated')
 
+    @classmethod
+    def toastpartial(cls, toaster):
+        return toaster.reports_per_blocktype
+
+    @classmethod
+    def toastreduce(cls, toaster, partial):
+        for blocktype, reports in partial.items():
+            if blocktype in toaster.reports_per_blocktype:
+                # skip the header row
+                toaster.reports_per_blocktype[blocktype] += reports[1:]
+            else:
+                toaster.reports_per_blocktype[blocktype] = reports
+
     @classmethod
     def browser(cls, htmlstr):
         """Display html in the default web browser without creating a
@@ -442,6 +456,7 @@ class SpellDumpPython(NifSpell):
             result = False
             if _value:
                 self.print_("%s.update_size()" % name)
+                _value._materialize()
                 if _value._count2 is None:
                     for i, elem in enumerate(list.__iter__(_value)):
                         if self.print_instance(
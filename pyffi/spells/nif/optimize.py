@@ -164,8 +164,9 @@ class SpellMergeDuplicates(pyffi.spells.nif.NifSpell):
 
     def __init__(self, *args, **kwargs):
         pyffi.spells.nif.NifSpell.__init__(self, *args, **kwargs)
-        # list of all branches visited so far
-        self.branches = []
+        # all branches visited so far, in lists by interchangeable hash
+        # (see NifFormat.NiObject.get_interchangeable_hash)
+        self.branches = {}
 
     def datainspect(self):
         # see MadCat221's metstaff.nif:
@@ -186,7 +187,12 @@ class SpellMergeDuplicates(pyffi.spells.nif.NifSpell):
                                    NifFormat.NiGeometryData))
 
     def branchentry(self, branch):
-        for otherbranch in self.branches:
+        branchhash = branch.get_interchangeable_hash()
+        if branchhash is None:
+            # branch is only interchangeable with itself
+            return True
+        branches = self.branches.setdefault(branchhash, [])
+        for otherbranch in branches:
             if (branch is not otherbranch and
                 branch.is_interchangeable(otherbranch)):
                 # skip properties that have controllers (the
@@ -206,7 +212,7 @@ class SpellMergeDuplicates(pyffi.spells.nif.NifSpell):
                 return False
         else:
             # no duplicate found, add to list of visited branches
-            self.branches.append(branch)
+            branches.append(branch)
             # continue recursion
             return True
 
@@ -232,6 +238,8 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
         # list of all optimized geometries so far
         # (to avoid optimizing the same geometry twice)
         self.optimized = []
+        # (vertex, normal) hashes of the geometry being optimized
+        self.welding_hashes = None
 
     def datainspect(self):
         # do not optimize if an egm or tri file is detected
@@ -249,14 +257,24 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
 
     def optimize_vertices(self, data):
         self.toaster.msg("removing duplicate vertices")
+        vhashes = list(data.get_vertex_hash_generator(
+            vertexprecision=self.VERTEXPRECISION,
+            normalprecision=self.NORMALPRECISION,
+            uvprecision=self.UVPRECISION,
+            vcolprecision=self.VCOLPRECISION))
+        # keep the (vertex, normal) part of the hashes, so the tangent
+        # space can be welded without hashing the vertices again; this
+        # only works if they have the precision that
+        # update_tangent_space uses (opt_reducegeometry changes it)
+        if (data.has_vertices and data.vertices
+                and data.has_normals and data.normals
+                and self.VERTEXPRECISION == 3
+                and self.NORMALPRECISION == 3):
+            self.welding_hashes = [vhash[:6] for vhash in vhashes]
+        else:
+            self.welding_hashes = None
         # get map, deleting unused vertices
-        return unique_map(
-            vhash
-            for i, vhash in enumerate(data.get_vertex_hash_generator(
-                vertexprecision=self.VERTEXPRECISION,
-                normalprecision=self.NORMALPRECISION,
-                uvprecision=self.UVPRECISION,
-                vcolprecision=self.VCOLPRECISION)))
+        return unique_map(vhashes)
 
     def branchentry(self, branch):
         """Optimize a NiTriStrips or NiTriShape block:
@@ -510,7 +528,13 @@ class SpellOptimizeGeometry(pyffi.spells.nif.NifSpell):
                         block_type=NifFormat.NiBinaryExtraData)
                 or (data.num_uv_sets & 61440) or (data.extra_vectors_flags & 16)):
             self.toaster.msg("recalculating tangent space")
-            branch.update_tangent_space()
+            if self.welding_hashes is not None:
+                welding_groups = unique_map(
+                    self.welding_hashes[old_i]
+                    for old_i in v_map_inverse)[0]
+            else:
+                welding_groups = None
+            branch.update_tangent_space(welding_groups=welding_groups)
 
         # stop recursion
         return False
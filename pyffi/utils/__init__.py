@@ -148,24 +148,22 @@ def unique_map(hash_generator):
     on hash, which is useful for removing duplicate data. If the hash
     generator yields None then the value is mapped to None (useful for
     discarding data).
+
+    >>> unique_map([(1, 2), (3, 4), None, (1, 2), (5, 6), (3, 4)])
+    ([0, 1, None, 0, 2, 1], [0, 1, 4])
     """
 
-    hash_map = []  # maps old index to new index
-    hash_map_inverse = []  # inverse: map new index to old index
     hash_index_map = {None: None}  # maps hash to new index (default for None)
-    new_index = 0
-    for old_index, hash_ in enumerate(hash_generator):
-        try:
-            hash_index = hash_index_map[hash_]
-        except KeyError:
-            # hash is new
-            hash_index_map[hash_] = new_index
-            hash_map.append(new_index)
-            hash_map_inverse.append(old_index)
-            new_index += 1
-        else:
-            # hash already exists
-            hash_map.append(hash_index)
+    setdefault = hash_index_map.setdefault
+    # map old index to new index: a new hash gets the next new index
+    hash_map = [setdefault(hash_, len(hash_index_map) - 1)
+                for hash_ in hash_generator]
+    # inverse: map new index to old index (of first occurrence)
+    hash_map_inverse = [None] * (len(hash_index_map) - 1)
+    for old_index in range(len(hash_map) - 1, -1, -1):
+        new_index = hash_map[old_index]
+        if new_index is not None:
+            hash_map_inverse[new_index] = old_index
     return hash_map, hash_map_inverse
 
 
@@ -113,6 +113,8 @@ class DetailNode(object):
     implemented.
     """
 
+    __slots__ = ()
+
     def get_detail_child_nodes(self, edge_filter=EdgeFilter()):
         """Generator which yields all children of this item in the
         detail view (by default, all acyclic and active ones).
@@ -0,0 +1,411 @@
+"""A stripifier for large meshes, with the same algorithm as
+:mod:`pyffi.utils.trianglestripifier`, but with array based adjacency.
+
+Faces are stored in a flat list of vertex indices, and the faces
+adjacent to each face are found through a flat list of half edges,
+rather than through :class:`~pyffi.utils.trianglemesh.Face` and
+:class:`~pyffi.utils.trianglemesh.Edge` objects. Experiments mark the
+faces that they use with a stamp in a scratch buffer that is shared
+by all experiments, and the number of experiments can be limited to
+keep the time needed for very large meshes in check.
+
+>>> stripifier = HalfEdgeStripifier([(0, 1, 2), (2, 1, 3), (2, 3, 4)])
+>>> stripifier.find_all_strips()
+[[0, 1, 2, 3, 4]]
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+from pyffi.utils.trianglestripifier import TriangleStripifier
+
+class HalfEdgeMesh(object):
+    """A mesh of faces, with adjacency stored in flat lists.
+
+    Face ``i`` has vertices ``face_vertices[3 * i:3 * i + 3]``, rotated
+    so the lowest index comes first, as for
+    :class:`~pyffi.utils.trianglemesh.Face`. Half edge ``3 * i + j`` is
+    the edge of face ``i`` opposite its ``j``-th vertex. Degenerate and
+    duplicate faces are removed, and faces are sorted, as in
+    :meth:`pyffi.utils.trianglemesh.Mesh.lock`.
+
+    >>> mesh = HalfEdgeMesh([(3, 1, 2), (0, 1, 2), (2, 1, 0), (4, 4, 1)])
+    >>> mesh.face_vertices
+    [0, 1, 2, 0, 2, 1, 1, 2, 3]
+    >>> [mesh.get_adjacent_faces(0, vertex) for vertex in (0, 1, 2)]
+    [[1], [1], [1]]
+    >>> [mesh.get_adjacent_faces(2, vertex) for vertex in (1, 2, 3)]
+    [[], [], [1]]
+
+    :ivar num_faces: The number of faces.
+    :type num_faces: ``int``
+    :ivar face_vertices: The vertices of all faces.
+    :type face_vertices: ``list`` of ``int``
+    :ivar half_edge_faces: For each half edge, a face that has the
+        reverse edge, or -1 if there is none.
+    :type half_edge_faces: ``list`` of ``int``
+    :ivar extra_half_edge_faces: For half edges with more than one such
+        face, the list of all these faces.
+    :type extra_half_edge_faces: ``dict``
+    """
+
+    def __init__(self, triangles):
+        faces = set()
+        for v0, v1, v2 in triangles:
+            if v0 == v1 or v1 == v2 or v2 == v0:
+                # degenerate face
+                continue
+            if v0 < v1 and v0 < v2:
+                faces.add((v0, v1, v2))
+            elif v1 < v0 and v1 < v2:
+                faces.add((v1, v2, v0))
+            else:
+                faces.add((v2, v0, v1))
+        self.num_faces = len(faces)
+        self.face_vertices = [vertex for face in sorted(faces)
+                              for vertex in face]
+        num_vertices = max(self.face_vertices) + 1 if faces else 0
+        # map each directed edge to the face(s) that have it
+        edge_faces = {}
+        extra_edge_faces = {}
+        face_vertices = self.face_vertices
+        for half_edge in range(3 * self.num_faces):
+            base = half_edge - half_edge % 3
+            edge = (face_vertices[base + (half_edge + 1) % 3] * num_vertices
+                    + face_vertices[base + (half_edge + 2) % 3])
+            face = half_edge // 3
+            if edge not in edge_faces:
+                edge_faces[edge] = face
+            elif edge in extra_edge_faces:
+                extra_edge_faces[edge].append(face)
+            else:
+                extra_edge_faces[edge] = [edge_faces[edge], face]
+        # link each half edge to the faces of the reverse edge
+        self.half_edge_faces = [-1] * (3 * self.num_faces)
+        self.extra_half_edge_faces = {}
+        for half_edge in range(3 * self.num_faces):
+            base = half_edge - half_edge % 3
+            reverse_edge = (
+                face_vertices[base + (half_edge + 2) % 3] * num_vertices
+                + face_vertices[base + (half_edge + 1) % 3])
+            self.half_edge_faces[half_edge] = edge_faces.get(
+                reverse_edge, -1)
+            if reverse_edge in extra_edge_faces:
+                self.extra_half_edge_faces[half_edge] = (
+                    extra_edge_faces[reverse_edge])
+
+    def get_half_edge(self, face, vertex):
+        """Get the half edge of the face opposite the vertex."""
+        base = 3 * face
+        face_vertices = self.face_vertices
+        if face_vertices[base] == vertex:
+            return base
+        elif face_vertices[base + 1] == vertex:
+            return base + 1
+        elif face_vertices[base + 2] == vertex:
+            return base + 2
+        raise ValueError("vertex %i not in face %i" % (vertex, face))
+
+    def get_next_vertex(self, face, vertex):
+        """Get next vertex of face.
+
+        >>> HalfEdgeMesh([(8, 7, 5)]).get_next_vertex(0, 8)
+        7
+        """
+        half_edge = self.get_half_edge(face, vertex)
+        return self.face_vertices[half_edge + 1 if half_edge % 3 < 2
+                                  else half_edge - 2]
+
+    def get_adjacent_faces(self, face, vertex):
+        """Get adjacent faces along the edge opposite the vertex."""
+        half_edge = self.get_half_edge(face, vertex)
+        if half_edge in self.extra_half_edge_faces:
+            return list(self.extra_half_edge_faces[half_edge])
+        adjacent_face = self.half_edge_faces[half_edge]
+        return [adjacent_face] if adjacent_face >= 0 else []
+
+class HalfEdgeStripifier(object):
+    """Implementation of the algorithm of
+    :class:`~pyffi.utils.trianglestripifier.TriangleStripifier` on a
+    :class:`HalfEdgeMesh`.
+
+    Strips are stored as triples of faces, vertices, and a flag to
+    tell whether the winding of the strip is reversed, as in
+    :class:`~pyffi.utils.trianglestripifier.TriangleStrip`.
+
+    :ivar num_samples: Number of faces to start experiments from, in
+        each round. Three experiments are run for each face.
+    :type num_samples: ``int``
+    :ivar max_experiments: Maximal number of experiments to run, or
+        ``None`` for no limit. When the limit is reached, the remaining
+        strips are built from a single experiment each.
+    :type max_experiments: ``int`` or ``type(None)``
+    """
+
+    def __init__(self, triangles, num_samples=10, max_experiments=None):
+        self.mesh = HalfEdgeMesh(triangles)
+        self.num_samples = num_samples
+        self.max_experiments = max_experiments
+        # faces that are in the strips found so far
+        self.stripped_faces = bytearray(self.mesh.num_faces)
+        # stamp of the last experiment that used each face
+        self.face_stamps = [0] * self.mesh.num_faces
+        self.stamp = 0
+
+    def get_unstripped_adjacent_face(self, face, vertex):
+        """Get adjacent face which is not yet stripped, or -1."""
+        mesh = self.mesh
+        half_edge = mesh.get_half_edge(face, vertex)
+        if half_edge in mesh.extra_half_edge_faces:
+            adjacent_faces = mesh.extra_half_edge_faces[half_edge]
+        else:
+            adjacent_faces = (mesh.half_edge_faces[half_edge],)
+        for other_face in adjacent_faces:
+            if (other_face >= 0
+                and not self.stripped_faces[other_face]
+                and self.face_stamps[other_face] != self.stamp):
+                return other_face
+        return -1
+
+    def traverse_faces(self, start_vertex, start_face, forward):
+        """Builds a strip traveral of faces starting from the
+        start_face and the edge opposite start_vertex. Returns list of
+        faces and list of vertices that were added.
+        """
+        # this is the inner loop of the stripifier, so the lookups of
+        # get_next_vertex and get_unstripped_adjacent_face are inlined
+        face_vertices = self.mesh.face_vertices
+        half_edge_faces = self.mesh.half_edge_faces
+        extra_half_edge_faces = self.mesh.extra_half_edge_faces
+        stripped_faces = self.stripped_faces
+        face_stamps = self.face_stamps
+        stamp = self.stamp
+        faces = []
+        vertices = []
+        forward = bool(forward)
+        odd = False
+        face = start_face
+        pv0 = start_vertex
+        pv1 = self.mesh.get_next_vertex(face, pv0)
+        pv2 = self.mesh.get_next_vertex(face, pv1)
+        while True:
+            # find unstripped face adjacent to the edge opposite pv0
+            half_edge = 3 * face
+            if face_vertices[half_edge] != pv0:
+                half_edge += 1 if face_vertices[half_edge + 1] == pv0 else 2
+            if half_edge in extra_half_edge_faces:
+                face = self.get_unstripped_adjacent_face(face, pv0)
+            else:
+                face = half_edge_faces[half_edge]
+                if (face < 0 or stripped_faces[face]
+                    or face_stamps[face] == stamp):
+                    face = -1
+            if face < 0:
+                return faces, vertices
+            face_stamps[face] = stamp
+            faces.append(face)
+            odd = not odd
+            # the new vertex follows pv0 (or pv1) in the new face
+            if odd == forward:
+                pv0 = pv1
+                vertex = pv0
+            else:
+                pv0 = pv2
+                vertex = pv1
+            base = 3 * face
+            if face_vertices[base] == vertex:
+                vertex = face_vertices[base + 1]
+            elif face_vertices[base + 1] == vertex:
+                vertex = face_vertices[base + 2]
+            else:
+                vertex = face_vertices[base]
+            if odd == forward:
+                pv1 = vertex
+            else:
+                pv2 = vertex
+            vertices.append(vertex)
+
+    def build_strip(self, start_vertex, start_face):
+        """Builds the face strip forwards, then backwards. Returns
+        the strip, and the index of start_face in the strip.
+
+        >>> stripifier = HalfEdgeStripifier([(0, 1, 2), (2, 1, 3)])
+        >>> stripifier.stamp += 1
+        >>> stripifier.build_strip(1, 0)
+        (([1, 0], [3, 1, 2, 0], True), 1)
+        """
+        get_next_vertex = self.mesh.get_next_vertex
+        v0 = start_vertex
+        v1 = get_next_vertex(start_face, v0)
+        v2 = get_next_vertex(start_face, v1)
+        self.face_stamps[start_face] = self.stamp
+        forward_faces, forward_vertices = self.traverse_faces(
+            v0, start_face, True)
+        backward_faces, backward_vertices = self.traverse_faces(
+            v2, start_face, False)
+        backward_faces.reverse()
+        backward_vertices.reverse()
+        faces = backward_faces + [start_face] + forward_faces
+        vertices = backward_vertices + [v0, v1, v2] + forward_vertices
+        # winding changes with every face that is added backwards
+        reversed_ = bool(len(backward_faces) & 1)
+        return (faces, vertices, reversed_), len(backward_faces)
+
+    def build_adjacent(self, strips, strip, face_index):
+        """Build strips adjacent to given strip, and add them to
+        strips. Returns whether any strip was added.
+        """
+        found = False
+        while True:
+            faces, vertices, reversed_ = strip
+            other_face = self.get_unstripped_adjacent_face(
+                faces[face_index], vertices[face_index + 1])
+            if other_face < 0:
+                return found
+            found = True
+            if reversed_ != bool(face_index & 1):
+                other_vertex = vertices[face_index]
+            else:
+                other_vertex = vertices[face_index + 2]
+            strip, face_index = self.build_strip(other_vertex, other_face)
+            strips.append(strip)
+            num_faces = len(strip[0])
+            if face_index > (num_faces >> 1):
+                face_index -= 1
+            elif face_index < num_faces - 1:
+                face_index += 1
+            else:
+                return found
+
+    def build_experiment(self, start_vertex, start_face):
+        """Build strips, starting from start_vertex and start_face, and
+        return them.
+        """
+        self.stamp += 1
+        strip, face_index = self.build_strip(start_vertex, start_face)
+        strips = [strip]
+        num_faces = len(strip[0])
+        if num_faces >= 4:
+            face_index = num_faces >> 1
+            self.build_adjacent(strips, strip, face_index)
+            self.build_adjacent(strips, strip, face_index + 1)
+        elif num_faces == 3:
+            if not self.build_adjacent(strips, strip, 0):
+                self.build_adjacent(strips, strip, 2)
+            self.build_adjacent(strips, strip, 1)
+        elif num_faces == 2:
+            self.build_adjacent(strips, strip, 0)
+            self.build_adjacent(strips, strip, 1)
+        elif num_faces == 1:
+            self.build_adjacent(strips, strip, 0)
+        return strips
+
+    @staticmethod
+    def get_strip(strip):
+        """Get strip in forward winding."""
+        faces, vertices, reversed_ = strip
+        if not reversed_:
+            return list(vertices)
+        elif len(vertices) & 1:
+            return vertices[::-1]
+        elif len(vertices) == 4:
+            return [vertices[i] for i in (0, 2, 1, 3)]
+        else:
+            return [vertices[0]] + vertices
+
+    def find_all_strips(self):
+        """Find all strips.
+
+        >>> HalfEdgeStripifier([]).find_all_strips()
+        []
+        >>> strips = HalfEdgeStripifier([
+        ...     (2, 1, 7), (0, 1, 2), (2, 7, 4), (4, 7, 11), (5, 3, 2),
+        ...     (1, 0, 8), (0, 8, 9), (8, 0, 10), (10, 11, 8), (0, 2, 21),
+        ...     (21, 2, 22), (2, 4, 22), (21, 24, 0), (9, 0, 24),
+        ...     (8, 11, 31), (8, 31, 32), (31, 11, 33)]).find_all_strips()
+        >>> sorted(strips)
+        [[0, 8, 9], [2, 5, 3], [4, 22, 2, 21, 0, 24, 9], [11, 4, 7, 2, 1, 0, 8, 10, 11], [32, 8, 31, 11, 33]]
+        """
+        all_strips = []
+        face_vertices = self.mesh.face_vertices
+        stripped_faces = self.stripped_faces
+        num_experiments = 0
+        num_unstripped = self.mesh.num_faces
+        # candidate start faces; faces that have been stripped are
+        # removed from time to time
+        candidates = list(range(self.mesh.num_faces))
+        while num_unstripped:
+            if len(candidates) > 2 * num_unstripped:
+                candidates = [face for face in candidates
+                              if not stripped_faces[face]]
+            if (self.max_experiments is None
+                or num_experiments < self.max_experiments):
+                num_samples = min(self.num_samples, num_unstripped)
+                num_start_vertices = 3
+            else:
+                num_samples = 1
+                num_start_vertices = 1
+            # note: using deterministic sample for easier testing
+            samples = []
+            for index in TriangleStripifier.sample(
+                    range(len(candidates)), num_samples):
+                while stripped_faces[candidates[index]]:
+                    index = (index + 1) % len(candidates)
+                if candidates[index] not in samples:
+                    samples.append(candidates[index])
+            best_score = -1.0
+            best_strips = None
+            for face in samples:
+                for vertex in face_vertices[
+                        3 * face:3 * face + num_start_vertices]:
+                    strips = self.build_experiment(vertex, face)
+                    num_experiments += 1
+                    score = (sum((len(strip[0]) for strip in strips), 0.0)
+                             / len(strips))
+                    if score > best_score:
+                        best_score = score
+                        best_strips = strips
+            for strip in best_strips:
+                for face in strip[0]:
+                    stripped_faces[face] = True
+                num_unstripped -= len(strip[0])
+                all_strips.append(self.get_strip(strip))
+        return all_strips
+
+if __name__=='__main__':
+    import doctest
+    doctest.testmod()
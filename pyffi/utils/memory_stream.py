@@ -0,0 +1,233 @@
+"""A read-only file-like object on top of a buffer, such as a memory
+mapped file.
+
+Readers of binary data usually call ``stream.read(n)`` for every
+value, and unpack the bytes that were returned. With a
+:class:`MemoryStream`, the basic types in
+:mod:`pyffi.object_models.common` and
+:class:`~pyffi.object_models.xml.array.Array` instead unpack values
+directly from the underlying buffer with :func:`struct.unpack_from`,
+without creating intermediate bytes objects.
+
+>>> import struct
+>>> stream = MemoryStream(struct.pack("<I", 1) + b"abc\\ndef")
+>>> stream.unpack(struct.Struct("<I"))
+(1,)
+>>> stream.tell()
+4
+>>> stream.readline()
+b'abc\\n'
+>>> stream.read()
+b'def'
+>>> stream.read(1)
+b''
+>>> stream.seek(-3, 2)
+8
+>>> stream.read(2)
+b'de'
+>>> stream.seek(4)
+4
+>>> stream.iter_unpack(struct.Struct("<2s"), 2)
+[(b'ab',), (b'c\\n',)]
+>>> stream.unpack(struct.Struct("<I")) # doctest: +ELLIPSIS
+Traceback (most recent call last):
+    ...
+struct.error: ...
+>>> stream.tell()
+8
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import io
+import mmap
+import struct
+
+class MemoryStream(object):
+    """A read-only stream on top of a buffer, with support for unpacking
+    values without copying.
+
+    The :attr:`buffer` and :attr:`pos` attributes are public, so
+    readers can unpack values directly with
+    ``struct.unpack_from(format, stream.buffer, stream.pos)``; they
+    must then increase :attr:`pos` by the size of the values.
+    """
+
+    __slots__ = ("buffer", "pos", "name", "closed")
+
+    def __init__(self, buffer, name=None):
+        """Initialize the stream.
+
+        :param buffer: The data, for instance ``bytes`` or ``mmap.mmap``.
+        :param name: The name of the file.
+        :type name: ``str``
+        """
+        self.buffer = buffer
+        """The underlying buffer."""
+        self.pos = 0
+        """The current position in the buffer."""
+        self.name = name
+        """The name of the file."""
+        self.closed = False
+
+    @classmethod
+    def open(cls, filename):
+        """Map the file C{filename} in memory, and return a stream on it.
+
+        :param filename: The name of the file.
+        :type filename: ``str``
+        """
+        with open(filename, "rb") as file_:
+            try:
+                buffer = mmap.mmap(file_.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, OSError):
+                # for instance, empty files cannot be mapped
+                buffer = file_.read()
+        return cls(buffer, name=filename)
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.buffer = b''
+        self.pos = 0
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def read(self, size=-1):
+        pos = self.pos
+        if size is None or size < 0:
+            end = len(self.buffer)
+        else:
+            end = min(pos + size, len(self.buffer))
+        if end <= pos:
+            return b''
+        self.pos = end
+        return self.buffer[pos:end]
+
+    def readline(self, size=-1):
+        pos = self.pos
+        end = self.buffer.find(b'\n', pos)
+        end = len(self.buffer) if end == -1 else end + 1
+        if size is not None and size >= 0:
+            end = min(end, pos + size)
+        return self.read(end - pos)
+
+    def write(self, data):
+        raise io.UnsupportedOperation("write")
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            pos = offset
+        elif whence == 1:
+            pos = self.pos + offset
+        elif whence == 2:
+            pos = len(self.buffer) + offset
+        else:
+            raise ValueError("invalid whence (%r)" % whence)
+        if pos < 0:
+            raise ValueError("negative seek position %i" % pos)
+        self.pos = pos
+        return pos
+
+    def tell(self):
+        return self.pos
+
+    def unpack(self, format_):
+        """Unpack values at the current position, and move past them.
+
+        :param format_: The format of the values.
+        :type format_: :class:`struct.Struct`
+        :return: The values.
+        :rtype: ``tuple``
+        """
+        values = format_.unpack_from(self.buffer, self.pos)
+        self.pos += format_.size
+        return values
+
+    def iter_unpack(self, format_, count):
+        """Unpack C{count} consecutive values, and move past them.
+
+        :param format_: The format of a single value.
+        :type format_: :class:`struct.Struct`
+        :param count: The number of values.
+        :type count: ``int``
+        :return: The values.
+        :rtype: ``list`` of ``tuple``
+        """
+        size = format_.size * count
+        if self.pos + size > len(self.buffer):
+            raise struct.error(
+                "unpack requires a buffer of %i bytes" % size)
+        view = memoryview(self.buffer)
+        try:
+            chunk = view[self.pos:self.pos + size]
+            try:
+                values = list(format_.iter_unpack(chunk))
+            finally:
+                chunk.release()
+        finally:
+            view.release()
+        self.pos += size
+        return values
+
+def open_file(filename, mode='rb'):
+    """Open the file C{filename}. Files that are opened for reading only
+    are mapped in memory, as a :class:`MemoryStream`.
+
+    :param filename: The name of the file.
+    :type filename: ``str``
+    :param mode: The mode in which to open the file.
+    :type mode: ``str``
+    """
+    if mode == 'rb':
+        return MemoryStream.open(filename)
+    return open(filename, mode)
@@ -1,4 +1,11 @@
-"""Create mopps using mopper.exe"""
+"""Create mopps, either with pyffi's own mopp generator, or using mopper.exe.
+
+The mopp generator of pyffi (see L{getOriginScaleCodeWelding}) builds a
+balanced bounding volume tree over the triangles, and encodes it as mopp
+code. It runs on all platforms, but it does not use all features of the
+mopp code: in particular, all tests are done on 8 bit coordinates. The
+quality of the tree can be measured with L{getMoppQueryCost}.
+"""
 
 # ***** BEGIN LICENSE BLOCK *****
 #
@@ -37,7 +44,9 @@
 #
 # ***** END LICENSE BLOCK *****
 
+import math
 import os.path
+import random
 import tempfile
 import subprocess
 import sys
@@ -193,6 +202,351 @@ def getMopperOriginScaleCodeWelding(vertices, triangles, material_indices=None):
         outfile.close()
     return origin, scale, moppcode, welding_info
 
+# mopp opcodes used by the mopp generator
+_MOPP_JUMP8 = 0x05
+_MOPP_JUMP16 = 0x06
+_MOPP_SPLIT = 0x10 # + axis
+_MOPP_BOUND = 0x26 # + axis
+_MOPP_TRIANGLE = 0x30 # + triangle index (up to 31)
+_MOPP_TRIANGLE8 = 0x50
+_MOPP_TRIANGLE16 = 0x51
+
+def getOriginScale(vertices):
+    """Get origin and scale of the mopp, so the 8 bit mopp coordinates
+    of all vertices are in [0, 254] (with some margin), as for mopper.exe.
+
+    >>> origin, scale = getOriginScale([(0, 0, 0), (1, 2, 0.5)])
+    >>> ["%6.3f" % value for value in origin]
+    ['-0.010', '-0.010', '-0.010']
+    >>> "%.1f" % scale
+    '8240665.3'
+
+    :param vertices: List of vertices.
+    :type vertices: list of tuples of floats
+    :return: The origin as a tuple of floats, and the scale as a float.
+    """
+    if not vertices:
+        return (0.0, 0.0, 0.0), 1.0
+    mins = [min(vert[axis] for vert in vertices) for axis in range(3)]
+    maxs = [max(vert[axis] for vert in vertices) for axis in range(3)]
+    origin = tuple(value - 0.01 for value in mins)
+    scale = (256 * 256 * 254) / (
+        0.02 + max(maxv - minv for minv, maxv in zip(mins, maxs)))
+    return origin, scale
+
+def _getWeldingAngle(cos_angle, convex):
+    """Get havok's welding code (0 to 30) for an edge, from the angle
+    between the normals of the triangles that share the edge. The code
+    is 15 for a flat edge, and increases with every 360/31 degrees that a
+    convex edge is bent (decreases for concave edges); flat edges have a
+    wider sector. This matches the codes computed by mopper.exe.
+
+    >>> _getWeldingAngle(1, True), _getWeldingAngle(1, False)
+    (15, 15)
+    >>> _getWeldingAngle(0, True), _getWeldingAngle(0, False)
+    (22, 8)
+    """
+    angle = math.degrees(math.acos(max(-1.0, min(1.0, cos_angle))))
+    if convex:
+        if angle < 12.87:
+            return 15
+        return min(30, 16 + int((angle - 12.87) / (360.0 / 31)))
+    else:
+        if angle < 12.5:
+            return 15
+        return max(0, 14 - int((angle - 12.5) / (360.0 / 31)))
+
+def getWeldingInfo(vertices, triangles):
+    """Get havok's welding info for each triangle, which encodes the
+    angle with the adjacent triangle along each edge, in 5 bits per edge.
+
+    >>> getWeldingInfo(
+    ...     [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0), (0, 0, 1)],
+    ...     [(0, 1, 2), (2, 1, 3), (1, 0, 4)])
+    [15848, 15855, 15848]
+
+    :param vertices: List of vertices.
+    :type vertices: list of tuples of floats
+    :param triangles: List of triangles (indices referring back to vertex list).
+    :type triangles: list of tuples of ints
+    :return: The welding info of each triangle.
+    :rtype: list of ints
+    """
+    normals = []
+    for v0, v1, v2 in triangles:
+        p0, p1, p2 = vertices[v0], vertices[v1], vertices[v2]
+        e1 = [p1[i] - p0[i] for i in range(3)]
+        e2 = [p2[i] - p0[i] for i in range(3)]
+        normal = (e1[1] * e2[2] - e1[2] * e2[1],
+                  e1[2] * e2[0] - e1[0] * e2[2],
+                  e1[0] * e2[1] - e1[1] * e2[0])
+        norm = math.sqrt(sum(x * x for x in normal))
+        normals.append(tuple(x / norm for x in normal) if norm else None)
+    # edges are matched by vertex position rather than by vertex index
+    positions = {}
+    welded = [positions.setdefault(tuple(vert), index)
+              for index, vert in enumerate(vertices)]
+    # map each directed edge to (triangle, opposite vertex)
+    edges = {}
+    for index, (v0, v1, v2) in enumerate(triangles):
+        v0, v1, v2 = welded[v0], welded[v1], welded[v2]
+        edges.setdefault((v0, v1), (index, v2))
+        edges.setdefault((v1, v2), (index, v0))
+        edges.setdefault((v2, v0), (index, v1))
+    welding_infos = []
+    for index, triangle in enumerate(triangles):
+        normal = normals[index]
+        welding_info = 0
+        for i in range(3):
+            va, vb = welded[triangle[i]], welded[triangle[(i + 1) % 3]]
+            angle = 15
+            other_index, other_vertex = edges.get((vb, va), (None, None))
+            if (normal is not None and other_index is not None
+                and normals[other_index] is not None):
+                # convex if other triangle is below the plane of this one
+                convex = sum(
+                    normal[j] * (vertices[other_vertex][j] - vertices[va][j])
+                    for j in range(3)) < 0
+                angle = _getWeldingAngle(
+                    sum(x * y for x, y in zip(normal, normals[other_index])),
+                    convex)
+            welding_info |= angle << (5 * i)
+        welding_infos.append(welding_info)
+    return welding_infos
+
+def getMoppCode(vertices, triangles, origin, scale):
+    """Build a balanced bounding volume tree over the triangles, and
+    return it as mopp code. Each node of the tree splits its triangles
+    in two halves, along the axis in which their centers are most
+    spread out.
+
+    >>> getMoppCode([(0, 0, 0), (1, 0, 0), (0, 1, 0), (2, 0, 0), (3, 0, 0), (2, 1, 0)],
+    ...             [(0, 1, 2), (3, 4, 5)], (-0.01, -0.01, -0.01), 256 * 256 * 60)
+    [40, 0, 1, 39, 0, 61, 38, 0, 181, 16, 61, 120, 1, 48, 49]
+
+    :raise ``ValueError``: If there are too many triangles.
+    :param vertices: List of vertices.
+    :type vertices: list of tuples of floats
+    :param triangles: List of triangles (indices referring back to vertex list).
+    :type triangles: list of tuples of ints
+    :param origin: Origin of the mopp.
+    :type origin: tuple of floats
+    :param scale: Scale of the mopp.
+    :type scale: float
+    :return: The mopp code.
+    :rtype: list of ints
+    """
+    if len(triangles) > 0x10000:
+        raise ValueError("too many triangles for mopp")
+    if not triangles:
+        return []
+    # 8 bit mopp coordinates of vertices, for each axis
+    factor = scale / 65536.0
+    coords = [[(vert[axis] - origin[axis]) * factor for vert in vertices]
+              for axis in range(3)]
+    # bounds and center of each triangle, for each axis
+    lows = []
+    highs = []
+    centers = []
+    for axis_coords in coords:
+        lows.append([max(0, int(math.floor(min(
+            axis_coords[v0], axis_coords[v1], axis_coords[v2]))))
+                     for v0, v1, v2 in triangles])
+        highs.append([min(255, int(math.ceil(max(
+            axis_coords[v0], axis_coords[v1], axis_coords[v2]))))
+                      for v0, v1, v2 in triangles])
+        centers.append([axis_coords[v0] + axis_coords[v1] + axis_coords[v2]
+                        for v0, v1, v2 in triangles])
+
+    def build(indices, bounds):
+        code = []
+        # bound tests, if the triangles do not fill the current bounds
+        bounds = list(bounds)
+        for axis in (2, 1, 0):
+            low = min(lows[axis][index] for index in indices)
+            high = max(highs[axis][index] for index in indices)
+            if low > bounds[2 * axis] or high < bounds[2 * axis + 1]:
+                code += [_MOPP_BOUND + axis, low, high]
+                bounds[2 * axis:2 * axis + 2] = [low, high]
+        if len(indices) == 1:
+            index = indices[0]
+            if index < 32:
+                code.append(_MOPP_TRIANGLE + index)
+            elif index < 256:
+                code += [_MOPP_TRIANGLE8, index]
+            else:
+                code += [_MOPP_TRIANGLE16, index >> 8, index & 255]
+            return code
+        # split along axis where the triangle centers are most spread out
+        axis = max(range(3), key=lambda axis: (
+            max(centers[axis][index] for index in indices)
+            - min(centers[axis][index] for index in indices)))
+        indices = sorted(indices, key=centers[axis].__getitem__)
+        indices1 = indices[:len(indices) // 2]
+        indices2 = indices[len(indices) // 2:]
+        high1 = max(highs[axis][index] for index in indices1)
+        low2 = min(lows[axis][index] for index in indices2)
+        bounds1 = list(bounds)
+        bounds1[2 * axis + 1] = high1
+        bounds2 = list(bounds)
+        bounds2[2 * axis] = low2
+        code1 = build(indices1, bounds1)
+        code2 = build(indices2, bounds2)
+        code += [_MOPP_SPLIT + axis, high1, low2]
+        if len(code1) < 256:
+            code.append(len(code1))
+            code += code1
+            code += code2
+        else:
+            # the first branch is too long to jump over, so jump to it
+            jump = len(code2)
+            if jump < 256:
+                code += [2, _MOPP_JUMP8, jump]
+            elif jump < 0x10000:
+                code += [3, _MOPP_JUMP16, jump >> 8, jump & 255]
+            else:
+                raise ValueError("too many triangles for mopp")
+            code += code2
+            code += code1
+        return code
+
+    return build(list(range(len(triangles))), [0, 255, 0, 255, 0, 255])
+
+def getOriginScaleCodeWelding(vertices, triangles, material_indices=None):
+    """Generate mopp code and welding info for given geometry, with
+    pyffi's own mopp generator. Has the same arguments and result as
+    L{getMopperOriginScaleCodeWelding}, but does not need mopper.exe.
+
+    For example, creating a mopp for the standard cube:
+
+    >>> orig, scale, moppcode, welding_info = getOriginScaleCodeWelding(
+    ...     [(1, 1, 1), (0, 0, 0), (0, 0, 1), (0, 1, 0),
+    ...      (1, 0, 1), (0, 1, 1), (1, 1, 0), (1, 0, 0)],
+    ...     [(0, 4, 6), (1, 6, 7), (2, 1, 4), (3, 1, 2),
+    ...      (0, 2, 4), (4, 1, 7), (6, 4, 7), (3, 0, 6),
+    ...      (0, 3, 5), (3, 2, 5), (2, 0, 5), (1, 3, 6)])
+    >>> "%.1f" % scale
+    '16319749.0'
+    >>> ["%6.3f" % value for value in orig]
+    ['-0.010', '-0.010', '-0.010']
+    >>> sorted(getMoppTriangles(moppcode, (0, 0, 0, 255, 255, 255)))
+    [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+    >>> welding_info
+    [23030, 23247, 23030, 16086, 23247, 23247, 23247, 23247, 23247, 23247, 23247, 16086]
+
+    :raise ``ValueError``: If there are too many triangles.
+    :param vertices: List of vertices.
+    :type vertices: list of tuples of floats
+    :param triangles: List of triangles (indices referring back to vertex list).
+    :type triangles: list of tuples of ints
+    :param material_indices: Ignored.
+    :type material_indices: list of ints
+    :return: The origin as a tuple of floats, the mopp scale as a float,
+        the mopp code as a list of ints, and the welding info as a list of
+        ints.
+    """
+    origin, scale = getOriginScale(vertices)
+    moppcode = getMoppCode(vertices, triangles, origin, scale)
+    welding_info = getWeldingInfo(vertices, triangles)
+    return origin, scale, moppcode, welding_info
+
+def getMoppTriangles(moppcode, box):
+    """Run the mopp code for a query box (in 8 bit mopp coordinates), and
+    return the indices of all triangles that have to be tested against
+    the box. Only opcodes generated by pyffi (see L{getMoppCode} and
+    C{bhkMoppBvTreeShape._makeSimpleMopp}) are supported.
+
+    >>> code = getMoppCode([(0, 0, 0), (1, 0, 0), (0, 1, 0), (2, 0, 0), (3, 0, 0), (2, 1, 0)],
+    ...                    [(0, 1, 2), (3, 4, 5)], (-0.01, -0.01, -0.01), 256 * 256 * 60)
+    >>> getMoppTriangles(code, (0, 0, 0, 255, 255, 255))
+    [0, 1]
+    >>> getMoppTriangles(code, (0, 0, 0, 50, 50, 50))
+    [0]
+    >>> getMoppTriangles(code, (100, 0, 0, 130, 10, 10))
+    [1]
+    >>> getMoppTriangles(code, (150, 150, 0, 160, 160, 50))
+    []
+
+    :raise ``ValueError``: On unsupported opcodes.
+    :param moppcode: The mopp code.
+    :type moppcode: list of ints
+    :param box: Minimum and maximum coordinates of the box.
+    :type box: tuple of ints
+    :return: The triangle indices.
+    :rtype: list of ints
+    """
+    triangles = []
+    # stack of (code index, triangle offset)
+    stack = [(0, 0)] if moppcode else []
+    while stack:
+        i, offset = stack.pop()
+        while True:
+            code = moppcode[i]
+            if code == 0x09:
+                offset += moppcode[i + 1]
+                i += 2
+            elif code == 0x0A:
+                offset += (moppcode[i + 1] << 8) + moppcode[i + 2]
+                i += 3
+            elif code == _MOPP_JUMP8:
+                i += 2 + moppcode[i + 1]
+            elif code == _MOPP_JUMP16:
+                i += 3 + (moppcode[i + 1] << 8) + moppcode[i + 2]
+            elif _MOPP_BOUND <= code < _MOPP_BOUND + 3:
+                axis = code - _MOPP_BOUND
+                if (box[axis] > moppcode[i + 2]
+                    or box[axis + 3] < moppcode[i + 1]):
+                    break
+                i += 3
+            elif _MOPP_SPLIT <= code < _MOPP_SPLIT + 3:
+                axis = code - _MOPP_SPLIT
+                if box[axis + 3] >= moppcode[i + 2]:
+                    stack.append((i + 4 + moppcode[i + 3], offset))
+                if box[axis] > moppcode[i + 1]:
+                    break
+                i += 4
+            elif _MOPP_TRIANGLE <= code < _MOPP_TRIANGLE8:
+                triangles.append(code - _MOPP_TRIANGLE + offset)
+                break
+            elif code == _MOPP_TRIANGLE8:
+                triangles.append(moppcode[i + 1] + offset)
+                break
+            elif code == _MOPP_TRIANGLE16:
+                triangles.append(
+                    (moppcode[i + 1] << 8) + moppcode[i + 2] + offset)
+                break
+            else:
+                raise ValueError("unsupported mopp opcode 0x%02X" % code)
+    triangles.sort()
+    return triangles
+
+def getMoppQueryCost(moppcode, num_queries=1000, box_size=16, seed=0):
+    """Measure the quality of the mopp code, as the average number of
+    triangles that have to be tested for random query boxes.
+
+    >>> code = getMoppCode([(0, 0, 0), (1, 0, 0), (0, 1, 0), (2, 0, 0), (3, 0, 0), (2, 1, 0)],
+    ...                    [(0, 1, 2), (3, 4, 5)], (-0.01, -0.01, -0.01), 256 * 256 * 60)
+    >>> 0 < getMoppQueryCost(code) < 2
+    True
+
+    :param moppcode: The mopp code.
+    :type moppcode: list of ints
+    :param num_queries: The number of query boxes.
+    :type num_queries: int
+    :param box_size: The size of each box, in 8 bit mopp coordinates.
+    :type box_size: int
+    :param seed: Seed for the random boxes.
+    :return: The average number of triangles per query.
+    :rtype: float
+    """
+    rand = random.Random(seed)
+    total = 0
+    for i in range(num_queries):
+        low = [rand.randint(0, 255 - box_size) for axis in range(3)]
+        total += len(getMoppTriangles(
+            moppcode, tuple(low) + tuple(x + box_size for x in low)))
+    return total / float(num_queries)
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
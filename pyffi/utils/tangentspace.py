@@ -37,6 +37,10 @@
 #
 # ***** END LICENSE BLOCK *****
 
+from itertools import compress
+from math import sqrt
+from operator import add, mul, sub
+
 from pyffi.utils.mathutils import *
 
 def getTangentSpace(vertices = None, normals = None, uvs = None,
@@ -165,6 +169,172 @@ def getTangentSpace(vertices = None, normals = None, uvs = None,
     else:
         return tan, bin
 
+def _dot(ax, ay, az, bx, by, bz):
+    """Dot products of two lists of vectors, given by their columns."""
+    return list(map(add, map(add, map(mul, ax, bx), map(mul, ay, by)),
+                    map(mul, az, bz)))
+
+def _gather(values, indices):
+    """List of C{values} at every index in C{indices}."""
+    return list(map(values.__getitem__, indices))
+
+def _normalized(x, y, z):
+    """Normalize a list of vectors, given by its columns. Zero vectors
+    stay zero; their indices are returned as well."""
+    norms = _dot(x, y, z, x, y, z)
+    factors = [1.0 / sqrt(norm) if norm else 0.0 for norm in norms]
+    zeros = [i for i, norm in enumerate(norms) if not norm]
+    return (list(map(mul, x, factors)), list(map(mul, y, factors)),
+            list(map(mul, z, factors)), zeros)
+
+def getWeldedTangentSpace(vertices, normals, uvs, triangles, groups=None):
+    """Calculate tangent space data for a whole mesh at once. Instead
+    of looping over the triangles vector by vector, every step of the
+    calculation is applied to all triangles in one go, on lists of
+    coordinates. Vertices in the same welding group share their tangent
+    space, which avoids seams where vertices have been duplicated (for
+    instance, along uv seams).
+
+    >>> vertices = [(0,0,0), (0,1,0), (1,0,0), (1,0,0)]
+    >>> normals = [(0,0,1), (0,0,1), (0,0,1), (0,0,1)]
+    >>> uvs = [(0,0), (0,1), (1,0), (0.5,0)]
+    >>> triangles = [(0,1,2), (0,3,1)]
+    >>> getWeldedTangentSpace(vertices, normals, uvs, triangles, [0,1,2,2])
+    ([(0.0, 1.0, 0.0), (0.0, 1.0, 0.0), (0.0, 1.0, 0.0), (0.0, 1.0, 0.0)], [(1.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 0.0, 0.0), (1.0, 0.0, 0.0)])
+
+    :param vertices: A list of vertices (triples of floats).
+    :param normals: A list of unit normals (triples of floats).
+    :param uvs: A list of uvs (pairs of floats).
+    :param triangles: A list of triangle indices (triples of ints).
+    :param groups: The welding group of every vertex, as a list of ints
+        numbered from zero, such as the first list returned by
+        L{pyffi.utils.unique_map}. If ``None``, then every vertex has its
+        own group.
+    :return: Two lists of vectors, tangents and binormals.
+    """
+    num_vertices = len(vertices)
+    if len(normals) != num_vertices or len(uvs) != num_vertices:
+        raise ValueError(
+            "lists of vertices, normals, and uvs must have the same length")
+    if groups is None:
+        groups = list(range(num_vertices))
+    elif len(groups) != num_vertices:
+        raise ValueError("list of groups must have one group per vertex")
+    num_groups = max(groups) + 1 if groups else 0
+
+    # skip triangles which are degenerate after welding
+    triangles = [(t1, t2, t3) for t1, t2, t3 in triangles
+                 if groups[t1] != groups[t2] and groups[t2] != groups[t3]
+                 and groups[t3] != groups[t1]]
+    tan_x = [0.0] * num_groups
+    tan_y = [0.0] * num_groups
+    tan_z = [0.0] * num_groups
+    bin_x = [0.0] * num_groups
+    bin_y = [0.0] * num_groups
+    bin_z = [0.0] * num_groups
+    if triangles:
+        xs, ys, zs = zip(*vertices)
+        us, vs = zip(*uvs)
+        corners = list(zip(*triangles))
+        # edges of every triangle, in space and in texture space
+        x1, y1, z1, u1, v1 = [_gather(values, corners[0])
+                              for values in (xs, ys, zs, us, vs)]
+        e1_x, e1_y, e1_z, e1_u, e1_v = [
+            list(map(sub, _gather(values, corners[1]), first))
+            for values, first in zip((xs, ys, zs, us, vs),
+                                     (x1, y1, z1, u1, v1))]
+        e2_x, e2_y, e2_z, e2_u, e2_v = [
+            list(map(sub, _gather(values, corners[2]), first))
+            for values, first in zip((xs, ys, zs, us, vs),
+                                     (x1, y1, z1, u1, v1))]
+        # sign of the surface of each triangle in texture space
+        signs = [1 if r >= 0 else -1
+                 for r in map(sub, map(mul, e1_u, e2_v),
+                              map(mul, e2_u, e1_v))]
+        # contribution of each triangle to tangents and binormals
+        sdir_x, sdir_y, sdir_z, sdir_zeros = _normalized(*[
+            list(map(mul, map(sub, map(mul, e2_v, e1), map(mul, e1_v, e2)),
+                     signs))
+            for e1, e2 in ((e1_x, e2_x), (e1_y, e2_y), (e1_z, e2_z))])
+        tdir_x, tdir_y, tdir_z, tdir_zeros = _normalized(*[
+            list(map(mul, map(sub, map(mul, e1_u, e2), map(mul, e2_u, e1)),
+                     signs))
+            for e1, e2 in ((e1_x, e2_x), (e1_y, e2_y), (e1_z, e2_z))])
+        # sum contributions per group, in triangle order
+        valid = [True] * len(triangles)
+        for i in sdir_zeros + tdir_zeros:
+            valid[i] = False
+        for g1, g2, g3, tx, ty, tz, bx, by, bz in compress(
+            zip(_gather(groups, corners[0]), _gather(groups, corners[1]),
+                _gather(groups, corners[2]),
+                tdir_x, tdir_y, tdir_z, sdir_x, sdir_y, sdir_z), valid):
+            for g in (g1, g2, g3):
+                tan_x[g] += tx
+                tan_y[g] += ty
+                tan_z[g] += tz
+                bin_x[g] += bx
+                bin_y[g] += by
+                bin_z[g] += bz
+
+    # turn normal, binormal, and tangent into a base via Gram-Schmidt:
+    # for each group, this is applied once for each of its vertices, in
+    # vertex order, so process all first vertices of each group, then
+    # all second vertices, and so on
+    occurrences = [0] * num_groups
+    rounds = []
+    for vertex, g in enumerate(groups):
+        occurrence = occurrences[g]
+        occurrences[g] += 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(vertex)
+    for vertices_round in rounds:
+        gs = [groups[vertex] for vertex in vertices_round]
+        n_x, n_y, n_z = zip(*[normals[vertex] for vertex in vertices_round])
+        b_x, b_y, b_z = [_gather(values, gs)
+                         for values in (bin_x, bin_y, bin_z)]
+        t_x, t_y, t_z = [_gather(values, gs)
+                         for values in (tan_x, tan_y, tan_z)]
+        # bin -= n * (n * bin)
+        scalars = _dot(n_x, n_y, n_z, b_x, b_y, b_z)
+        b_x, b_y, b_z, bin_zeros = _normalized(*[
+            list(map(sub, b, map(mul, n, scalars)))
+            for b, n in ((b_x, n_x), (b_y, n_y), (b_z, n_z))])
+        # tan -= n * (n * tan)
+        scalars = _dot(n_x, n_y, n_z, t_x, t_y, t_z)
+        t_x, t_y, t_z = [list(map(sub, t, map(mul, n, scalars)))
+                         for t, n in ((t_x, n_x), (t_y, n_y), (t_z, n_z))]
+        # tan -= bin * (bin * tan)
+        scalars = _dot(b_x, b_y, b_z, t_x, t_y, t_z)
+        t_x, t_y, t_z, tan_zeros = _normalized(*[
+            list(map(sub, t, map(mul, b, scalars)))
+            for t, b in ((t_x, b_x), (t_y, b_y), (t_z, b_z))])
+        for i in set(bin_zeros + tan_zeros):
+            # insufficient data to set tangent space for this vertex
+            # in that case pick a space
+            nx, ny, nz = n_x[i], n_y[i], n_z[i]
+            for bx, by, bz in ((0.0 * nz - 0.0 * ny, 0.0 * nx - nz,
+                                ny - 0.0 * nx),
+                               (nz - 0.0 * ny, 0.0 * nx - 0.0 * nz,
+                                0.0 * ny - nx)):
+                norm = bx * bx + by * by + bz * bz
+                if norm:
+                    break
+            factor = 1.0 / sqrt(norm)
+            b_x[i], b_y[i], b_z[i] = bx * factor, by * factor, bz * factor
+            t_x[i] = ny * b_z[i] - nz * b_y[i]
+            t_y[i] = nz * b_x[i] - nx * b_z[i]
+            t_z[i] = nx * b_y[i] - ny * b_x[i]
+        for values, column in ((bin_x, b_x), (bin_y, b_y), (bin_z, b_z),
+                               (tan_x, t_x), (tan_y, t_y), (tan_z, t_z)):
+            for g, value in zip(gs, column):
+                values[g] = value
+
+    # every vertex gets the tangent space of its group
+    return tuple(
+        list(zip(*[_gather(values, groups) for values in columns]))
+        for columns in ((tan_x, tan_y, tan_z), (bin_x, bin_y, bin_z)))
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()
@@ -1,4 +1,4 @@
-"""A wrapper for TriangleStripifier and some utility functions, for
+"""A wrapper for HalfEdgeStripifier and some utility functions, for
 stripification of sets of triangles, stitching and unstitching strips,
 and triangulation of strips."""
 
@@ -43,8 +43,7 @@ try:
     import pytristrip
 except ImportError:
     pytristrip = None
-    from pyffi.utils.trianglestripifier import TriangleStripifier
-    from pyffi.utils.trianglemesh import Mesh
+    from pyffi.utils.halfedgestripifier import HalfEdgeStripifier
 
 def triangulate(strips):
     """A generator for iterating over the faces in a set of
@@ -136,12 +135,18 @@ def _check_strips(triangles, strips):
                triangles - strips_triangles,
                strips_triangles - triangles))
 
-def stripify(triangles, stitchstrips = False):
+def stripify(triangles, stitchstrips = False, max_experiments = None):
     """Converts triangles into a list of strips.
 
     If stitchstrips is True, then everything is wrapped in a single strip using
     degenerate triangles.
 
+    If max_experiments is not None, then at most this number of experiments
+    is run to find the best strips (see
+    L{pyffi.utils.halfedgestripifier.HalfEdgeStripifier}); use this to limit
+    the time needed for very large meshes. It is ignored if pytristrip is
+    installed.
+
     >>> triangles = [(0,1,4),(1,2,4),(2,3,4),(3,0,4)]
     >>> strips = stripify(triangles)
     >>> _check_strips(triangles, strips)
@@ -176,19 +181,9 @@ def stripify(triangles, stitchstrips = False):
     if pytristrip:
         strips = pytristrip.stripify(triangles)
     else:
-        strips = []
-        # build a mesh from triangles
-        mesh = Mesh()
-        for face in triangles:
-            try:
-                mesh.add_face(*face)
-            except ValueError:
-                # degenerate face
-                pass
-        mesh.lock()
-
         # calculate the strip
-        stripifier = TriangleStripifier(mesh)
+        stripifier = HalfEdgeStripifier(
+            triangles, max_experiments=max_experiments)
         strips = stripifier.find_all_strips()
 
     # stitch the strips if needed
@@ -45,6 +45,9 @@ http://home.comcast.net/~tom_forsyth/papers/fast_vert_cache_opt.html
 
 import collections
 from functools import reduce
+import heapq
+from itertools import chain
+import operator
 
 from pyffi.utils.tristrip import OrientedStrip
 
@@ -337,11 +340,165 @@ def get_cache_optimized_triangles(triangles):
     """Calculate cache optimized triangles, and return the result as
     a reordered set of triangles or strip of stitched triangles.
 
+    This gives exactly the same result as
+    :meth:`Mesh.get_cache_optimized_triangles`, which is kept as a
+    reference implementation, but it is much faster: vertex and
+    triangle data are stored in flat lists rather than in
+    :class:`VertexInfo` and :class:`TriangleInfo` instances, scores
+    are updated in bulk, and the best triangle of the whole mesh is
+    found with a priority queue rather than by scanning all triangles.
+
+    >>> get_cache_optimized_triangles([(0,1,2), (7,8,9),(2,3,4)])
+    [(7, 8, 9), (0, 1, 2), (2, 3, 4)]
+    >>> get_cache_optimized_triangles([])
+    []
+    >>> get_cache_optimized_triangles(iter([(0,1,2), (2,1,3)]))
+    [(0, 1, 2), (1, 3, 2)]
+
     :param triangles: The triangles (triples of vertex indices).
     :return: A list of reordered triangles.
     """
-    mesh = Mesh(triangles)
-    return mesh.get_cache_optimized_triangles()
+    vertex_score = VertexScore()
+    cache_size = vertex_score.CACHE_SIZE
+    cache_scores = vertex_score.CACHE_SCORE
+    valence_scores = vertex_score.VALENCE_SCORE
+    max_valence = vertex_score.MAX_TRIANGLES_PER_VERTEX
+    triangle_vertices = list(get_unique_triangles(triangles))
+    num_triangles = len(triangle_vertices)
+    if not num_triangles:
+        return []
+    num_vertices = max(max(verts) for verts in triangle_vertices) + 1
+    drawn_vertices = triangle_vertices
+    if num_vertices > 3 * num_triangles:
+        # few vertices with large indices (for instance, a partition
+        # of a larger mesh): renumber them, to keep the vertex lists
+        # small
+        vertex_map = {}
+        setdefault = vertex_map.setdefault
+        triangle_vertices = [
+            (setdefault(v0, len(vertex_map)), setdefault(v1, len(vertex_map)),
+             setdefault(v2, len(vertex_map)))
+            for v0, v1, v2 in triangle_vertices]
+        num_vertices = len(vertex_map)
+    first_vertices, second_vertices, third_vertices = (
+        list(vertices) for vertices in zip(*triangle_vertices))
+    # triangles of each vertex that have *not* yet been drawn
+    vertex_triangles = [[] for i in range(num_vertices)]
+    for triangle, verts in enumerate(triangle_vertices):
+        for vertex in verts:
+            vertex_triangles[vertex].append(triangle)
+    # the cache holds the last cache_size vertices that were added to it,
+    # so the cache position of a vertex follows from the number of
+    # vertices that were added after it
+    cache = collections.deque()
+    num_added = 0
+    vertex_added = [-cache_size - 1] * num_vertices
+    # vertex score is cache score + valence score (see
+    # VertexScore.update_score); vertices without triangles are never
+    # used for triangle scores, so their score does not matter
+    vertex_valence_scores = [
+        valence_scores[min(len(vertex_triangle), max_valence)]
+        if vertex_triangle else 0
+        for vertex_triangle in vertex_triangles]
+    vertex_scores = list(vertex_valence_scores)
+    get_vertex_score = vertex_scores.__getitem__
+    triangle_scores = [
+        vertex_scores[v0] + vertex_scores[v1] + vertex_scores[v2]
+        for v0, v1, v2 in triangle_vertices]
+    triangle_drawn = [False] * num_triangles
+    # priority queue to find the best triangle of the whole mesh; it
+    # holds an entry for the score of every triangle, except for
+    # triangles whose score changed since it was last used
+    queue = [(-score, triangle)
+             for triangle, score in enumerate(triangle_scores)]
+    heapq.heapify(queue)
+    changed_triangles = set()
+    result = []
+    # set of triangle indices whose scores were updated in the previous run
+    updated_triangles = set()
+    for i in range(num_triangles):
+        # pick triangle with highest score
+        if updated_triangles:
+            # if scores of triangles were updated in the previous run
+            # then restrict the search to those (as in the reference
+            # implementation, see Mesh.get_cache_optimized_triangles)
+            best_triangle = max(updated_triangles,
+                                key=triangle_scores.__getitem__)
+        else:
+            for triangle in changed_triangles:
+                if not triangle_drawn[triangle]:
+                    heapq.heappush(
+                        queue, (-triangle_scores[triangle], triangle))
+            changed_triangles = set()
+            while True:
+                score, best_triangle = queue[0]
+                if triangle_drawn[best_triangle]:
+                    heapq.heappop(queue)
+                elif -score != triangle_scores[best_triangle]:
+                    # outdated entry
+                    heapq.heapreplace(
+                        queue, (-triangle_scores[best_triangle], best_triangle))
+                else:
+                    break
+        # mark as drawn
+        triangle_drawn[best_triangle] = True
+        verts = triangle_vertices[best_triangle]
+        result.append(drawn_vertices[best_triangle])
+        # for each vertex in the just added triangle
+        for vertex in verts:
+            # remove triangle from the triangle list of the vertex
+            vertex_triangle = vertex_triangles[vertex]
+            vertex_triangle.remove(best_triangle)
+            vertex_valence_scores[vertex] = (
+                valence_scores[min(len(vertex_triangle), max_valence)]
+                if vertex_triangle else 0)
+        # add each vertex to cache
+        removed_vertices = []
+        cache_changed = False
+        for vertex in verts:
+            if vertex_added[vertex] < num_added - cache_size:
+                cache_changed = True
+                vertex_added[vertex] = num_added
+                num_added += 1
+                cache.appendleft(vertex)
+                if len(cache) > cache_size:
+                    # cache overflow: remove vertex from cache
+                    removed_vertices.append(cache.pop())
+        # the triangles of the drawn triangle's vertices, removed
+        # vertices, and cached vertices, in the same order as in the
+        # reference implementation (the order of the set determines
+        # which triangle is picked if scores are equal)
+        updated_triangles = set(chain.from_iterable(map(
+            vertex_triangles.__getitem__,
+            chain(verts, removed_vertices, cache))))
+        # update scores
+        if cache_changed:
+            # all cache positions have changed
+            for vertex in removed_vertices:
+                vertex_scores[vertex] = vertex_valence_scores[vertex]
+            list(map(vertex_scores.__setitem__, cache,
+                     map(operator.add, cache_scores,
+                         map(vertex_valence_scores.__getitem__, cache))))
+            triangles_to_score = updated_triangles
+        else:
+            # only the valence of the drawn triangle's vertices has changed
+            for vertex in verts:
+                vertex_scores[vertex] = (
+                    cache_scores[num_added - 1 - vertex_added[vertex]]
+                    + vertex_valence_scores[vertex])
+            triangles_to_score = list(chain.from_iterable(map(
+                vertex_triangles.__getitem__, verts)))
+        list(map(triangle_scores.__setitem__, triangles_to_score,
+                 map(operator.add,
+                     map(operator.add,
+                         map(get_vertex_score, map(
+                             first_vertices.__getitem__, triangles_to_score)),
+                         map(get_vertex_score, map(
+                             second_vertices.__getitem__, triangles_to_score))),
+                     map(get_vertex_score, map(
+                         third_vertices.__getitem__, triangles_to_score)))))
+        changed_triangles.update(triangles_to_score)
+    return result
 
 def get_unique_triangles(triangles):
     """Yield unique triangles.
@@ -0,0 +1,53 @@
+"""Tests for scanning the chunks of a cgf file with CgfFormat.Data.scan."""
+
+import io
+import os.path
+import struct
+import unittest
+
+from pyffi.formats.cgf import CgfFormat
+
+from nose.tools import assert_equals, assert_raises, assert_true
+
+file_name = os.path.join(os.path.dirname(__file__), 'test.cgf')
+
+
+def scan(raw, chunk_types=()):
+    data = CgfFormat.Data()
+    return list(data.scan(io.BytesIO(raw), chunk_types))
+
+
+def set_chunk_type(raw, old_type, new_type):
+    """Change the type of a chunk in the chunk table."""
+    data = CgfFormat.Data()
+    data.inspect(io.BytesIO(raw))
+    offset = raw.index(struct.pack('<I', old_type), data.header.offset)
+    return raw[:offset] + struct.pack('<I', new_type) + raw[offset + 4:]
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        with open(file_name, "rb") as stream:
+            self.raw = stream.read()
+
+    def test_chunks(self):
+        chunks = scan(self.raw, (CgfFormat.SourceInfoChunk,))
+        assert_equals([chunk_type for _, chunk_type, _, _, _ in chunks],
+                      ['SourceInfoChunk', 'TimingChunk'])
+        assert_true(isinstance(chunks[0][4], CgfFormat.SourceInfoChunk))
+        assert_true(chunks[1][4] is None)
+
+    def test_chunk_without_class(self):
+        # chunk types without chunk class are listed, but not decoded
+        raw = set_chunk_type(
+            self.raw, CgfFormat.ChunkType.Timing, CgfFormat.ChunkType.ANY)
+        chunks = scan(raw, (CgfFormat.SourceInfoChunk,))
+        assert_equals([(chunk_type, chunk) for _, chunk_type, _, _, chunk
+                       in chunks[1:]],
+                      [('ANYChunk', None)])
+        assert_true(chunks[0][4] is not None)
+
+    def test_unknown_chunk_type(self):
+        raw = set_chunk_type(self.raw, CgfFormat.ChunkType.Timing, 0x1234)
+        assert_raises(ValueError, scan, raw)
@@ -0,0 +1,77 @@
+"""Tests for checking block sizes when reading NifFormat.Data."""
+
+import io
+import os.path
+import struct
+import unittest
+
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_equals
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_check_tangentspace2.nif')
+
+
+def read(raw):
+    data = NifFormat.Data()
+    data.read(io.BytesIO(raw))
+    return data
+
+
+def get_hashes(data):
+    return [block.get_hash(data) for block in data.blocks]
+
+
+def pad_block(raw, data, index, padding):
+    """Append padding to a block, and add its size to the header."""
+    sizes = list(data.header.block_size)
+    num_roots = len(data.roots)
+    end = len(raw) - 4 - 4 * num_roots - sum(sizes[index + 1:])
+    old = struct.pack("<%iI" % len(sizes), *sizes)
+    sizes[index] += len(padding)
+    new = struct.pack("<%iI" % len(sizes), *sizes)
+    assert raw.count(old) == 1
+    raw = raw[:end] + padding + raw[end:]
+    return raw.replace(old, new)
+
+
+class TestBlockSize(unittest.TestCase):
+
+    def setUp(self):
+        with open(file_name, "rb") as stream:
+            self.raw = stream.read()
+        self.expected = read(self.raw)
+        self.padded = pad_block(self.raw, self.expected, 1, b"\x00" * 4)
+
+    def tearDown(self):
+        NifFormat.Data.strict_block_size = False
+
+    def test_skip(self):
+        data = read(self.padded)
+        assert_equals(get_hashes(data), get_hashes(self.expected))
+
+    def test_skip_strict(self):
+        NifFormat.Data.strict_block_size = True
+        data = read(self.padded)
+        assert_equals(get_hashes(data), get_hashes(self.expected))
+
+    def test_get_size(self):
+        # the size is only calculated in strict mode
+        calls = []
+        get_size = NifFormat.NiObject.get_size
+
+        def counted_get_size(block, data=None):
+            calls.append(block)
+            return get_size(block, data)
+
+        NifFormat.NiObject.get_size = counted_get_size
+        try:
+            read(self.raw)
+            assert_equals(calls, [])
+            NifFormat.Data.strict_block_size = True
+            read(self.raw)
+            assert_equals(len(calls), len(self.expected.blocks))
+        finally:
+            del NifFormat.NiObject.get_size
@@ -0,0 +1,83 @@
+"""Tests for NifFormat.NiGeometryData."""
+
+import glob
+import os.path
+import struct
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.array import Array
+from pyffi.utils.mathutils import float_to_int
+
+from nose.tools import assert_equals, assert_true
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_names = sorted(glob.glob(
+    os.path.join(test_root, 'spells', 'nif', 'files', 'test_*.nif')))
+
+
+def get_vertex_hashes(geomdata):
+    """Reference implementation, which hashes vertex by vertex."""
+    for i in range(geomdata.num_vertices):
+        h = []
+        if geomdata.has_vertices and geomdata.vertices:
+            h.extend(float_to_int(x * 1000)
+                     for x in geomdata.vertices[i].as_list())
+        if geomdata.has_normals and geomdata.normals:
+            h.extend(float_to_int(x * 1000)
+                     for x in geomdata.normals[i].as_list())
+        for uvset in geomdata.uv_sets:
+            h.extend(float_to_int(x * 100000)
+                     for x in (uvset[i].u, uvset[i].v))
+        if geomdata.has_vertex_colors and geomdata.vertex_colors:
+            vcol = geomdata.vertex_colors[i]
+            h.extend(float_to_int(x * 1000)
+                     for x in (vcol.r, vcol.g, vcol.b, vcol.a))
+        yield tuple(h)
+
+
+def get_geometry_data(use_packed):
+    Array.use_packed = use_packed
+    try:
+        for file_name in file_names:
+            data = NifFormat.Data()
+            with open(file_name, "rb") as stream:
+                try:
+                    data.read(stream)
+                except (ValueError, struct.error):
+                    # invalid files
+                    continue
+            for block in data.blocks:
+                if isinstance(block, NifFormat.NiGeometryData):
+                    yield block
+    finally:
+        Array.use_packed = False
+
+
+class TestVertexHash(unittest.TestCase):
+
+    def check(self, use_packed):
+        num_geomdata = 0
+        for geomdata in get_geometry_data(use_packed):
+            num_geomdata += 1
+            assert_equals(list(geomdata.get_vertex_hash_generator()),
+                          list(get_vertex_hashes(geomdata)))
+        assert_true(num_geomdata > 0)
+
+    def test_vertex_hash(self):
+        self.check(False)
+
+    def test_vertex_hash_packed(self):
+        self.check(True)
+
+    def test_vertex_hash_nan(self):
+        geomdata = NifFormat.NiTriShapeData()
+        geomdata.num_vertices = 2
+        geomdata.has_vertices = True
+        geomdata.vertices.update_size()
+        geomdata.num_uv_sets = 1
+        geomdata.uv_sets.update_size()
+        geomdata.uv_sets[0][1].u = float("nan")
+        geomdata.vertices[1].x = float("inf")
+        assert_equals(list(geomdata.get_vertex_hash_generator()),
+                      list(get_vertex_hashes(geomdata)))
@@ -0,0 +1,139 @@
+"""Tests for lazy reading in NifFormat.Data."""
+
+import io
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_equals, assert_true, assert_false, raises
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_check_tangentspace2.nif')
+
+
+def read(raw, lazy):
+    data = NifFormat.Data()
+    data.read(io.BytesIO(raw), lazy=lazy)
+    return data
+
+
+def write(data):
+    stream = io.BytesIO()
+    data.write(stream)
+    return stream.getvalue()
+
+
+def rename_block_type(raw, old, new):
+    """Rename a block type in the header (names must have equal length)."""
+    assert len(old) == len(new)
+    old = old.encode("ascii")
+    return raw.replace(old, new.encode("ascii"), 1)
+
+
+class TestLazy(unittest.TestCase):
+
+    def setUp(self):
+        with open(file_name, "rb") as stream:
+            self.raw = stream.read()
+        self.data = read(self.raw, True)
+
+    def test_not_decoded(self):
+        assert_true(self.data.blocks)
+        assert_true(all(block._lazy for block in self.data.blocks))
+        assert_true(isinstance(self.data.roots[0], NifFormat.NiNode))
+
+    def test_decode(self):
+        expected = read(self.raw, False)
+        root = self.data.roots[0]
+        assert_equals(root.name, expected.roots[0].name)
+        assert_false(root._lazy)
+        # children are linked, but not decoded until accessed
+        child = root.children[0]
+        assert_true(child._lazy)
+        assert_equals(
+            [block.get_hash(self.data) for block in self.data.blocks],
+            [block.get_hash(expected) for block in expected.blocks])
+
+    def test_write_untouched(self):
+        assert_equals(write(self.data), self.raw)
+
+    def test_write_modified(self):
+        self.data.roots[0].name = "Modified"
+        expected = read(self.raw, False)
+        expected.roots[0].name = "Modified"
+        result = read(write(self.data), False)
+        assert_equals(
+            [block.get_hash(result) for block in result.blocks],
+            [block.get_hash(expected) for block in expected.blocks])
+
+    def test_write_decoded(self):
+        # decoded blocks are copied until they change
+        for block in self.data.blocks:
+            block.get_hash(self.data)
+        assert_true(all(block._raw for block in self.data.blocks))
+        root = self.data.roots[0]
+        root.name = "Modified"
+        assert_false(root._raw)
+        root.children[0].properties
+        assert_false(root.children[0]._raw)
+        assert_true(self.data.blocks[2]._raw)
+        expected = read(self.raw, False)
+        expected.roots[0].name = "Modified"
+        assert_equals(write(self.data), write(expected))
+
+    def test_write_detail_node(self):
+        # changes through detail nodes are written as well
+        root = self.data.roots[0]
+        root.get_hash(self.data)
+        assert_true(root._raw)
+        nodes = dict(zip(root.get_detail_child_names(),
+                         root.get_detail_child_nodes()))
+        nodes["flags"].set_value(12345)
+        assert_equals(read(write(self.data), False).roots[0].flags, 12345)
+
+    def test_write_reordered(self):
+        # links and strings of copied blocks are written anew
+        for block in self.data.blocks:
+            block.get_hash(self.data)
+        expected = read(self.raw, False)
+        for data in (self.data, expected):
+            shape = data.roots[0].children[0]
+            data.replace_global_node(shape.properties[0], None)
+        assert_true(self.data.blocks[3]._raw)
+        assert_equals(write(self.data), write(expected))
+
+    def test_unknown_block(self):
+        raw = rename_block_type(
+            self.raw, "BSShaderTextureSet", "BSShaderXxxxxxxSet")
+        data = read(raw, True)
+        block = data.blocks[3]
+        assert_true(block._is_unknown)
+        assert_equals(block.__class__.__name__, "BSShaderXxxxxxxSet")
+        # blocks of unknown type are written as they were read
+        data.roots[0].name = "Modified"
+        result = read(write(data), True)
+        assert_equals(result.roots[0].name, b"Modified")
+        assert_equals(write(result), write(data))
+        assert_true(result.blocks[2].texture_set is result.blocks[3])
+
+    @raises(NifFormat.NifError)
+    def test_unknown_block_removed(self):
+        data = read(rename_block_type(
+            self.raw, "BSShaderTextureSet", "BSShaderXxxxxxxSet"), True)
+        data.roots[0].children[0].remove_property(data.blocks[4])
+        write(data)
+
+    @raises(ValueError)
+    def test_unknown_block_eager(self):
+        read(rename_block_type(
+            self.raw, "BSShaderTextureSet", "BSShaderXxxxxxxSet"), False)
+
+    def test_old_version(self):
+        # no block sizes in the header: lazy is ignored
+        old_file_name = os.path.join(
+            test_root, 'spells', 'nif', 'files', 'test_vertexcolor.nif')
+        with open(old_file_name, "rb") as stream:
+            data = read(stream.read(), True)
+        assert_false(any(block._lazy for block in data.blocks))
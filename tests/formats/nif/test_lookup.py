@@ -0,0 +1,120 @@
+"""Tests for the block lookup tables of NifFormat.Data."""
+
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_equals, assert_true, assert_false
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def node(name, *children):
+    block = NifFormat.NiNode()
+    block.name = name
+    for child in children:
+        block.add_child(child)
+    return block
+
+
+class TestLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.shape = NifFormat.NiTriShape()
+        self.shape.name = b"Shape"
+        self.shape.data = NifFormat.NiTriShapeData()
+        self.bone = node(b"Bone")
+        self.node = node(b"Node", self.bone, self.shape)
+        self.root = node(b"Root", self.node)
+        self.data = NifFormat.Data()
+        self.data.roots = [self.root]
+
+    def assert_blocks(self, blocks, expected):
+        assert_equals(len(blocks), len(expected))
+        assert_true(all(block is other
+                        for block, other in zip(blocks, expected)))
+
+    def test_get_blocks(self):
+        self.assert_blocks(
+            self.data.get_blocks_by_type(NifFormat.NiAVObject),
+            [self.root, self.node, self.bone, self.shape])
+        self.assert_blocks(
+            self.data.get_blocks_by_type(NifFormat.NiGeometryData),
+            [self.shape.data])
+        self.assert_blocks(self.data.get_blocks_by_name(b"Bone"), [self.bone])
+        self.assert_blocks(self.data.get_parents(self.bone), [self.node])
+
+    def test_find(self):
+        self.data.get_blocks_by_type(NifFormat.NiObject)
+        assert_true(self.root._get_lookup() is not None)
+        assert_true(self.root.find(block_name=b"Shape") is self.shape)
+        assert_true(self.node.find(block_type=NifFormat.NiTriShapeData)
+                    is self.shape.data)
+        assert_true(self.bone.find(block_name=b"Shape") is None)
+        self.assert_blocks(
+            self.root.find_chain(self.shape, block_type=NifFormat.NiAVObject),
+            [self.root, self.node, self.shape])
+        assert_equals(
+            self.root.find_chain(self.shape.data,
+                                 block_type=NifFormat.NiAVObject), [])
+
+    def test_add_child(self):
+        self.data.get_blocks_by_type(NifFormat.NiObject)
+        child = node(b"Child")
+        self.bone.add_child(child)
+        assert_true(self.root._get_lookup() is None)
+        assert_true(self.root.find(block_name=b"Child") is child)
+        self.assert_blocks(self.data.get_blocks_by_name(b"Child"), [child])
+        self.assert_blocks(self.root.find_chain(child),
+                           [self.root, self.node, self.bone, child])
+
+    def test_remove_child(self):
+        self.data.get_blocks_by_type(NifFormat.NiObject)
+        self.node.num_children = 1
+        self.node.children.update_size()
+        assert_true(self.root.find(block_name=b"Shape") is None)
+        assert_equals(self.root.find_chain(self.shape), [])
+        assert_equals(self.data.get_blocks_by_name(b"Shape"), [])
+
+    def test_rename(self):
+        self.data.get_blocks_by_type(NifFormat.NiObject)
+        self.bone.name = b"Renamed"
+        assert_true(self.root.find(block_name=b"Renamed") is self.bone)
+        assert_true(self.root.find(block_name=b"Bone") is None)
+
+    def test_shared(self):
+        # the data is shared, so the tree of the root is not a tree
+        shape = NifFormat.NiTriShape()
+        shape.data = self.shape.data
+        self.bone.add_child(shape)
+        lookup = self.data._get_lookup()
+        assert_false(self.root in lookup.treelike)
+        assert_true(self.bone in lookup.closed)
+        # the data was visited through the bone first
+        assert_false(self.shape in lookup.closed)
+        self.assert_blocks(self.data.get_parents(self.shape.data),
+                           [shape, self.shape])
+        assert_true(self.shape.find(block_type=NifFormat.NiTriShapeData)
+                    is self.shape.data)
+        self.assert_blocks(
+            self.root.find_chain(self.shape.data),
+            [self.root, self.node, self.bone, shape, self.shape.data])
+
+
+class TestHasBlockType(unittest.TestCase):
+
+    def test_has_block_type(self):
+        data = NifFormat.Data()
+        file_name = os.path.join(
+            test_root, "spells", "nif", "files", "test_opt_dupverts.nif")
+        with open(file_name, "rb") as stream:
+            data.inspect(stream)
+        header = data.header
+        assert_true(header.has_block_type(NifFormat.NiTriStrips))
+        assert_true(header.has_block_type(NifFormat.NiGeometry))
+        assert_false(header.has_block_type(NifFormat.NiSkinInstance))
+        header.num_block_types += 1
+        header.block_types.update_size()
+        header.block_types[-1] = b"NiSkinInstance"
+        assert_true(header.has_block_type(NifFormat.NiSkinInstance))
@@ -0,0 +1,64 @@
+"""Tests for reading blocks in parallel in NifFormat.Data."""
+
+import io
+import os.path
+import pickle
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.array import Array
+
+from nose.tools import assert_equals, assert_true
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_check_tangentspace2.nif')
+
+
+def read(raw, jobs):
+    data = NifFormat.Data()
+    data.read(io.BytesIO(raw), jobs=jobs)
+    return data
+
+
+def write(data):
+    stream = io.BytesIO()
+    data.write(stream)
+    return stream.getvalue()
+
+
+def get_hashes(data):
+    return [block.get_hash(data) for block in data.blocks]
+
+
+class TestParallel(unittest.TestCase):
+
+    def setUp(self):
+        with open(file_name, "rb") as stream:
+            self.raw = stream.read()
+        self.expected = read(self.raw, 1)
+
+    def test_read(self):
+        data = read(self.raw, 2)
+        assert_equals(get_hashes(data), get_hashes(self.expected))
+        assert_true(data.roots[0].children[0] is data.blocks[1])
+        assert_equals(write(data), write(self.expected))
+
+    def test_packed(self):
+        Array.use_packed = True
+        try:
+            data = read(self.raw, 2)
+        finally:
+            Array.use_packed = False
+        assert_equals(get_hashes(data), get_hashes(self.expected))
+
+    def test_pickle(self):
+        roots = pickle.loads(pickle.dumps(self.expected.roots))
+        assert_equals(roots[0].get_hash(self.expected),
+                      self.expected.roots[0].get_hash(self.expected))
+        # arrays know their parent again
+        children = roots[0].children
+        assert_true(children._parent() is roots[0])
+        roots[0].num_children += 1
+        children.update_size()
+        assert_equals(len(children), roots[0].num_children)
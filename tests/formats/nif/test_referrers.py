@@ -0,0 +1,91 @@
+"""Tests for replacing blocks through the referrers of NifFormat.Data."""
+
+import io
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_equals, assert_true
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_check_tangentspace2.nif')
+
+
+def get_scene():
+    root = NifFormat.NiNode()
+    prop = NifFormat.NiMaterialProperty()
+    for i in range(3):
+        shape = NifFormat.NiTriShape()
+        shape.add_property(prop)
+        collision = NifFormat.NiCollisionObject()
+        collision.target = shape
+        shape.collision_object = collision
+        root.add_child(shape)
+    data = NifFormat.Data(version=0x0A010000)
+    data.roots = [root]
+    return data
+
+
+def reread(data):
+    stream = io.BytesIO()
+    data.write(stream)
+    stream.seek(0)
+    data = NifFormat.Data()
+    data.read(stream)
+    return data
+
+
+class TestReferrers(unittest.TestCase):
+
+    def setUp(self):
+        self.data = get_scene()
+
+    def assert_replaced(self, data):
+        root = data.roots[0]
+        prop = root.children[0].properties[0]
+        other = NifFormat.NiMaterialProperty()
+        data.replace_global_node(prop, other)
+        assert_true(all(child.properties[0] is other
+                        for child in root.children))
+        # weak pointers are replaced as well
+        shape = root.children[1]
+        other = NifFormat.NiTriShape()
+        data.replace_global_node(shape, other)
+        assert_true(root.children[1] is other)
+        assert_true(shape.collision_object.target is other)
+
+    def test_scratch(self):
+        self.assert_replaced(self.data)
+
+    def test_read(self):
+        data = reread(self.data)
+        assert_equals(data._referrers_generation,
+                      NifFormat.Ref.unowned_generation)
+        self.assert_replaced(data)
+
+    def test_add_child(self):
+        data = reread(self.data)
+        root = data.roots[0]
+        data.replace_global_node(root.children[0], None)
+        shape = NifFormat.NiTriShape()
+        root.add_child(shape)
+        other = NifFormat.NiTriShape()
+        data.replace_global_node(shape, other)
+        assert_true(root.children[-1] is other)
+
+    def test_roots(self):
+        root = NifFormat.NiNode()
+        self.data.replace_global_node(self.data.roots[0], root)
+        assert_true(self.data.roots[0] is root)
+
+    def test_lazy(self):
+        data = NifFormat.Data()
+        with open(file_name, "rb") as stream:
+            data.read(stream, lazy=True)
+        root = data.roots[0]
+        child = root.children[0]
+        other = NifFormat.NiNode()
+        data.replace_global_node(child, other)
+        assert_true(root.children[0] is other)
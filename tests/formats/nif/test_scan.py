@@ -0,0 +1,72 @@
+"""Tests for scanning the blocks of a nif file with NifFormat.Data.scan."""
+
+import io
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_equals, assert_true
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+files_root = os.path.join(test_root, 'spells', 'nif', 'files')
+
+
+def read_file(name):
+    with open(os.path.join(files_root, name), "rb") as stream:
+        return stream.read()
+
+
+def read(raw):
+    data = NifFormat.Data()
+    data.read(io.BytesIO(raw))
+    return data
+
+
+def scan(raw, block_types=()):
+    data = NifFormat.Data()
+    return data, list(data.scan(io.BytesIO(raw), block_types))
+
+
+class TestScan(unittest.TestCase):
+
+    def setUp(self):
+        self.raw = read_file('test_check_tangentspace2.nif')
+        self.expected = read(self.raw)
+
+    def test_blocks(self):
+        data, blocks = scan(self.raw, (NifFormat.BSShaderTextureSet,))
+        assert_equals([block_type for _, block_type, _, _, _ in blocks],
+                      [block.__class__.__name__
+                       for block in self.expected.blocks])
+        assert_equals([size for _, _, _, size, _ in blocks],
+                      list(self.expected.header.block_size))
+        assert_equals(list(data.header.strings),
+                      list(self.expected.header.strings))
+        # block bytes are where the offsets say
+        index, _, offset, size, block = blocks[3]
+        assert_equals(block.get_hash(data),
+                      self.expected.blocks[index].get_hash(self.expected))
+        other = NifFormat.BSShaderTextureSet()
+        other.read(io.BytesIO(self.raw[offset:offset + size]), data)
+        assert_equals(other.get_hash(data), block.get_hash(data))
+        assert_true(all(block is None for _, _, _, _, block in blocks[:3]))
+
+    def test_header_only(self):
+        # blocks which are not decoded are not read
+        _, _, offset, _, _ = scan(self.raw)[1][0]
+        _, blocks = scan(self.raw[:offset])
+        assert_equals(len(blocks), len(self.expected.blocks))
+
+    def test_old_version(self):
+        # no block sizes in the header: the file is read
+        raw = read_file('test_fix_texturepath.nif')
+        _, blocks = scan(raw, (NifFormat.NiSourceTexture,))
+        expected = read(raw)
+        assert_equals(
+            [block.file_name for _, _, _, _, block in blocks if block],
+            [block.file_name for block in expected.blocks
+             if isinstance(block, NifFormat.NiSourceTexture)])
+        for (_, _, offset, size, _), (_, _, next_offset, _, _) in zip(
+                blocks, blocks[1:]):
+            assert_equals(offset + size, next_offset)
@@ -1,5 +1,9 @@
+import unittest
+
 from pyffi.formats.nif import NifFormat
-from nose.tools import assert_equals
+from nose.tools import assert_equals, assert_true
+
+from tests.utils import skinned_grid
 
 
 class TestSkinPartition:
@@ -76,3 +80,58 @@ class TestSkinPartition:
         part.triangles[5].v_3 = 6
         expected_indices = [(5, 4, 3), (2, 4, 6), (3, 5, 7), (2, 3, 4), (5, 6, 7), (1, 0, 1)]
         assert_equals(list(part.get_mapped_triangles()), expected_indices)
+
+
+class TestUpdateSkinPartition(unittest.TestCase):
+
+    def setUp(self):
+        self.skelroot = skinned_grid(12, 5)
+        self.shape = self.skelroot.children[0]
+
+    def check_partitions(self, maxbonesperpartition, maxbonespervertex,
+                         **kwargs):
+        self.shape.update_skin_partition(
+            maxbonesperpartition=maxbonesperpartition,
+            maxbonespervertex=maxbonespervertex, **kwargs)
+        skinpart = self.shape.skin_instance.skin_partition
+        weights = self.shape.get_vertex_weights()
+        triangles = []
+        for block in skinpart.skin_partition_blocks:
+            assert_true(block.num_bones <= maxbonesperpartition)
+            assert_equals(block.num_weights_per_vertex, maxbonespervertex)
+            for v, vweights, bone_indices in zip(
+                block.vertex_map, block.vertex_weights, block.bone_indices):
+                # all bones of the vertex are in the partition
+                bones = set(block.bones[index]
+                            for index, weight in zip(bone_indices, vweights)
+                            if weight)
+                assert_true(bones <= set(bonenum for bonenum, weight
+                                         in weights[v]))
+                assert_true(abs(sum(vweights) - 1) < 1e-5)
+            triangles.extend(
+                tri[tri.index(min(tri)):] + tri[:tri.index(min(tri))]
+                for tri in block.get_mapped_triangles())
+        # every triangle is in exactly one partition
+        assert_equals(
+            sorted(triangles),
+            sorted(tri[tri.index(min(tri)):] + tri[:tri.index(min(tri))]
+                   for tri in self.shape.data.get_triangles()))
+        return skinpart
+
+    def test_triangles(self):
+        self.check_partitions(4, 4, stripify=False)
+
+    def test_strips(self):
+        self.check_partitions(4, 2, stripify=True)
+
+    def test_many_bones(self):
+        skinpart = self.check_partitions(12, 4, maximize_bone_sharing=True)
+        assert_true(skinpart.num_skin_partition_blocks
+                    < self.check_partitions(4, 4).num_skin_partition_blocks)
+
+    def test_padbones(self):
+        skinpart = self.check_partitions(4, 4, padbones=True)
+        for block in skinpart.skin_partition_blocks:
+            assert_equals(block.num_bones, 4)
+            for bone_indices in block.bone_indices:
+                assert_equals(list(bone_indices), sorted(set(bone_indices)))
@@ -0,0 +1,70 @@
+"""Tests for writing NifFormat.Data."""
+
+import io
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_equals, assert_raises, assert_true
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_check_tangentspace2.nif')
+
+
+def write(data):
+    stream = io.BytesIO()
+    data.write(stream)
+    return stream.getvalue()
+
+
+def read(raw):
+    data = NifFormat.Data()
+    data.read(io.BytesIO(raw))
+    return data
+
+
+def get_hashes(data):
+    return [block.get_hash(data) for block in data.blocks]
+
+
+class TestWrite(unittest.TestCase):
+
+    def setUp(self):
+        with open(file_name, "rb") as stream:
+            self.data = read(stream.read())
+        self.root = self.data.roots[0]
+        for name in (b"Node2", b"Node1", b"Node2"):
+            node = NifFormat.NiNode()
+            node.name = name
+            self.root.add_child(node)
+
+    def test_roundtrip(self):
+        raw = write(self.data)
+        data = read(raw)
+        assert_equals(get_hashes(data), get_hashes(self.data))
+        assert_equals(write(data), raw)
+
+    def test_block_size(self):
+        write(self.data)
+        assert_equals(list(self.data.header.block_size),
+                      [block.get_size(self.data)
+                       for block in self.data.blocks])
+
+    def test_strings(self):
+        # strings are listed once, in the order they are written
+        write(self.data)
+        strings = list(self.data.header.strings)
+        assert_equals(len(strings), len(set(strings)))
+        assert_true(strings.index(b"Node2") < strings.index(b"Node1"))
+        assert_equals(strings[0], self.root.name)
+
+    def test_unknown_string(self):
+        # outside write, strings must be in the string list already
+        write(self.data)
+        node = NifFormat.NiNode()
+        node.name = b"Node3"
+        assert_raises(ValueError, node.write, io.BytesIO(), self.data)
+        self.root.add_child(node)
+        assert_true(b"Node3" in read(write(self.data)).header.strings)
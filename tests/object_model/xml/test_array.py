@@ -0,0 +1,90 @@
+"""Tests for packed arrays in pyffi.object_models.xml.array module."""
+
+import io
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.array import Array
+
+from nose.tools import assert_equals, assert_true, assert_false
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_opt_dupverts.nif')
+
+
+def read(use_packed):
+    Array.use_packed = use_packed
+    try:
+        data = NifFormat.Data()
+        with open(file_name, "rb") as stream:
+            data.read(stream)
+        return data
+    finally:
+        Array.use_packed = False
+
+
+def write(data):
+    stream = io.BytesIO()
+    data.write(stream)
+    return stream.getvalue()
+
+
+def get_geom_data(data):
+    for block in data.blocks:
+        if isinstance(block, NifFormat.NiTriBasedGeomData):
+            return block
+
+
+class TestPackedArray(unittest.TestCase):
+
+    def setUp(self):
+        self.data = read(True)
+        self.geom_data = get_geom_data(self.data)
+
+    def test_packed(self):
+        # reading geometry does not create element instances
+        vertices = self.geom_data.vertices
+        assert_true(vertices._packed is not None)
+        assert_equals(len(vertices), self.geom_data.num_vertices)
+        assert_true(vertices._packed is not None)
+
+    def test_write_unchanged(self):
+        assert_equals(write(self.data), write(read(False)))
+        assert_true(self.geom_data.vertices._packed is not None)
+
+    def test_get_size(self):
+        expected = get_geom_data(read(False))
+        assert_equals(self.geom_data.get_size(self.data),
+                      expected.get_size(self.data))
+
+    def test_access(self):
+        expected = get_geom_data(read(False))
+        vertices = self.geom_data.vertices
+        assert_equals(vertices[1].as_tuple(), expected.vertices[1].as_tuple())
+        assert_true(vertices._packed is None)
+        assert_equals([v.as_tuple() for v in vertices],
+                      [v.as_tuple() for v in expected.vertices])
+
+    def test_modify(self):
+        self.geom_data.vertices[0].x = 123.0
+        self.geom_data.uv_sets[0][0].u = 0.5
+        data = NifFormat.Data()
+        data.read(io.BytesIO(write(self.data)))
+        geom_data = get_geom_data(data)
+        assert_equals(geom_data.vertices[0].x, 123.0)
+        assert_equals(geom_data.uv_sets[0][0].u, 0.5)
+
+    def test_update_size(self):
+        self.geom_data.num_vertices -= 1
+        self.geom_data.vertices.update_size()
+        assert_equals(len(self.geom_data.vertices),
+                      self.geom_data.num_vertices)
+        assert_false(self.geom_data.vertices._packed)
+
+    def test_list_methods(self):
+        vertices = self.geom_data.vertices
+        num_vertices = len(vertices)
+        vertices.pop()
+        assert_equals(len(vertices), num_vertices - 1)
@@ -0,0 +1,108 @@
+"""Tests for pyffi.object_models.xml.cache module."""
+
+import glob
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyffi.object_models.xml
+import pyffi.object_models.common
+
+from nose.tools import assert_equals, assert_true
+
+xml_text = """<fileformat>
+<version num="1.0">Game A, Game B</version>
+<basic name="uint">An unsigned integer.</basic>
+<enum name="Color" numbytes="1">
+    <option name="Red" value="0" />
+    <option name="Blue" value="0x1" />
+</enum>
+<struct name="Base">
+    <add name="Num Items" type="uint" default="2">Number of items.</add>
+</struct>
+<struct name="Item" inherit="Base">
+    <add name="Items" type="Color" arr1="Num Items" cond="Num Items &lt; 5" />
+    <add name="Next" type="Later" ver1="1.0" />
+</struct>
+<struct name="Later">
+    <version num="1.0">Game C</version>
+    <add name="A" type="uint" />
+</struct>
+</fileformat>
+"""
+
+
+def get_format(path):
+    class TestFormat(pyffi.object_models.xml.FileFormat):
+        xml_file_name = "test.xml"
+        xml_file_path = [path]
+        uint = pyffi.object_models.common.UInt
+
+        class Base:
+            def get_num_items(self):
+                return self.num_items
+    return TestFormat
+
+
+def describe(fmt):
+    """Summarize the generated classes."""
+    result = [sorted(fmt.versions.items()), sorted(fmt.games.items())]
+    for klass in fmt.xml_struct:
+        result.append((klass.__name__, klass.__doc__, klass._games,
+                       klass._has_links, klass._names,
+                       [(attr.name, getattr(attr.type_, "__name__", None),
+                         attr.default, str(attr.arr1), str(attr.cond),
+                         attr.ver1, attr.doc)
+                        for attr in klass._attrs]))
+    for klass in fmt.xml_enum:
+        result.append((klass.__name__, klass._enumkeys, klass._enumvalues))
+    return result
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.xml_file_path = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.xml_file_path, "cache")
+        with open(os.path.join(self.xml_file_path, "test.xml"), "w") as xml:
+            xml.write(xml_text)
+        self.environ = os.environ.get("PYFFI_CACHE_DIR")
+        os.environ["PYFFI_CACHE_DIR"] = self.cache_dir
+
+    def tearDown(self):
+        if self.environ is None:
+            del os.environ["PYFFI_CACHE_DIR"]
+        else:
+            os.environ["PYFFI_CACHE_DIR"] = self.environ
+        shutil.rmtree(self.xml_file_path)
+
+    def get_cache_files(self):
+        return glob.glob(os.path.join(self.cache_dir, "*.pickle"))
+
+    def test_replay(self):
+        parsed = get_format(self.xml_file_path)
+        assert_equals(len(self.get_cache_files()), 1)
+        cached = get_format(self.xml_file_path)
+        assert_equals(describe(cached), describe(parsed))
+        # customizer is applied, and forward declarations are resolved
+        assert_true(issubclass(cached.Base, cached._Base))
+        assert_true(issubclass(cached.Item, cached.Base))
+        item = cached.Item()
+        assert_equals(item.get_num_items(), 2)
+        assert_equals(len(item.items), 2)
+        item.next.a = 5
+        assert_equals(item.next.a, 5)
+
+    def test_disabled(self):
+        os.environ["PYFFI_CACHE_DIR"] = ""
+        get_format(self.xml_file_path)
+        assert_equals(self.get_cache_files(), [])
+
+    def test_corrupt(self):
+        get_format(self.xml_file_path)
+        file_name, = self.get_cache_files()
+        with open(file_name, "wb") as stream:
+            stream.write(b"corrupt")
+        fmt = get_format(self.xml_file_path)
+        assert_equals(len(fmt.xml_struct), 3)
@@ -0,0 +1,72 @@
+"""Tests for pyffi.object_models.xml.codec module."""
+
+import glob
+import io
+import os.path
+
+from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.struct_ import StructBase
+from pyffi.object_models.xml.codec import get_codec
+
+from nose.tools import assert_equals, assert_true
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+nif_files = sorted(
+    glob.glob(os.path.join(test_root, 'spells', 'nif', 'files', 'test*.nif'))
+    + glob.glob(os.path.join(test_root, 'spells', 'kf', '*.kf')))
+
+
+def read_write(file_name, use_codecs):
+    """Read and write file, return written bytes and sizes of all blocks."""
+    StructBase.use_codecs = use_codecs
+    try:
+        data = NifFormat.Data()
+        with open(file_name, "rb") as stream:
+            data.read(stream)
+        sizes = [block.get_size(data) for block in data.blocks]
+        stream = io.BytesIO()
+        data.write(stream)
+        return stream.getvalue(), sizes
+    finally:
+        StructBase.use_codecs = False
+
+
+class TestCodec:
+    """Compare codecs against the generic implementation."""
+
+    def test_read_write(self):
+        assert_true(nif_files)
+        for file_name in nif_files:
+            try:
+                expected = read_write(file_name, False)
+            except Exception:
+                # not readable with the generic implementation either
+                continue
+            assert_equals(read_write(file_name, True), expected)
+
+    def test_codec_cache(self):
+        data = NifFormat.Data(version=0x14000005, user_version=11)
+        codec = get_codec(NifFormat.NiNode, data)
+        assert_true(codec is get_codec(NifFormat.NiNode, data))
+        data.version = 0x04000002
+        assert_true(codec is not get_codec(NifFormat.NiNode, data))
+
+    def test_duplicate_names(self):
+        # in old versions, NiTriShapeData has two Num UV Sets fields
+        # of different types: the instance type must be used
+        data = NifFormat.Data(version=0x04000002)
+        block = NifFormat.NiTriShapeData()
+        block.num_vertices = 1
+        block.has_vertices = True
+        block.vertices.update_size()
+        result = []
+        for use_codecs in (False, True):
+            StructBase.use_codecs = use_codecs
+            try:
+                stream = io.BytesIO()
+                block.write(stream, data)
+                assert_equals(len(stream.getvalue()), block.get_size(data))
+                result.append(stream.getvalue())
+            finally:
+                StructBase.use_codecs = False
+        assert_equals(result[0], result[1])
@@ -1,7 +1,8 @@
+import pickle
 import unittest
 
 from pyffi.object_models.xml.expression import Expression
-from nose.tools import assert_equals, assert_false, assert_true, raises
+from nose.tools import assert_equals, assert_false, assert_true, raises, assert_raises
 
 
 class A(object):
@@ -54,6 +55,25 @@ class TestExpression(unittest.TestCase):
         self.a.x = B()
         assert_equals(Expression('x * 10').eval(self.a), 70)
 
+    def test_no_short_circuit(self):
+        # both operands are always evaluated
+        self.a.x = 0
+        assert_raises(AttributeError, Expression('x && c').eval, self.a)
+
+    def test_dotted_names(self):
+        self.a.z = A()
+        assert_true(Expression('z.y').eval(self.a))
+
+    def test_type_operand(self):
+        e = Expression('!Z')
+        e.map_(lambda x: A if x == 'Z' else x)
+        assert_false(e.eval(self.a))
+        assert_true(e.eval(B()))
+
+    def test_pickle(self):
+        e = pickle.loads(pickle.dumps(Expression('(x || y) && 1')))
+        assert_equals(e.eval(self.a), 1)
+
 class TestPartition:
 
     def test_partition_empty(self):
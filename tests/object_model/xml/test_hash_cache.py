@@ -0,0 +1,101 @@
+"""Tests for cached hashes of structures and arrays."""
+
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.struct_ import StructBase
+
+from nose.tools import assert_equals, assert_true, assert_false
+
+test_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_opt_dupverts.nif')
+
+
+def read():
+    data = NifFormat.Data()
+    with open(file_name, "rb") as stream:
+        data.read(stream)
+    return data
+
+
+def get_geom_data(data):
+    for block in data.blocks:
+        if isinstance(block, NifFormat.NiTriBasedGeomData):
+            return block
+
+
+def get_uncached_hash(block, data):
+    StructBase.use_hash_cache = False
+    try:
+        return block.get_hash(data)
+    finally:
+        StructBase.use_hash_cache = True
+
+
+class TestHashCache(unittest.TestCase):
+
+    def setUp(self):
+        StructBase.use_hash_cache = True
+        self.data = read()
+        self.geom_data = get_geom_data(self.data)
+
+    def tearDown(self):
+        StructBase.use_hash_cache = False
+
+    def assert_hash_valid(self):
+        assert_equals(self.geom_data.get_hash(self.data),
+                      get_uncached_hash(self.geom_data, self.data))
+
+    def test_cached(self):
+        hsh = self.geom_data.vertices.get_hash(self.data)
+        assert_true(self.geom_data.vertices.get_hash(self.data) is hsh)
+        for block in self.data.blocks:
+            assert_equals(block.get_hash(self.data),
+                          get_uncached_hash(block, self.data))
+
+    def test_links(self):
+        # blocks with links are never cached
+        self.data.roots[0].get_hash(self.data)
+        assert_true(self.data.roots[0]._hash is None)
+        assert_false(self.geom_data.vertices._hash is None)
+
+    def test_set_element_attribute(self):
+        self.assert_hash_valid()
+        self.geom_data.vertices[1].x = 12.0
+        assert_true(self.geom_data.vertices._hash is None)
+        self.assert_hash_valid()
+
+    def test_set_basic_attribute(self):
+        self.assert_hash_valid()
+        self.geom_data.radius = 12.0
+        self.assert_hash_valid()
+
+    def test_update_size(self):
+        self.assert_hash_valid()
+        self.geom_data.num_vertices -= 1
+        self.geom_data.vertices.update_size()
+        self.assert_hash_valid()
+
+    def test_list_methods(self):
+        self.assert_hash_valid()
+        self.geom_data.vertices.reverse()
+        self.assert_hash_valid()
+
+    def test_detail_node(self):
+        self.assert_hash_valid()
+        vertex = self.geom_data.vertices[1]
+        nodes = dict(zip(vertex.get_detail_child_names(),
+                         vertex.get_detail_child_nodes()))
+        nodes["x"].set_value(12.0)
+        self.assert_hash_valid()
+        self.geom_data.vertices.get_hash(self.data)
+        self.geom_data.vertices.get_detail_child_nodes()
+        assert_true(self.geom_data.vertices._hash is None)
+
+    def test_version(self):
+        hsh = self.geom_data.get_hash(self.data)
+        assert_equals(hsh, self.geom_data.get_hash(self.data))
+        assert_equals(len(self.geom_data.get_hash(None)),
+                      len(get_uncached_hash(self.geom_data, None)))
@@ -0,0 +1,85 @@
+"""Report the memory footprint per block of a nif file.
+
+Usage::
+
+    python memory_footprint.py [--packed] [file.nif ...]
+
+Without arguments, reads a skinned mesh from the test suite. The
+footprint is measured with :mod:`tracemalloc`, after the file format
+description has been loaded, so it covers only the objects that are
+created while reading the file.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import os.path
+import sys
+import tracemalloc
+
+from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.array import Array
+
+default_file = os.path.join(
+    os.path.dirname(__file__), os.pardir,
+    "spells", "nif", "files", "test_skincenterradius.nif")
+
+def footprint(file_name):
+    """Read the file, and return number of blocks, and the number of
+    bytes that are allocated for it."""
+    tracemalloc.start()
+    data = NifFormat.Data()
+    with open(file_name, "rb") as stream:
+        data.read(stream)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(data.blocks), size
+
+def main(args):
+    if "--packed" in args:
+        args.remove("--packed")
+        Array.use_packed = True
+    # load the format description
+    NifFormat.Data()
+    for file_name in args or [default_file]:
+        num_blocks, size = footprint(file_name)
+        print("%s: %i blocks, %i bytes, %i bytes per block"
+              % (os.path.basename(file_name),
+                 num_blocks, size, size // max(num_blocks, 1)))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
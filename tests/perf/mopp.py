@@ -0,0 +1,138 @@
+"""Compare the mopp generator of pyffi with the simple mopp.
+
+Usage::
+
+    python mopp.py [--queries N] [file.nif ...]
+
+Without arguments, runs on the mopp collisions of the test suite, and
+on a synthetic sphere. For each mesh, reports the size of the mopp
+code, the time to build it, and the average number of triangles tested
+per query box (see :func:`pyffi.utils.mopp.getMoppQueryCost`).
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import glob
+import math
+import os.path
+import sys
+import time
+
+from pyffi.formats.nif import NifFormat
+from pyffi.utils.mopp import getOriginScaleCodeWelding, getMoppQueryCost
+
+default_files = glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir,
+    "spells", "nif", "files", "*mopp*.nif"))
+
+def sphere(num_rings, num_segments):
+    """Vertices and triangles of a sphere."""
+    vertices = [(0.0, 0.0, -1.0), (0.0, 0.0, 1.0)]
+    for i in range(1, num_rings):
+        theta = math.pi * i / num_rings
+        for j in range(num_segments):
+            phi = 2 * math.pi * j / num_segments
+            vertices.append((math.sin(theta) * math.cos(phi),
+                             math.sin(theta) * math.sin(phi),
+                             -math.cos(theta)))
+    def ring(i, j):
+        return 2 + (i - 1) * num_segments + j % num_segments
+    triangles = []
+    for j in range(num_segments):
+        triangles.append((0, ring(1, j + 1), ring(1, j)))
+        triangles.append((1, ring(num_rings - 1, j), ring(num_rings - 1, j + 1)))
+        for i in range(1, num_rings - 1):
+            triangles.append((ring(i, j), ring(i, j + 1), ring(i + 1, j)))
+            triangles.append((ring(i + 1, j), ring(i, j + 1), ring(i + 1, j + 1)))
+    return vertices, triangles
+
+def make_mopp_shape(vertices, triangles):
+    """Make a mopp shape for the geometry."""
+    shape = NifFormat.bhkPackedNiTriStripsShape()
+    shape.add_shape(triangles=triangles, normals=[(0, 0, 1)] * len(triangles),
+                    vertices=vertices)
+    mopp = NifFormat.bhkMoppBvTreeShape()
+    mopp.shape = shape
+    return mopp
+
+def get_mopp_shapes(file_names):
+    """Generate name and mopp shapes in the files."""
+    for file_name in file_names:
+        data = NifFormat.Data()
+        with open(file_name, "rb") as stream:
+            data.read(stream)
+        for block in data.blocks:
+            if isinstance(block, NifFormat.bhkMoppBvTreeShape):
+                yield os.path.basename(file_name), block
+
+def benchmark(shape, num_queries):
+    """Return size, build time, and query cost of the simple mopp, and of
+    the mopp generator."""
+    vertices = [vert.as_tuple() for vert in shape.shape.data.vertices]
+    triangles = [(hktri.triangle.v_1, hktri.triangle.v_2, hktri.triangle.v_3)
+                 for hktri in shape.shape.data.triangles]
+    start = time.perf_counter()
+    shape.update_origin_scale()
+    simple = shape._makeSimpleMopp()
+    simple_time = time.perf_counter() - start
+    start = time.perf_counter()
+    origin, scale, moppcode, welding_info = getOriginScaleCodeWelding(
+        vertices, triangles)
+    tree_time = time.perf_counter() - start
+    return ((len(simple), simple_time, getMoppQueryCost(simple, num_queries)),
+            (len(moppcode), tree_time, getMoppQueryCost(moppcode, num_queries)))
+
+def main(args):
+    num_queries = 1000
+    if "--queries" in args:
+        index = args.index("--queries")
+        num_queries = int(args[index + 1])
+        del args[index:index + 2]
+    shapes = list(get_mopp_shapes(args or default_files))
+    if not args:
+        shapes.append(("sphere", make_mopp_shape(*sphere(32, 64))))
+    for name, shape in shapes:
+        simple, tree = benchmark(shape, num_queries)
+        print("%s: %i triangles" % (name, len(shape.shape.data.triangles)))
+        for label, (size, build_time, cost) in [("simple", simple),
+                                                ("tree", tree)]:
+            print("  %-6s: %6i bytes, %.3fs, %.2f triangles per query"
+                  % (label, size, build_time, cost))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
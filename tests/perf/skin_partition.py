@@ -0,0 +1,119 @@
+"""Time the skin partition builder.
+
+Usage::
+
+    python skin_partition.py [--repeat N] [file.nif ...]
+
+Runs :meth:`pyffi.formats.nif.NifFormat.NiTriBasedGeom.update_skin_partition`
+on synthetic skinned grids, and on the skinned geometries of the given
+nif files (without arguments, on the nif files of the test suite). For
+each mesh, reports the number of partitions, and the time per 10000
+triangles, with and without stripification. Run it with the root of
+the repository on the python path, for :func:`tests.utils.skinned_grid`.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import glob
+import logging
+import os.path
+import sys
+import time
+
+from pyffi.formats.nif import NifFormat
+
+from tests.utils import skinned_grid
+
+default_files = glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir, "spells", "nif", "files", "*.nif"))
+
+def get_shapes(file_names):
+    """Generate name, data, and shape of all skinned geometries in the
+    files (the data keeps the skeleton alive)."""
+    for file_name in file_names:
+        data = NifFormat.Data()
+        try:
+            with open(file_name, "rb") as stream:
+                data.read(stream)
+        except Exception:
+            continue
+        for block in data.blocks:
+            if isinstance(block, NifFormat.NiTriBasedGeom) and block.skin_instance:
+                yield os.path.basename(file_name), data, block
+
+def benchmark(shape, repeat, **kwargs):
+    """Return number of partitions, and the best time per 10000
+    triangles."""
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        shape.update_skin_partition(**kwargs)
+        timings.append(time.perf_counter() - start)
+    num_triangles = max(shape.data.num_triangles, 1)
+    return (shape.skin_instance.skin_partition.num_skin_partition_blocks,
+            10000 * min(timings) / num_triangles)
+
+def main(args):
+    # the builder logs every partition
+    logging.getLogger("pyffi.nif.nitribasedgeom").setLevel(logging.WARNING)
+    repeat = 3
+    if "--repeat" in args:
+        index = args.index("--repeat")
+        repeat = int(args[index + 1])
+        del args[index:index + 2]
+    skelroots = [skinned_grid(size, num_bones)
+                 for size, num_bones in [(20, 4), (100, 8), (150, 16)]]
+    shapes = [("grid %ix%i, %i bones"
+               % (size, size, skelroot.num_children - 1),
+               skelroot, skelroot.children[0])
+              for skelroot, size in zip(skelroots, [20, 100, 150])]
+    shapes.extend(get_shapes(args or default_files))
+    for name, owner, shape in shapes:
+        try:
+            num_parts, timing = benchmark(shape, repeat, stripify=False)
+        except NifFormat.NifError as e:
+            print("%s: %s" % (name, e))
+            continue
+        strip_num_parts, strip_timing = benchmark(shape, repeat)
+        print("%s: %i triangles, %i partitions,"
+              " %.3fs (%.3fs stripified) per 10000 triangles"
+              % (name, shape.data.num_triangles, num_parts,
+                 timing, strip_timing))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
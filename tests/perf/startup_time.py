@@ -0,0 +1,92 @@
+"""Compare the time needed to import a format module, with and without
+a cached format description (see :mod:`pyffi.object_models.xml.cache`).
+
+Usage::
+
+    python startup_time.py [--repeat N] [module ...]
+
+Without arguments, imports :mod:`pyffi.formats.nif`. Each import runs
+in a fresh interpreter, with the cache in a temporary folder: the cold
+import parses the xml file and writes the cache, the warm imports read
+it.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+def import_time(module, cache_dir):
+    """Import the module in a new interpreter, and return the time it
+    took in seconds."""
+    env = dict(os.environ, PYFFI_CACHE_DIR=cache_dir)
+    output = subprocess.check_output(
+        [sys.executable, "-c",
+         "import time\n"
+         "start = time.perf_counter()\n"
+         "import %s\n"
+         "print(time.perf_counter() - start)\n" % module],
+        env=env)
+    return float(output)
+
+def main(args):
+    repeat = 5
+    if "--repeat" in args:
+        index = args.index("--repeat")
+        repeat = int(args[index + 1])
+        del args[index:index + 2]
+    for module in args or ["pyffi.formats.nif"]:
+        cache_dir = tempfile.mkdtemp()
+        try:
+            cold = []
+            warm = []
+            for i in range(repeat):
+                shutil.rmtree(cache_dir)
+                cold.append(import_time(module, cache_dir))
+                warm.append(import_time(module, cache_dir))
+            disabled = [import_time(module, "") for i in range(repeat)]
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        print("%s: no cache %.3fs, cold %.3fs, warm %.3fs (best of %i)"
+              % (module, min(disabled), min(cold), min(warm), repeat))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
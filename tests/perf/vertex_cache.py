@@ -0,0 +1,120 @@
+"""Compare the vertex cache optimizer with its reference implementation.
+
+Usage::
+
+    python vertex_cache.py [--repeat N] [file.nif ...]
+
+Runs :func:`pyffi.utils.vertex_cache.get_cache_optimized_triangles`
+and :meth:`pyffi.utils.vertex_cache.Mesh.get_cache_optimized_triangles`
+on synthetic grids, and on the geometry of the given nif files (without
+arguments, on the nif files of the test suite). For each mesh, reports
+the average transform to vertex ratio (ATVR) of the result, and the
+time per 10000 triangles. Run it with the root of the repository on
+the python path, for :func:`tests.utils.grid`.
+"""
+
+# ***** BEGIN LICENSE BLOCK *****
+#
+# Copyright (c) 2007-2012, Python File Format Interface
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+#    * Redistributions of source code must retain the above copyright
+#      notice, this list of conditions and the following disclaimer.
+#
+#    * Redistributions in binary form must reproduce the above
+#      copyright notice, this list of conditions and the following
+#      disclaimer in the documentation and/or other materials provided
+#      with the distribution.
+#
+#    * Neither the name of the Python File Format Interface
+#      project nor the names of its contributors may be used to endorse
+#      or promote products derived from this software without specific
+#      prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS
+# FOR A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE
+# COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT,
+# INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING,
+# BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT
+# LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN
+# ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+# ***** END LICENSE BLOCK *****
+
+import glob
+import os.path
+import sys
+import time
+
+from pyffi.formats.nif import NifFormat
+from pyffi.utils.vertex_cache import (
+    Mesh, get_cache_optimized_triangles, average_transform_to_vertex_ratio)
+
+from tests.utils import grid
+
+default_files = glob.glob(os.path.join(
+    os.path.dirname(__file__), os.pardir, "spells", "nif", "files", "*.nif"))
+
+def get_meshes(file_names):
+    """Generate name and triangles of all geometries in the files."""
+    for file_name in file_names:
+        data = NifFormat.Data()
+        try:
+            with open(file_name, "rb") as stream:
+                data.read(stream)
+        except Exception:
+            continue
+        for block in data.blocks:
+            if isinstance(block, NifFormat.NiTriBasedGeomData):
+                triangles = block.get_triangles()
+                if triangles:
+                    yield os.path.basename(file_name), triangles
+
+def benchmark(optimize, triangles, repeat):
+    """Return ATVR of the optimized triangles, and the best time per
+    10000 triangles."""
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = optimize(triangles)
+        timings.append(time.perf_counter() - start)
+    return (average_transform_to_vertex_ratio(result),
+            10000 * min(timings) / len(triangles))
+
+def reference(triangles):
+    return Mesh(triangles).get_cache_optimized_triangles()
+
+def main(args):
+    repeat = 3
+    if "--repeat" in args:
+        index = args.index("--repeat")
+        repeat = int(args[index + 1])
+        del args[index:index + 2]
+    meshes = [("grid %ix%i" % size, grid(*size))
+              for size in [(10, 10), (100, 100), (300, 30)]]
+    meshes.extend(get_meshes(args or default_files))
+    total = [0, 0, 0]
+    for name, triangles in meshes:
+        atvr, timing = benchmark(get_cache_optimized_triangles,
+                                 triangles, repeat)
+        ref_atvr, ref_timing = benchmark(reference, triangles, repeat)
+        total[0] += len(triangles)
+        total[1] += timing * len(triangles)
+        total[2] += ref_timing * len(triangles)
+        print("%s: %i triangles, ATVR %.3f (reference %.3f),"
+              " %.3fs (reference %.3fs) per 10000 triangles"
+              % (name, len(triangles), atvr, ref_atvr, timing, ref_timing))
+    print("total: %i triangles, %.3fs (reference %.3fs) per 10000 triangles"
+          % (total[0], total[1] / total[0], total[2] / total[0]))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
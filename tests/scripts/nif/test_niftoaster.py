@@ -131,6 +131,29 @@ def test_check_centerradius():
     assert_almost_equal(orig_radius, 10.0)
     assert_almost_equal(calc_radius, 17.32050890)
 
+
+def test_jobs():
+    """Test that files toasted in other processes are tracked"""
+    args = "--skip texture --only fix_t --only center check_nop {0}".format(
+        nif_dir).split()
+    expected = call_niftoaster(*args)
+    toaster = call_niftoaster("--jobs=2", *args)
+    assert_equal(toaster.files_done, expected.files_done)
+    assert_equal(toaster.files_skipped, expected.files_skipped)
+    assert_equal(toaster.files_failed, expected.files_failed)
+
+
+def test_jobs_reduce():
+    """Test that statistics of spells are merged from other processes"""
+    expected = call_niftoaster("check_version", nif_dir)
+    toaster = call_niftoaster("--jobs=2", "check_version", nif_dir)
+    assert_equal(toaster.versions, expected.versions)
+    assert_equal(
+        dict((version, sorted(user_versions))
+             for version, user_versions in toaster.user_versions.items()),
+        dict((version, sorted(user_versions))
+             for version, user_versions in expected.user_versions.items()))
+
 """
 The check_skincenterradius spell
 --------------------------------
@@ -1,10 +1,13 @@
+import unittest
+
 from tests.scripts.nif import call_niftoaster
 
 from . import BaseFileTestCase
 import pyffi
+from pyffi.formats.nif import NifFormat
 from pyffi.spells import Toaster
 
-from nose.tools import assert_true, assert_false
+from nose.tools import assert_equals, assert_true, assert_false
 
 
 class TestMergeDuplicatesOptimisation(BaseFileTestCase):
@@ -80,4 +83,59 @@ class TestExplicitMergeDuplicatesGeomOptimisation(BaseFileTestCase):
         spell = pyffi.spells.nif.optimize.SpellMergeDuplicates(data=self.data)
         spell.recurse()
 
-        assert_false(has_duplicates(self.data.roots[0]))
\ No newline at end of file
+        assert_false(has_duplicates(self.data.roots[0]))
+
+
+def get_scene(num_shapes):
+    """Scene with shapes which have equal materials and textures."""
+    data = NifFormat.Data()
+    root = NifFormat.NiNode()
+    data.roots = [root]
+    for i in range(num_shapes):
+        shape = NifFormat.NiTriShape()
+        root.add_child(shape)
+        material = NifFormat.NiMaterialProperty()
+        material.name = ("Material%i" % i).encode("ascii")
+        material.alpha = 1.0 if i % 2 else 0.5
+        shape.add_property(material)
+        texturing = NifFormat.NiTexturingProperty()
+        texturing.has_base_texture = True
+        texturing.base_texture.source = NifFormat.NiSourceTexture()
+        texturing.base_texture.source.file_name = b"base.dds"
+        shape.add_property(texturing)
+    return data
+
+
+class TestInterchangeableHash(unittest.TestCase):
+
+    def test_merge(self):
+        data = get_scene(50)
+        spell = pyffi.spells.nif.optimize.SpellMergeDuplicates(data=data)
+        spell.recurse()
+        shapes = data.roots[0].children
+        # two different materials, and one texturing property
+        assert_equals(len(set(shape.properties[0] for shape in shapes)), 2)
+        assert_equals(len(set(shape.properties[1] for shape in shapes)), 1)
+        assert_false(has_duplicates(data.roots[0]))
+
+    def test_controller(self):
+        data = get_scene(3)
+        material = data.roots[0].children[1].properties[0]
+        material.alpha = 0.5
+        material.add_controller(NifFormat.NiAlphaController())
+        spell = pyffi.spells.nif.optimize.SpellMergeDuplicates(data=data)
+        spell.recurse()
+        shapes = data.roots[0].children
+        # the material with a controller is kept
+        assert_true(shapes[1].properties[0] is material)
+        assert_true(shapes[2].properties[0] is shapes[0].properties[0])
+
+    def test_hash(self):
+        # interchangeable blocks have equal hashes
+        data = get_scene(4)
+        blocks = list(data.roots[0].tree())
+        for block in blocks:
+            for other in blocks:
+                if block.is_interchangeable(other):
+                    assert_equals(block.get_interchangeable_hash(),
+                                  other.get_interchangeable_hash())
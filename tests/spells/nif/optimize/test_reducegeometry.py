@@ -0,0 +1,40 @@
+import struct
+
+from tests.scripts.nif import call_niftoaster
+
+from . import BaseFileTestCase
+from pyffi.formats.nif import NifFormat
+
+from nose.tools import assert_almost_equals, assert_equals
+
+
+def get_tangent_space(shape):
+    extra = shape.find(
+        block_name=b'Tangent space (binormal & tangent vectors)',
+        block_type=NifFormat.NiBinaryExtraData)
+    binary_data = bytes(extra.binary_data)
+    return struct.unpack("<%if" % (len(binary_data) // 4), binary_data)
+
+
+class TestReduceGeometryOptimisation(BaseFileTestCase):
+
+    def setUp(self):
+        super(TestReduceGeometryOptimisation, self).setUp()
+        self.src_name = "test_fix_tangentspace.nif"
+        super(TestReduceGeometryOptimisation, self).copyFile()
+
+    def test_tangent_space(self):
+        # the tangent space is welded with the default precision of
+        # update_tangent_space, not with the precision of the reduction
+        call_niftoaster("--raise", "opt_reducegeometry", "--arg=0",
+                        "--noninteractive", self.dest_file)
+        data = NifFormat.Data()
+        with open(self.dest_file, "rb") as stream:
+            data.read(stream)
+        shape = data.roots[0].children[0]
+        tangent_space = get_tangent_space(shape)
+        shape.update_tangent_space()
+        expected = get_tangent_space(shape)
+        assert_equals(len(tangent_space), len(expected))
+        for value, expected_value in zip(tangent_space, expected):
+            assert_almost_equals(value, expected_value, places=5)
@@ -2,10 +2,12 @@
 import tempfile
 import os
 import shutil
+import unittest
 
 import nose.tools
 
 from pyffi.formats.nif import NifFormat
+from pyffi.object_models.xml.struct_ import StructBase
 from pyffi.spells import Toaster
 
 
@@ -136,6 +138,7 @@ class TestIniParser:
         examples: False
         exclude: ['NiVertexColorProperty', 'NiStencilProperty']
         gccollect: False
+        hashcache: False
         helpspell: False
         include: []
         inifile:
@@ -164,3 +167,52 @@ class TestIniParser:
 
 
 
+
+
+class TestHashCache(unittest.TestCase):
+    """Test the hash cache option"""
+
+    input_files = TestIniParser.input_files
+
+    def setUp(self):
+        self.out = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.out)
+        StructBase.use_hash_cache = False
+
+    def test_hash_cache(self):
+        """Test merging duplicates with hashes cached"""
+        import sys
+        import pyffi.spells.nif
+        import pyffi.spells.nif.optimize
+        from pyffi.spells import fake_logger
+
+        class TestMergeToaster(pyffi.spells.nif.NifToaster):
+            """Test Spell"""
+            SPELLS = [pyffi.spells.nif.optimize.SpellMergeDuplicates]
+
+        src_file = os.path.join(self.input_files, 'test_opt_mergeduplicates.nif')
+        dest_file = os.path.join(self.out, 'test_opt_mergeduplicates.nif')
+
+        # reference result, without the cache
+        toaster = TestMergeToaster(
+            logger=fake_logger, spellnames=["opt_mergeduplicates"],
+            options={"destdir": self.out, "sourcedir": self.input_files,
+                     "jobs": 1})
+        toaster.toast(src_file)
+        nose.tools.assert_false(StructBase.use_hash_cache)
+        with open(dest_file, "rb") as stream:
+            expected = stream.read()
+        os.remove(dest_file)
+
+        toaster = TestMergeToaster(logger=fake_logger)
+        sys.argv = ["niftoaster.py", "--hash-cache", "--noninteractive",
+                    "--jobs=1", "--dest-dir={0}".format(self.out),
+                    "--source-dir={0}".format(self.input_files),
+                    "opt_mergeduplicates", src_file]
+        toaster.cli()
+        nose.tools.assert_true(toaster.options["hashcache"])
+        nose.tools.assert_true(StructBase.use_hash_cache)
+        with open(dest_file, "rb") as stream:
+            nose.tools.assert_equal(stream.read(), expected)
@@ -1,10 +1,76 @@
 """Tests for utility classes"""
 
+import random
+
 import nose
 import nose.tools
 
+from pyffi.formats.nif import NifFormat
+
 
 def assert_tuple_values(a, b):
     """Wrapper func to cleanly assert tuple values"""
     for i, j in zip(a, b):
-        nose.tools.assert_almost_equal(i, j)
\ No newline at end of file
+        nose.tools.assert_almost_equal(i, j)
+
+
+def grid(width, height):
+    """Triangles of a grid of width x height quads, with the vertices
+    numbered row by row."""
+    triangles = []
+    for i in range(height):
+        for j in range(width):
+            v0 = i * (width + 1) + j
+            v1 = v0 + 1
+            v2 = v0 + width + 1
+            v3 = v2 + 1
+            triangles += [(v0, v1, v2), (v1, v3, v2)]
+    return triangles
+
+
+def skinned_grid(size, num_bones):
+    """A skeleton root with the bones, and with a shape as first child,
+    which has a grid of size x size quads, skinned on a grid of
+    num_bones x num_bones bones. Every vertex is influenced by the four
+    bones around it, and sometimes by a fifth one, with weights that
+    add up to one."""
+    rand = random.Random(0)
+    shape = NifFormat.NiTriShape()
+    shape.data = NifFormat.NiTriShapeData()
+    shape.data.num_vertices = (size + 1) ** 2
+    shape.data.has_vertices = True
+    shape.data.vertices.update_size()
+    shape.data.set_triangles(grid(size, size))
+    # bones and skeleton root are weakly referenced by the skin instance
+    skelroot = NifFormat.NiNode()
+    skelroot.add_child(shape)
+    skininst = NifFormat.NiSkinInstance()
+    skininst.data = NifFormat.NiSkinData()
+    skininst.skeleton_root = skelroot
+    shape.skin_instance = skininst
+    bone_weights = [{} for i in range(num_bones * num_bones)]
+    scale = (num_bones - 1) / size
+    for index, vertex in enumerate(shape.data.vertices):
+        vertex.x = index % (size + 1)
+        vertex.y = index // (size + 1)
+        x = min(vertex.x * scale, num_bones - 1.001)
+        y = min(vertex.y * scale, num_bones - 1.001)
+        i, j = int(y), int(x)
+        s, t = x - j, y - i
+        vertex_weights = {}
+        for bone, weight in (
+            (i * num_bones + j, (1 - s) * (1 - t)),
+            (i * num_bones + j + 1, s * (1 - t)),
+            ((i + 1) * num_bones + j, (1 - s) * t),
+            ((i + 1) * num_bones + j + 1, s * t),
+            (rand.randrange(num_bones * num_bones), 0.05 * rand.random())):
+            if weight > 0:
+                vertex_weights[bone] = vertex_weights.get(bone, 0.0) + weight
+        total = sum(vertex_weights.values())
+        for bone, weight in vertex_weights.items():
+            bone_weights[bone][index] = weight / total
+    for weights in bone_weights:
+        bone = NifFormat.NiNode()
+        skelroot.add_child(bone)
+        shape.add_bone(bone, weights)
+    return skelroot
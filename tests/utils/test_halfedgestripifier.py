@@ -0,0 +1,51 @@
+"""Tests for pyffi.utils.halfedgestripifier module."""
+
+import random
+import unittest
+
+from pyffi.utils.halfedgestripifier import HalfEdgeStripifier
+from pyffi.utils.tristrip import (
+    _check_strips, stripify, stitch_strips, unstitch_strip)
+
+from nose.tools import assert_equals, assert_true
+
+from tests.utils import grid
+
+
+class TestHalfEdgeStripifier(unittest.TestCase):
+
+    def test_grid(self):
+        triangles = grid(20, 20)
+        strips = HalfEdgeStripifier(triangles).find_all_strips()
+        _check_strips(triangles, strips)
+        # a regular grid is stripped in long strips
+        assert_true(len(strips) <= 20)
+
+    def test_random(self):
+        rand = random.Random(42)
+        for num_vertices in [3, 5, 10, 50]:
+            # many non-manifold edges, duplicate and degenerate faces
+            triangles = [tuple(rand.choice(range(num_vertices))
+                               for j in range(3))
+                         for i in range(4 * num_vertices)]
+            strips = HalfEdgeStripifier(triangles).find_all_strips()
+            _check_strips(triangles, strips)
+            stitched = stitch_strips(strips)
+            _check_strips(triangles, [stitched])
+            _check_strips(triangles, unstitch_strip(stitched))
+
+    def test_max_experiments(self):
+        triangles = grid(30, 10)
+        for max_experiments in [0, 1, 10]:
+            stripifier = HalfEdgeStripifier(
+                triangles, max_experiments=max_experiments)
+            _check_strips(triangles, stripifier.find_all_strips())
+            # remaining strips are built from a single experiment each
+            assert_true(stripifier.stamp < max_experiments + 300)
+
+    def test_long_strip(self):
+        # long chain of adjacent strips must not hit the recursion limit
+        triangles = grid(2, 3000)
+        strips = stripify(triangles, stitchstrips=True)
+        assert_equals(len(strips), 1)
+        _check_strips(triangles, strips)
@@ -0,0 +1,91 @@
+"""Tests for pyffi.utils.memory_stream module."""
+
+import io
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.utils.memory_stream import MemoryStream, open_file
+
+from nose.tools import assert_equals, assert_true, raises
+
+test_root = os.path.dirname(os.path.dirname(__file__))
+file_name = os.path.join(
+    test_root, 'spells', 'nif', 'files', 'test_skincenterradius.nif')
+
+
+def write(data):
+    stream = io.BytesIO()
+    data.write(stream)
+    return stream.getvalue()
+
+
+class TestMemoryStream(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def create_file(self, raw):
+        path = os.path.join(self.folder, "test.bin")
+        with open(path, "wb") as stream:
+            stream.write(raw)
+        return path
+
+    def test_file_semantics(self):
+        path = self.create_file(b"line 1\nline 2\nend")
+        with open(path, "rb") as expected:
+            with MemoryStream.open(path) as stream:
+                assert_equals(stream.name, path)
+                for args in [(3,), (-1,), (0,), (100,)]:
+                    assert_equals(stream.read(*args), expected.read(*args))
+                    assert_equals(stream.tell(), expected.tell())
+                for args in [(0,), (2, 1), (-3, 2), (100,)]:
+                    assert_equals(stream.seek(*args), expected.seek(*args))
+                    assert_equals(stream.read(2), expected.read(2))
+                stream.seek(0)
+                expected.seek(0)
+                assert_equals(list(iter(stream.readline, b"")),
+                              list(iter(expected.readline, b"")))
+        assert_true(stream.closed)
+
+    def test_empty_file(self):
+        with MemoryStream.open(self.create_file(b"")) as stream:
+            assert_equals(stream.read(), b"")
+
+    @raises(io.UnsupportedOperation)
+    def test_write(self):
+        with MemoryStream.open(self.create_file(b"abc")) as stream:
+            stream.write(b"x")
+
+    def test_open_file(self):
+        path = self.create_file(b"abc")
+        with open_file(path) as stream:
+            assert_true(isinstance(stream, MemoryStream))
+        with open_file(path, "r+b") as stream:
+            assert_true(not isinstance(stream, MemoryStream))
+
+    def test_read_nif(self):
+        expected = NifFormat.Data()
+        with open(file_name, "rb") as stream:
+            expected.read(stream)
+        data = NifFormat.Data()
+        with MemoryStream.open(file_name) as stream:
+            data.inspect(stream)
+            assert_equals(stream.tell(), 0)
+            data.read(stream)
+        assert_equals(write(data), write(expected))
+        assert_equals(
+            [block.get_hash(data) for block in data.blocks],
+            [block.get_hash(expected) for block in expected.blocks])
+
+    def test_walk_data(self):
+        for stream, data in NifFormat.walkData(file_name):
+            assert_true(isinstance(stream, MemoryStream))
+            data.read(stream)
+        assert_true(stream.closed)
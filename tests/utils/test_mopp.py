@@ -0,0 +1,84 @@
+"""Tests for the mopp generator in pyffi.utils.mopp module."""
+
+import os.path
+import random
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.utils.mopp import (
+    getOriginScale, getMoppCode, getMoppTriangles, getWeldingInfo)
+
+from nose.tools import assert_equals, assert_true
+
+test_root = os.path.dirname(os.path.dirname(__file__))
+
+
+def read_mopp_shape(name):
+    data = NifFormat.Data()
+    with open(os.path.join(
+            test_root, 'spells', 'nif', 'files', name), "rb") as stream:
+        data.read(stream)
+    for block in data.blocks:
+        if isinstance(block, NifFormat.bhkMoppBvTreeShape):
+            return block
+
+
+def get_geometry(shape):
+    vertices = [vert.as_tuple() for vert in shape.shape.data.vertices]
+    triangles = [(hktri.triangle.v_1, hktri.triangle.v_2, hktri.triangle.v_3)
+                 for hktri in shape.shape.data.triangles]
+    return vertices, triangles
+
+
+class TestMopp(unittest.TestCase):
+
+    def test_query(self):
+        # all triangles that overlap the query box must be found
+        rand = random.Random(42)
+        vertices = [tuple(rand.uniform(-10, 10) for i in range(3))
+                    for j in range(100)]
+        triangles = [tuple(rand.sample(range(100), 3)) for i in range(300)]
+        origin, scale = getOriginScale(vertices)
+        moppcode = getMoppCode(vertices, triangles, origin, scale)
+        assert_equals(getMoppTriangles(moppcode, (0, 0, 0, 255, 255, 255)),
+                      list(range(300)))
+        coords = [[(vert[axis] - origin[axis]) * scale / 65536
+                   for axis in range(3)] for vert in vertices]
+        for i in range(100):
+            low = [rand.randint(0, 200) for axis in range(3)]
+            box = low + [x + 50 for x in low]
+            found = set(getMoppTriangles(moppcode, box))
+            for index, triangle in enumerate(triangles):
+                if all(min(coords[v][axis] for v in triangle) <= box[axis + 3]
+                       and max(coords[v][axis] for v in triangle) >= box[axis]
+                       for axis in range(3)):
+                    assert_true(index in found)
+            assert_true(len(found) < len(triangles))
+
+    def test_welding_info(self):
+        for name, num_mismatches in [("test_opt_collision_mopp.nif", 0),
+                                     ("test_mopp.nif", 2)]:
+            shape = read_mopp_shape(name)
+            welding_infos = getWeldingInfo(*get_geometry(shape))
+            assert_equals(
+                sum(welding_info != hktri.welding_info
+                    for welding_info, hktri in zip(
+                        welding_infos, shape.shape.data.triangles)),
+                num_mismatches)
+
+    def test_update_mopp_welding(self):
+        shape = read_mopp_shape("test_mopp.nif")
+        shape.update_mopp_welding()
+        # every byte of the mopp is parsed once, and every triangle found
+        ids, tris = shape.parse_mopp()
+        assert_equals(sorted(ids), list(range(shape.mopp_data_size)))
+        assert_equals(sorted(tris),
+                      list(range(len(shape.shape.data.triangles))))
+
+    def test_update_mopp_welding_generator(self):
+        # without mopper, the welding info comes from pyffi's generator
+        shape = read_mopp_shape("test_mopp.nif")
+        shape.update_mopp_welding(use_mopper=False)
+        assert_equals([hktri.welding_info
+                       for hktri in shape.shape.data.triangles],
+                      getWeldingInfo(*get_geometry(shape)))
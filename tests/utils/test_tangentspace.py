@@ -0,0 +1,92 @@
+"""Tests for pyffi.utils.tangentspace module."""
+
+import os.path
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.utils import unique_map
+from pyffi.utils.mathutils import vecDotProduct, vecNorm
+from pyffi.utils.tangentspace import getTangentSpace, getWeldedTangentSpace
+
+from nose.tools import assert_equals, assert_almost_equals, assert_true
+
+from tests.utils import grid
+
+test_root = os.path.dirname(os.path.dirname(__file__))
+
+
+def uv_grid(width, height):
+    """A flat grid in the xy plane, with uvs following x and y."""
+    vertices = [(0.5 * j, 0.25 * i, 0.0)
+                for i in range(height + 1) for j in range(width + 1)]
+    normals = [(0.0, 0.0, 1.0)] * len(vertices)
+    uvs = [(x, 2.0 * y) for x, y, z in vertices]
+    return vertices, normals, uvs, grid(width, height)
+
+
+def assert_vectors_almost_equal(vectors1, vectors2):
+    assert_equals(len(vectors1), len(vectors2))
+    for vec1, vec2 in zip(vectors1, vectors2):
+        for x1, x2 in zip(vec1, vec2):
+            assert_almost_equals(x1, x2)
+
+
+class TestTangentSpace(unittest.TestCase):
+
+    def test_grid(self):
+        vertices, normals, uvs, triangles = uv_grid(5, 3)
+        tangents, binormals = getWeldedTangentSpace(
+            vertices, normals, uvs, triangles)
+        expected = getTangentSpace(
+            vertices=vertices, normals=normals, uvs=uvs, triangles=triangles)
+        assert_vectors_almost_equal(tangents, expected[0])
+        assert_vectors_almost_equal(binormals, expected[1])
+
+    def test_welding(self):
+        vertices, normals, uvs, triangles = uv_grid(2, 1)
+        # duplicate the middle vertices, as along a uv seam
+        for i in (1, 4):
+            vertices.append(vertices[i])
+            normals.append(normals[i])
+            uvs.append((uvs[i][0], uvs[i][1] + 0.5))
+        triangles[2:] = [(6, 2, 7), (2, 5, 7)]
+        groups = unique_map(vertices)[0]
+        tangents, binormals = getWeldedTangentSpace(
+            vertices, normals, uvs, triangles, groups)
+        assert_equals(tangents[1], tangents[6])
+        assert_equals(binormals[4], binormals[7])
+        # without welding, the seam shows
+        tangents, binormals = getWeldedTangentSpace(
+            vertices, normals, uvs, triangles)
+        assert_true(tangents[1] != tangents[6])
+
+    def test_no_triangles(self):
+        normals = [(0.0, 0.0, 1.0), (1.0, 0.0, 0.0)]
+        tangents, binormals = getWeldedTangentSpace(
+            [(0.0, 0.0, 0.0)] * 2, normals, [(0.0, 0.0)] * 2, [])
+        # an orthonormal base is picked
+        for normal, tangent, binormal in zip(normals, tangents, binormals):
+            for vec in (tangent, binormal):
+                assert_almost_equals(vecNorm(vec), 1.0)
+                assert_almost_equals(vecDotProduct(vec, normal), 0.0)
+            assert_almost_equals(vecDotProduct(tangent, binormal), 0.0)
+
+    def test_welding_groups(self):
+        data = NifFormat.Data()
+        file_name = os.path.join(
+            test_root, "spells", "nif", "files",
+            "test_check_tangentspace1.nif")
+        with open(file_name, "rb") as stream:
+            data.read(stream)
+        geom = data.roots[0].children[0]
+        geom.update_tangent_space(as_extra=False)
+        expected = ([vec.as_tuple() for vec in geom.data.tangents],
+                    [vec.as_tuple() for vec in geom.data.bitangents])
+        welding_groups = unique_map(
+            geom.data.get_vertex_hash_generator(
+                uvprecision=-2, vcolprecision=-2))[0]
+        geom.update_tangent_space(
+            as_extra=False, welding_groups=welding_groups)
+        assert_equals(([vec.as_tuple() for vec in geom.data.tangents],
+                       [vec.as_tuple() for vec in geom.data.bitangents]),
+                      expected)
@@ -0,0 +1,57 @@
+"""Tests for pyffi.utils.vertex_cache module."""
+
+import glob
+import os.path
+import random
+import struct
+import unittest
+
+from pyffi.formats.nif import NifFormat
+from pyffi.utils.vertex_cache import Mesh, get_cache_optimized_triangles
+
+from nose.tools import assert_equals
+
+from tests.utils import grid
+
+test_root = os.path.dirname(os.path.dirname(__file__))
+
+
+def reference(triangles):
+    return Mesh(triangles).get_cache_optimized_triangles()
+
+
+class TestVertexCache(unittest.TestCase):
+
+    def test_empty(self):
+        assert_equals(get_cache_optimized_triangles([]), [])
+
+    def test_grid(self):
+        for width, height in [(1, 1), (3, 7), (40, 40)]:
+            triangles = grid(width, height)
+            assert_equals(get_cache_optimized_triangles(triangles),
+                          reference(triangles))
+
+    def test_random(self):
+        rand = random.Random(42)
+        for num_vertices in [3, 10, 50, 200]:
+            triangles = [tuple(rand.sample(range(num_vertices), 3))
+                         for i in range(3 * num_vertices)]
+            # duplicate and degenerate triangles
+            triangles += triangles[:5] + [(0, 0, 1)]
+            assert_equals(get_cache_optimized_triangles(triangles),
+                          reference(triangles))
+
+    def test_nif(self):
+        for file_name in glob.glob(
+                os.path.join(test_root, 'spells', 'nif', 'files', '*.nif')):
+            data = NifFormat.Data()
+            with open(file_name, "rb") as stream:
+                try:
+                    data.read(stream)
+                except (ValueError, struct.error):
+                    continue
+            for block in data.blocks:
+                if isinstance(block, NifFormat.NiTriBasedGeomData):
+                    triangles = block.get_triangles()
+                    assert_equals(get_cache_optimized_triangles(triangles),
+                                  reference(triangles))